@@ -1,17 +1,19 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
 import asyncio
+import time
 
 from modules.user_profile import (
     create_user,
     update_preferred_language,
     update_relation,
-    get_user_profile,
-    get_user_profile,
+    async_get_user_profile,
     resolve_user_id_by_phone,
-    get_user_by_phone,
+    async_get_user_by_phone,
+    get_profile_cache_stats,
     create_partial_user,
     update_user_profile,
     login_user,
@@ -24,19 +26,37 @@ from modules.response_builder import (
     is_mostly_english,
     force_rewrite_to_tinglish,
     force_rewrite_to_telugu,
+    strip_follow_ups,
+)
+from modules.conversation import (
+    save_user_message,
+    save_sakhi_message,
+    get_last_messages,
+    get_conversation_logger,
+    get_history_cache_stats,
 )
-from modules.conversation import save_user_message, save_sakhi_message, get_last_messages
 from modules.user_answers import save_bulk_answers
 from modules.model_gateway import get_model_gateway, Route
-from modules.slm_client import get_slm_client
+from modules.slm_client import get_slm_client, FALLBACK_INTENT_LABEL
 from modules.guardrails import get_guardrails
-from modules.search_hierarchical import hierarchical_rag_query, format_hierarchical_context
+from modules.search_hierarchical import hierarchical_rag_query, format_hierarchical_context, get_retrieval_cache_stats
+from modules.section_store import get_section_store
 from modules.lead_manager import handle_lead_flow, _get_chat_state
+from modules.background_tasks import get_background_runner
+from modules.tracing import TracingMiddleware, current_trace, span, annotate, TIMINGS_IN_RESPONSE
+from modules.metrics import REGISTRY, CONTENT_TYPE, render_metrics
+from modules.admission import get_admission_controller, busy_reply
+from modules.degraded_mode import get_mode_selector, MODE_POLICIES
+from modules.idempotency import get_idempotency_store, EXECUTED
+from modules.coalescing import get_message_coalescer, merged_reply, should_coalesce, COALESCE_MESSAGES
+from modules.user_locks import get_user_lock_manager, UserLockTimeout
+from modules.cancellation import run_cancellable, TurnCancelled, checkpoint, reached
 from modules.user_rewards import (
     award_points,
     store_new_question,
     get_user_rewards,
     classify_for_reward,
+    get_rewards_ledger,
     RewardType,
 )
 import asyncio
@@ -58,6 +78,124 @@ app.add_middleware(
 model_gateway = get_model_gateway()
 slm_client = get_slm_client()
 guardrails = get_guardrails()
+background = get_background_runner()
+admission = get_admission_controller()
+pipeline_modes = get_mode_selector()
+idempotency = get_idempotency_store()
+coalescer = get_message_coalescer()
+user_locks = get_user_lock_manager()
+
+
+# Per-stage timings -> Server-Timing header, /metrics, slow-request log
+app.add_middleware(TracingMiddleware)
+
+
+def _cache_stats():
+    return {
+        "history": get_history_cache_stats(),
+        "profile": get_profile_cache_stats(),
+        "retrieval": get_retrieval_cache_stats(),
+    }
+
+
+# Scrape-time collectors over the stats() each component already keeps
+REGISTRY.counter_callback(
+    "sakhi_cache_hits_total", "Cache hits per in-process cache.", ("cache",),
+    lambda: [((name,), stats["hits"]) for name, stats in _cache_stats().items()],
+)
+REGISTRY.counter_callback(
+    "sakhi_cache_misses_total", "Cache misses per in-process cache.", ("cache",),
+    lambda: [((name,), stats["misses"]) for name, stats in _cache_stats().items()],
+)
+REGISTRY.gauge_callback(
+    "sakhi_cache_hit_ratio", "Hit ratio since start per in-process cache.", ("cache",),
+    lambda: [((name,), stats["hit_rate"]) for name, stats in _cache_stats().items()],
+)
+REGISTRY.gauge_callback(
+    "sakhi_background_queue_depth", "Jobs waiting in the background runner.", ("task_type",),
+    lambda: [((task_type,), stats["queue_depth"]) for task_type, stats in background.stats().items()],
+)
+REGISTRY.counter_callback(
+    "sakhi_background_jobs_total", "Background jobs by outcome.", ("task_type", "outcome"),
+    lambda: [
+        ((task_type, outcome), stats[outcome])
+        for task_type, stats in background.stats().items()
+        for outcome in ("submitted", "completed", "failed", "retried", "dropped")
+    ],
+)
+REGISTRY.gauge_callback(
+    "sakhi_background_max_lag_seconds", "Longest enqueue-to-start delay seen per task type.", ("task_type",),
+    lambda: [((task_type,), stats["max_lag_seconds"]) for task_type, stats in background.stats().items()],
+)
+REGISTRY.gauge_callback(
+    "sakhi_write_behind_pending", "Items buffered by the write-behind writers.", ("writer",),
+    lambda: [
+        (("conversations",), get_conversation_logger().queue_depth),
+        (("rewards_users",), get_rewards_ledger().pending_users),
+    ],
+)
+REGISTRY.gauge_callback(
+    "sakhi_admission", "Chat admission control: current limit, turns in flight and queued.", ("state",),
+    lambda: [((key,), admission.stats()[key]) for key in ("limit", "in_flight", "queued")],
+)
+REGISTRY.counter_callback(
+    "sakhi_admission_events_total", "Chat admission decisions and limit changes.", ("event",),
+    lambda: [((key,), value) for key, value in admission.counters.items()],
+)
+REGISTRY.counter_callback(
+    "sakhi_idempotency_events_total", "Chat turns by message_id outcome (executed, joined, replayed, failed).", ("event",),
+    lambda: [((key,), value) for key, value in idempotency.counters.items()],
+)
+REGISTRY.counter_callback(
+    "sakhi_coalesced_messages_total", "Message bursts answered as one turn (turns) and messages folded into them (merged).", ("event",),
+    lambda: [((key,), value) for key, value in coalescer.counters.items()],
+)
+REGISTRY.counter_callback(
+    "sakhi_user_lock_events_total", "Per-user turn lock acquisitions, contended waits and timeouts.", ("event",),
+    lambda: [((key,), value) for key, value in user_locks.counters.items()],
+)
+REGISTRY.gauge_callback(
+    "sakhi_user_lock_active_users", "Users with a chat turn holding or waiting for their lock.", (),
+    lambda: [((), user_locks.stats()["active_users"])],
+)
+REGISTRY.counter_callback(
+    "sakhi_conversation_log_events_total", "Conversation logger counters (rows enqueued, flushed, spilled, ...).", ("event",),
+    lambda: [((key,), value) for key, value in get_conversation_logger().stats.items()],
+)
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
+@app.on_event("startup")
+async def preload_section_store():
+    # Keep sakhi_sections content in memory so RAG RPCs only return IDs + scores
+    try:
+        await get_section_store().async_load()
+    except Exception as e:
+        print(f"⚠️ Section store preload failed, sections will load on demand: {e}")
+
+
+@app.on_event("startup")
+async def start_conversation_logger():
+    # Conversation rows are written in batches off the request path
+    await get_conversation_logger().start()
+
+
+@app.on_event("startup")
+async def start_rewards_ledger():
+    # Point awards are coalesced per user and flushed in one RPC
+    await get_rewards_ledger().start()
+
+
+@app.on_event("shutdown")
+async def drain_background_work():
+    # Order matters: queued tasks may still award points or log messages
+    await get_background_runner().drain()
+    await get_rewards_ledger().stop()
+    await get_conversation_logger().stop()
 
 
 class RegisterRequest(BaseModel):
@@ -80,6 +218,10 @@ class ChatRequest(BaseModel):
     phone_number: str | None = None
     message: str
     language: str = "en"
+    include_timings: bool = False  # add a per-stage `timings` block to the reply
+    pipeline_mode: str | None = None  # force "normal" / "lean" / "emergency" (default: automatic)
+    message_id: str | None = None  # WhatsApp message ID; webhook retries with the same ID reuse the reply
+    coalesce: bool = False  # merge a quick burst of messages from this user into one turn
 
 
 class AnswerItem(BaseModel):
@@ -176,17 +318,156 @@ def register_user(req: RegisterRequest):
 
 
 @app.post("/sakhi/chat")
-async def sakhi_chat(req: ChatRequest):
+async def sakhi_chat(req: ChatRequest, request: Request = None):
+    try:
+        # Stops the turn and its in-flight LLM calls if the client disconnects or the deadline passes
+        payload = await run_cancellable(_dedupe_and_handle(req), request)
+    except TurnCancelled as e:
+        annotate(route="cancelled", cancel_reason=e.reason)
+        if e.reason == "deadline":
+            return busy_reply()
+        return Response(status_code=499)  # client closed the request; nobody reads this
+
+    trace = current_trace()
+    if trace is not None and (req.include_timings or TIMINGS_IN_RESPONSE) and isinstance(payload, dict):
+        payload["timings"] = trace.as_dict()
+    return payload
+
+
+async def _dedupe_and_handle(req: ChatRequest):
+    if req.message_id:
+        # Webhook retry of a running or answered turn: no second pipeline run
+        key = f"{req.user_id or req.phone_number or ''}:{req.message_id}"
+        payload, outcome = await idempotency.run(
+            key,
+            lambda: _coalesce_and_handle(req),
+            # A shed turn is not an answer; let the next retry run
+            cacheable=lambda reply: not (isinstance(reply, dict) and reply.get("mode") == "busy"),
+        )
+        if outcome != EXECUTED:
+            annotate(route="duplicate", idempotency=outcome)
+        return payload
+    return await _coalesce_and_handle(req)
+
+
+async def _coalesce_and_handle(req: ChatRequest):
+    user_key = req.user_id or req.phone_number
+    if not user_key:
+        return await _admit_and_handle(req)
+    if (req.coalesce or COALESCE_MESSAGES) and await _coalescible(req):
+        with span("coalesce"):
+            merged = await coalescer.submit(
+                user_key, req.message, on_abandon=lambda text: _persist_unanswered(req, text)
+            )
+        if merged is None:
+            # A later message from this user carries this one into its turn
+            annotate(route="merged")
+            return merged_reply()
+        req = req.model_copy(update={"message": merged})
+
+    try:
+        return await _admit_and_handle(req, user_key)
+    except asyncio.CancelledError:
+        # Cancelled before the pipeline saved the message: keep it in the history anyway
+        if not reached("user_message_saved"):
+            _persist_unanswered(req, req.message)
+        raise
+
+
+async def _coalescible(req: ChatRequest) -> bool:
+    if req.message.strip().startswith("/"):
+        return False  # commands: no lookups needed
+    with span("coalesce_check"):
+        user = await async_get_user_profile(req.user_id) if req.user_id else await async_get_user_by_phone(req.phone_number)
+        chat_state = await asyncio.to_thread(_get_chat_state, user.get("user_id")) if user else None
+    return should_coalesce(req.message, user, chat_state)
+
+
+def _persist_unanswered(req: ChatRequest, text: str) -> None:
+    background.submit(
+        "save_user_message", _save_unanswered_message, req.user_id, req.phone_number, text, req.language
+    )
+
+
+async def _save_unanswered_message(user_id: str | None, phone_number: str | None, text: str, language: str):
+    user = await async_get_user_profile(user_id) if user_id else await async_get_user_by_phone(phone_number)
+    if not user:
+        return
+    # Onboarding answers and commands are not conversation messages
+    onboarded = user.get("name") and user.get("gender") and (user.get("location") or user.get("Location"))
+    if not onboarded or text.strip().lower() in ("/rewards", "/newlead"):
+        return
+    save_user_message(user.get("user_id"), text, language)
+
+
+async def _admit_and_handle(req: ChatRequest, user_key: str | None = None):
+    if user_key is None:
+        return await _admit_and_run(req)
+    # Queued turns of one user hold admission slots while they wait for the user's lock:
+    # cap them so one user's burst cannot take the slots other users need
+    if not user_locks.reserve(user_key):
+        annotate(route="busy")
+        return busy_reply()
+    try:
+        return await _admit_and_run(req, user_key)
+    finally:
+        user_locks.unreserve(user_key)
+
+
+async def _admit_and_run(req: ChatRequest, user_key: str | None = None):
+    # Shed load before any LLM work: bounded concurrency + bounded queue wait
+    with span("admission"):
+        admitted = await admission.acquire()
+    if not admitted:
+        annotate(route="busy")
+        return busy_reply()
+
+    started = None
+    ok = False
+    cancelled = False
+    try:
+        if user_key is not None:
+            # One turn per user at a time: onboarding and lead flow read-decide-write chat state.
+            # Taken after admission so turns waiting in the queue hold no lock (nor its DB connection)
+            try:
+                with span("user_lock"):
+                    await user_locks.acquire(user_key)
+            except UserLockTimeout:
+                annotate(route="busy")
+                return busy_reply()
+        try:
+            started = time.perf_counter()
+            payload = await _handle_chat(req)
+            ok = True
+        finally:
+            if user_key is not None:
+                await user_locks.release(user_key)
+    except HTTPException as e:
+        ok = e.status_code < 500
+        raise
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        # Time spent waiting for the user's lock says nothing about upstream speed
+        observe = started is not None and not cancelled
+        admission.release(time.perf_counter() - started if observe else 0.0, ok, observe=observe)
+    return payload
+
+
+async def _handle_chat(req: ChatRequest):
     # 1. Resolve or Create User
     user = None
-    if req.user_id:
-        user = get_user_profile(req.user_id)
-    elif req.phone_number:
-        user = get_user_by_phone(req.phone_number)
+    with span("profile"):
+        if req.user_id:
+            user = await async_get_user_profile(req.user_id)
+        elif req.phone_number:
+            user = await async_get_user_by_phone(req.phone_number)
 
     # If new user (by phone), create them
     if not user:
         if req.phone_number:
+            annotate(route="onboarding")
             try:
                 user = create_partial_user(req.phone_number)
                 # Return Welcome Message
@@ -201,6 +482,7 @@ async def sakhi_chat(req: ChatRequest):
              raise HTTPException(status_code=400, detail="user_id or phone_number is required")
 
     user_id = user.get("user_id")
+    annotate(user_id=user_id)
 
     # 2. Check Onboarding Status (NULL checks)
     current_name = user.get("name")
@@ -212,6 +494,9 @@ async def sakhi_chat(req: ChatRequest):
 
     msg = req.message.strip()
 
+    if not (current_name and current_gender and current_location):
+        annotate(route="onboarding")
+
     # STATE 1: WAITING FOR NAME (User sent Name)
     if not current_name:
         update_user_profile(user_id, {"name": msg})
@@ -256,6 +541,7 @@ async def sakhi_chat(req: ChatRequest):
 
     # 2.0 Check /rewards command
     if msg.lower() == "/rewards":
+        annotate(route="rewards")
         total = get_user_rewards(user_id)
         return {
             "reply": f"🏆 You have earned {total} reward points! Keep asking questions to earn more.",
@@ -266,12 +552,14 @@ async def sakhi_chat(req: ChatRequest):
     # 2.1 Check Lead Feature Flow (/newlead or in-progress)
     try:
         # Check separate state table, do NOT rely on user['context']
-        chat_state = _get_chat_state(user_id)
+        with span("chat_state"):
+            chat_state = _get_chat_state(user_id)
         if chat_state is None:
              chat_state = {}
         
         # Check if user triggered new lead OR is currently in a lead flow step
         if msg.lower() == "/newlead" or (chat_state.get("lead_flow") and chat_state["lead_flow"].get("step")):
+             annotate(route="lead")
              return handle_lead_flow(user_id, msg, user)
     except Exception as e:
         print(f"❌ ERROR in Lead Flow: {e}")
@@ -281,14 +569,21 @@ async def sakhi_chat(req: ChatRequest):
         pass
 
     # 3. Normal Flow
+    # Pipeline mode: lean/emergency skip optional stages under load or OpenAI slowdowns
+    mode = pipeline_modes.select(req.pipeline_mode)
+    policy = MODE_POLICIES[mode]
+    annotate(pipeline_mode=mode.value)
     
     # ===== GUARDRAILS: Detect Intent & Handle Out-of-Scope =====
     # Check if user is asking about off-topic things (sports, movies, etc.)
-    redirect_response = guardrails.get_redirect_for_out_of_scope(req.message)
+    with span("guardrails"):
+        redirect_response = guardrails.get_redirect_for_out_of_scope(req.message)
     if redirect_response:
+        annotate(route="out_of_scope")
         # Politely redirect to fertility/pregnancy topics
         try:
             save_user_message(user_id, req.message, req.language)
+            checkpoint("user_message_saved")
             save_sakhi_message(user_id, redirect_response, req.language)
         except:
             pass
@@ -300,7 +595,9 @@ async def sakhi_chat(req: ChatRequest):
         }
     
     try:
-        save_user_message(user_id, req.message, req.language)
+        with span("save_user_message"):
+            save_user_message(user_id, req.message, req.language)
+        checkpoint("user_message_saved")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save user message: {e}")
 
@@ -324,7 +621,11 @@ async def sakhi_chat(req: ChatRequest):
     # BETTER: Wait for classification/translation first? 
     # Actually, let's run it parallel with just the raw message. SLM can handle language.
     # We'll pass the requested language if user explicitly sent one, or just 'en' for now.
-    intent_task = asyncio.create_task(slm_client.generate_intent_label(req.message, language=req.language))
+    if policy.intent_label:
+        intent_task = asyncio.create_task(slm_client.generate_intent_label(req.message, language=req.language))
+    else:
+        # Skipped in lean/emergency mode; an already-finished awaitable keeps the gather below unchanged
+        intent_task = asyncio.sleep(0, result=FALLBACK_INTENT_LABEL)
 
     # Wait for all to complete
     try:
@@ -339,6 +640,7 @@ async def sakhi_chat(req: ChatRequest):
     
     # Pass English query to router for better accuracy on non-English inputs
     route = await model_gateway.decide_route(english_intent_query)
+    annotate(route=route.value)
     # STEP: Decide FINAL response language (single source of truth)
     detected_lang = classification.get("language", "en").lower()
     signal = classification.get("signal", "NO")
@@ -351,22 +653,18 @@ async def sakhi_chat(req: ChatRequest):
         target_lang = "English"
 
 
-    # Fetch user name for personalization
-    user_name = None
-    try:
-        profile = get_user_profile(user_id)
-        if profile:
-            user_name = profile.get("name")
-            if user_name and not user_name.strip():
-                user_name = None
-    except Exception as e:
-        print(f"DEBUGGING ERROR: Failed to fetch profile for name: {e}")
+    # User name for personalization (the profile resolved at the start of the turn)
+    user_name = user.get("name")
+    if user_name and not user_name.strip():
         user_name = None
 
     print(f"DEBUG: Final user_name passed to LLM: '{user_name}'")
 
     # Conversation history for both modes
-    history = get_last_messages(user_id, limit=5)
+    history = []
+    if policy.history:
+        with span("history"):
+            history = get_last_messages(user_id, limit=5)
 
     # ===== ROUTE 1: SLM_DIRECT (Small talk, no RAG) =====
     if route == Route.SLM_DIRECT:
@@ -378,7 +676,7 @@ async def sakhi_chat(req: ChatRequest):
             )
 
             # HARD ENFORCEMENT: Tinglish check for SLM
-            if target_lang.lower() == "tinglish":
+            if policy.rewrite and target_lang.lower() == "tinglish":
                  if contains_telugu_unicode(final_ans) or is_mostly_english(final_ans):
                      print("⚠️ SLM Validation Failure. Forcing Rewrite.")
                      final_ans = await force_rewrite_to_tinglish(final_ans, user_name=user_name)
@@ -386,7 +684,8 @@ async def sakhi_chat(req: ChatRequest):
             raise HTTPException(status_code=500, detail=f"Failed to generate SLM chat response: {e}")
         
         try:
-            save_sakhi_message(user_id, final_ans, target_lang)
+            with span("save_sakhi_message"):
+                save_sakhi_message(user_id, final_ans, target_lang)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to save Sakhi message: {e}")
         
@@ -401,7 +700,7 @@ async def sakhi_chat(req: ChatRequest):
         final_ans = re.sub(r'(?i)\b(aam|aayi)\b[,.]*', '', final_ans).strip()
 
         # Award points asynchronously (CONVERSATIONAL = 1 pt)
-        asyncio.create_task(award_points(user_id, RewardType.CONVERSATIONAL))
+        background.submit("award_points", award_points, user_id, RewardType.CONVERSATIONAL)
 
         return {
             "reply": final_ans,
@@ -411,6 +710,7 @@ async def sakhi_chat(req: ChatRequest):
             "mode": "general",
             "language": target_lang,
             "route": "slm_direct",
+            "pipeline_mode": mode.value,
             "intent": intent_label
         }
     
@@ -431,7 +731,9 @@ async def sakhi_chat(req: ChatRequest):
             # STRATEGY CHANGE for Tinglish & Telugu:
             # 1. Ask SLM for English (Ensures factual accuracy from RAG)
             # 2. Use GPT-4o-mini to translate to natural Tinglish/Telugu
-            effective_lang = "English" if target_lang in ["Tinglish", "Telugu"] else target_lang
+            # Emergency mode: answer directly in the target language, no rewrite pass
+            rewrite = policy.rewrite and target_lang in ["Tinglish", "Telugu"]
+            effective_lang = "English" if rewrite else target_lang
 
             final_ans = await slm_client.generate_rag_response(
                 context=context_text,
@@ -441,17 +743,24 @@ async def sakhi_chat(req: ChatRequest):
             )
 
             # FORCE REWRITE
-            if target_lang == "Tinglish":
+            if rewrite and target_lang == "Tinglish":
                  print(f"ℹ️  Tinglish requested. Converting English SLM response to Tinglish...")
-                 final_ans = await force_rewrite_to_tinglish(final_ans, user_name=user_name)
-            elif target_lang == "Telugu":
+                 final_ans = await force_rewrite_to_tinglish(
+                     final_ans, user_name=user_name, include_follow_ups=policy.follow_ups
+                 )
+            elif rewrite and target_lang == "Telugu":
                  print(f"ℹ️  Telugu requested. Converting English SLM response to Telugu...")
-                 final_ans = await force_rewrite_to_telugu(final_ans, user_name=user_name)
+                 final_ans = await force_rewrite_to_telugu(
+                     final_ans, user_name=user_name, include_follow_ups=policy.follow_ups
+                 )
+            if not policy.follow_ups:
+                final_ans = strip_follow_ups(final_ans)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to generate SLM RAG response: {e}")
         
         try:
-            save_sakhi_message(user_id, final_ans, target_lang)
+            with span("save_sakhi_message"):
+                save_sakhi_message(user_id, final_ans, target_lang)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to save Sakhi message: {e}")
         
@@ -476,6 +785,7 @@ async def sakhi_chat(req: ChatRequest):
             "infographic_url": infographic_url,
             "infographic_url": infographic_url,
             "route": "slm_rag",
+            "pipeline_mode": mode.value,
             "intent": intent_label
         }
         
@@ -493,11 +803,11 @@ async def sakhi_chat(req: ChatRequest):
              best_similarity = max((item.get("similarity", 0) for item in kb_results), default=0.0)
 
         reward_type = classify_for_reward(route="slm_rag", rag_similarity=best_similarity)
-        asyncio.create_task(award_points(user_id, reward_type))
+        background.submit("award_points", award_points, user_id, reward_type)
         
         # Store new questions for KB expansion
         if reward_type == RewardType.NEW_QUESTION:
-            asyncio.create_task(store_new_question(user_id, req.message, best_similarity))
+            background.submit("store_new_question", store_new_question, user_id, req.message, best_similarity)
         
         # Safe logging to avoid Unicode errors on Windows console
         try:
@@ -518,12 +828,15 @@ async def sakhi_chat(req: ChatRequest):
             target_lang=target_lang,
             history=history,
             user_name=user_name,
+            follow_ups=policy.follow_ups,
+            rewrite=policy.rewrite,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate medical response: {e}")
 
     try:
-        save_sakhi_message(user_id, final_ans, target_lang)
+        with span("save_sakhi_message"):
+            save_sakhi_message(user_id, final_ans, target_lang)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save Sakhi message: {e}")
 
@@ -550,6 +863,7 @@ async def sakhi_chat(req: ChatRequest):
         "infographic_url": infographic_url,
         "infographic_url": infographic_url,
         "route": "openai_rag",
+        "pipeline_mode": mode.value,
         "intent": intent_label
     }
     
@@ -557,7 +871,7 @@ async def sakhi_chat(req: ChatRequest):
     response_payload["reply"] = guardrails.clean_output(final_ans)
     
     # Award points asynchronously (MEDICAL = 3 pts for OpenAI RAG)
-    asyncio.create_task(award_points(user_id, RewardType.MEDICAL))
+    background.submit("award_points", award_points, user_id, RewardType.MEDICAL)
     
     # Safe logging to avoid Unicode errors on Windows console
     try:
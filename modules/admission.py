@@ -0,0 +1,161 @@
+# modules/admission.py
+"""
+Admission control for /sakhi/chat.
+
+At most `limit` chat turns run at once; further turns wait in a bounded FIFO
+queue for up to `queue_timeout` seconds. A turn that finds the queue full, or
+whose wait expires, is shed and gets a short "Sakhi is busy" reply instead of
+starting its LLM calls.
+
+The limit adapts AIMD-style from the latency of admitted turns (which is
+dominated by the OpenAI / SLM calls they make):
+- a turn that finishes within `latency_target` grows the limit by 1/limit
+  (about +1 per `limit` good turns),
+- a slower or failed turn shrinks it by `backoff`, at most once per
+  `cooldown` seconds so one burst of slow turns counts as one signal.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", "16"))
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "2"))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+ADMISSION_LATENCY_TARGET_SECONDS = float(os.getenv("ADMISSION_LATENCY_TARGET_SECONDS", "12"))
+ADMISSION_BACKOFF = 0.75
+ADMISSION_COOLDOWN_SECONDS = 2.0
+
+BUSY_RETRY_AFTER_SECONDS = 30
+BUSY_REPLY = (
+    "Sakhi is helping a lot of people right now 🙏 "
+    "Please send your message again in a minute and I'll be right with you."
+)
+
+
+class AdmissionController:
+    """Adaptive concurrency limit with a bounded wait queue (one per event loop)."""
+
+    def __init__(
+        self,
+        initial_limit: int = ADMISSION_INITIAL_LIMIT,
+        min_limit: int = ADMISSION_MIN_LIMIT,
+        max_limit: int = ADMISSION_MAX_LIMIT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        latency_target: float = ADMISSION_LATENCY_TARGET_SECONDS,
+        backoff: float = ADMISSION_BACKOFF,
+        cooldown: float = ADMISSION_COOLDOWN_SECONDS,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._last_decrease = float("-inf")
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0, "increases": 0, "decreases": 0}
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Take a slot, waiting in the queue up to `timeout` (default
+        queue_timeout). Returns False if the turn should be shed; callers
+        that get True must call release().
+        """
+        if self.in_flight < self.limit and not self.queued:
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+            return True
+        if self.queued >= self.max_queue:
+            self.counters["rejected"] += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.counters["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout if timeout is None else timeout)
+            return True  # release() handed its slot over (in_flight already counted)
+        except asyncio.TimeoutError:
+            self.counters["timed_out"] += 1
+            return False
+        except asyncio.CancelledError:
+            # Client went away; give back a slot that was granted at the same moment
+            if waiter.done() and not waiter.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self, latency: float, ok: bool = True, observe: bool = True) -> None:
+        """
+        Return a slot and feed the turn's latency/outcome into the limit
+        (observe=False for cancelled turns, which say nothing about upstream speed).
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if observe:
+            self._observe(latency, ok)
+        self._wake()
+
+    def _observe(self, latency: float, ok: bool) -> None:
+        if ok and latency <= self.latency_target:
+            if self._limit < self.max_limit:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                self.counters["increases"] += 1
+            return
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown:
+            self._limit = max(self.min_limit, self._limit * self.backoff)
+            self._last_decrease = now
+            self.counters["decreases"] += 1
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            self.counters["admitted"] += 1
+            waiter.set_result(True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"limit": self.limit, "in_flight": self.in_flight, "queued": self.queued, **self.counters}
+
+
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
+
+
+def busy_reply() -> Dict[str, Any]:
+    """Fast reply for a shed chat turn."""
+    return {
+        "reply": BUSY_REPLY,
+        "mode": "busy",
+        "retry_after_seconds": BUSY_RETRY_AFTER_SECONDS,
+        "intent": "The intent is to retry later",
+    }
@@ -0,0 +1,350 @@
+# modules/ann_index.py
+"""
+Pure-numpy approximate nearest-neighbour index (IVF with optional PQ).
+
+- IVF: k-means partitions the (unit-normalised) vectors into `nlist` lists.
+  A query only scores the vectors in its `nprobe` closest lists.
+- PQ (optional): instead of full vectors each list stores the residual
+  (vector - list centroid) as `pq_m` one-byte codes, one per sub-space.
+  Inner products are then a table lookup per code (asymmetric distance).
+  PQ scores alone rank poorly, so with `refine_storage` set the index also
+  keeps compact full vectors and re-scores the best `refine_factor * k` PQ
+  candidates with them.
+- Without PQ, vectors are held as float32, float16 or per-vector-scaled
+  int8 (see modules/embedding_store.py).
+
+Scores are cosine similarities (inner product of normalised vectors), the
+same scale as the Supabase RPCs. Training is meant to run offline
+(scripts/build_ann_index.py); the API workers only load and search.
+"""
+import json
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules.embedding_store import quantize, dequantize
+
+INDEX_FORMAT_VERSION = 1
+KMEANS_BATCH_ROWS = 8192
+DEFAULT_REFINE_FACTOR = 10   # PQ candidates re-scored per requested result
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Return float32 rows scaled to unit length (zero rows stay zero)."""
+    arr = np.asarray(vectors, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr[None, :]
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+def _nearest_centroid(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (L2) for each row, computed in batches."""
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+    assign = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), KMEANS_BATCH_ROWS):
+        block = data[start:start + KMEANS_BATCH_ROWS]
+        # ||x - c||^2 = ||x||^2 - 2x.c + ||c||^2 ; ||x||^2 is constant per row
+        dist = c_sq[None, :] - 2.0 * (block @ centroids.T)
+        assign[start:start + len(block)] = np.argmin(dist, axis=1)
+    return assign
+
+
+def train_kmeans(
+    data: np.ndarray,
+    k: int,
+    n_iter: int = 20,
+    seed: int = 0,
+    sample_size: Optional[int] = 65536,
+) -> np.ndarray:
+    """
+    Lloyd's k-means on (a sample of) `data`. Returns a (k, dim) float32 array.
+    Empty clusters are re-seeded from random points.
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    if sample_size and len(data) > sample_size:
+        data = data[rng.choice(len(data), sample_size, replace=False)]
+
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = _nearest_centroid(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+
+        # Sum rows per cluster without a (k x n) one-hot matrix
+        order = np.argsort(assign, kind="stable")
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+
+    return centroids
+
+
+def exact_search(vectors: np.ndarray, query, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """Brute-force top-k by inner product. Returns (row_indices, scores)."""
+    q = normalize_rows(query)[0]
+    scores = vectors @ q
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit vectors, optionally product-quantised.
+
+    Usage:
+        index = IVFIndex(nlist=256, pq_m=64, refine_storage="int8")
+        index.train(vectors)
+        index.add(vectors, ids)
+        ids, scores = index.search(query_vector, k=10, nprobe=8)
+    """
+
+    def __init__(
+        self,
+        nlist: int = 256,
+        nprobe: int = 8,
+        pq_m: Optional[int] = None,
+        pq_ksub: int = 256,
+        storage: str = "float32",
+        refine_storage: Optional[str] = None,
+        refine_factor: int = DEFAULT_REFINE_FACTOR,
+    ):
+        if pq_ksub > 256:
+            raise ValueError("pq_ksub must be <= 256 (codes are stored as uint8)")
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_ksub = pq_ksub
+        self.storage = storage
+        self.refine_storage = refine_storage if pq_m else None
+        self.refine_factor = refine_factor
+
+        self.dim: Optional[int] = None
+        self.centroids: Optional[np.ndarray] = None      # (nlist, dim)
+        self.codebooks: Optional[np.ndarray] = None      # (pq_m, pq_ksub, dim // pq_m)
+        self.offsets = np.zeros(1, dtype=np.int64)       # list l spans [offsets[l], offsets[l+1])
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors: Optional[np.ndarray] = None        # (n, dim) in `storage` dtype (`refine_storage` with PQ)
+        self.scales: Optional[np.ndarray] = None         # (n,) per-vector scales for int8 vectors
+        self.codes: Optional[np.ndarray] = None          # (n, pq_m) uint8 when using PQ
+
+    # ------------------------------------------------------------------
+    # Training / building (offline)
+    # ------------------------------------------------------------------
+    @property
+    def uses_pq(self) -> bool:
+        return bool(self.pq_m)
+
+    @property
+    def vector_storage(self) -> Optional[str]:
+        """dtype of the full vectors held, or None for a PQ-only index."""
+        return self.refine_storage if self.uses_pq else self.storage
+
+    def train(self, vectors, n_iter: int = 20, seed: int = 0) -> None:
+        data = normalize_rows(vectors)
+        self.dim = data.shape[1]
+        self.centroids = train_kmeans(data, self.nlist, n_iter=n_iter, seed=seed)
+        self.nlist = len(self.centroids)
+
+        if self.uses_pq:
+            if self.dim % self.pq_m:
+                raise ValueError(f"dim {self.dim} is not divisible by pq_m {self.pq_m}")
+            residuals = data - self.centroids[_nearest_centroid(data, self.centroids)]
+            dsub = self.dim // self.pq_m
+            self.codebooks = np.stack([
+                train_kmeans(residuals[:, j * dsub:(j + 1) * dsub], self.pq_ksub, n_iter=n_iter, seed=seed + j + 1)
+                for j in range(self.pq_m)
+            ])
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        dsub = self.dim // self.pq_m
+        codes = np.empty((len(residuals), self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            codes[:, j] = _nearest_centroid(residuals[:, j * dsub:(j + 1) * dsub], self.codebooks[j])
+        return codes
+
+    def add(self, vectors, ids=None) -> None:
+        """Assign vectors to lists and (re)build the contiguous list layout."""
+        if self.centroids is None:
+            raise RuntimeError("IVFIndex.train() must be called before add()")
+        data = normalize_rows(vectors)
+        new_ids = np.arange(len(self.ids), len(self.ids) + len(data)) if ids is None else np.asarray(ids, dtype=np.int64)
+
+        assign = _nearest_centroid(data, self.centroids)
+        codes = vectors = scales = None
+        if self.uses_pq:
+            codes = self._encode(data - self.centroids[assign])
+        if self.vector_storage:
+            vectors, scales = quantize(data, self.vector_storage)
+
+        # Merge with what we already hold, then sort by list id
+        if len(self.ids):
+            old_assign = np.repeat(np.arange(self.nlist), np.diff(self.offsets))
+            assign = np.concatenate([old_assign, assign])
+            new_ids = np.concatenate([self.ids, new_ids])
+            if codes is not None:
+                codes = np.concatenate([self.codes, codes])
+            if vectors is not None:
+                vectors = np.concatenate([self.vectors, vectors])
+            if scales is not None:
+                scales = np.concatenate([self.scales, scales])
+
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.nlist)
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.ids = new_ids[order]
+        self.codes = codes[order] if codes is not None else None
+        self.vectors = vectors[order] if vectors is not None else None
+        self.scales = scales[order] if scales is not None else None
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _vector_scores(self, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        return dequantize(self.vectors[rows], self.scales[rows] if self.scales is not None else None) @ q
+
+    def search(self, query, k: int = 10, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k (ids, cosine scores) from the `nprobe` closest lists. With PQ
+        and refine vectors, the PQ shortlist is re-scored with the vectors.
+        """
+        if not len(self.ids):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        q = normalize_rows(query)[0]
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        coarse = self.centroids @ q
+        probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+
+        sizes = self.offsets[probe + 1] - self.offsets[probe]
+        rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in probe])
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if self.uses_pq:
+            dsub = self.dim // self.pq_m
+            # table[j, c] = q_j . codebook_j[c]  ->  q.x = q.centroid + sum_j table[j, code_j]
+            table = np.einsum("mkd,md->mk", self.codebooks, q.reshape(self.pq_m, dsub))
+            scores = np.repeat(coarse[probe], sizes) + table[np.arange(self.pq_m), self.codes[rows]].sum(axis=1)
+            if self.vectors is not None:
+                size = min(len(scores), k * self.refine_factor)
+                shortlist = np.argpartition(-scores, size - 1)[:size]
+                rows = rows[shortlist]
+                scores = self._vector_scores(rows, q)
+        else:
+            scores = self._vector_scores(rows, q)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return self.ids[rows[top]], scores[top].astype(np.float32)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self, path: str, extra: Optional[Dict[str, np.ndarray]] = None) -> None:
+        """
+        Persist to a single .npz file. `extra` arrays (e.g. chunk -> section
+        mapping) are stored alongside under their own names.
+        """
+        meta = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "pq_m": self.pq_m,
+            "pq_ksub": self.pq_ksub,
+            "storage": self.storage,
+            "refine_storage": self.refine_storage,
+            "refine_factor": self.refine_factor,
+            "dim": self.dim,
+        }
+        arrays = {
+            "meta": np.array(json.dumps(meta)),
+            "centroids": self.centroids,
+            "offsets": self.offsets,
+            "ids": self.ids,
+        }
+        if self.uses_pq:
+            arrays["codebooks"] = self.codebooks
+            arrays["codes"] = self.codes
+        if self.vectors is not None:
+            arrays["vectors"] = self.vectors
+            if self.scales is not None:
+                arrays["scales"] = self.scales
+        for name, value in (extra or {}).items():
+            arrays[f"extra_{name}"] = value
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["IVFIndex", Dict[str, np.ndarray]]:
+        """Load an index saved by save(). Returns (index, extra_arrays)."""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("format_version") != INDEX_FORMAT_VERSION:
+                raise ValueError(f"Unsupported ANN index format: {meta.get('format_version')}")
+
+            index = cls(
+                nlist=meta["nlist"],
+                nprobe=meta["nprobe"],
+                pq_m=meta["pq_m"],
+                pq_ksub=meta["pq_ksub"],
+                storage=meta.get("storage", "float32"),
+                refine_storage=meta.get("refine_storage"),
+                refine_factor=meta.get("refine_factor", DEFAULT_REFINE_FACTOR),
+            )
+            index.dim = meta["dim"]
+            index.centroids = data["centroids"]
+            index.offsets = data["offsets"]
+            index.ids = data["ids"]
+            if index.uses_pq:
+                index.codebooks = data["codebooks"]
+                index.codes = data["codes"]
+            if "vectors" in data.files:
+                index.vectors = data["vectors"]
+                index.scales = data["scales"] if "scales" in data.files else None
+            extra = {name[len("extra_"):]: data[name] for name in data.files if name.startswith("extra_")}
+        return index, extra
+
+
+def recall_at_k(approx_ids: List[np.ndarray], exact_ids: List[np.ndarray], k: int) -> float:
+    """Mean fraction of the exact top-k found in the approximate top-k."""
+    if not exact_ids:
+        return 0.0
+    hits = [len(set(a[:k].tolist()) & set(e[:k].tolist())) / max(1, min(k, len(e))) for a, e in zip(approx_ids, exact_ids)]
+    return float(np.mean(hits))
+
+
+def tune_nprobe(
+    index: IVFIndex,
+    queries,
+    exact_ids: List[np.ndarray],
+    k: int = 10,
+    target_recall: float = 0.95,
+) -> Tuple[int, Dict[int, float]]:
+    """
+    Smallest nprobe (doubling from 1) whose recall@k reaches target_recall.
+    Returns (nprobe, {nprobe: recall}) and stores the choice on the index.
+    """
+    curve: Dict[int, float] = {}
+    nprobe = 1
+    while True:
+        approx = [index.search(q, k=k, nprobe=nprobe)[0] for q in queries]
+        curve[nprobe] = recall_at_k(approx, exact_ids, k)
+        if curve[nprobe] >= target_recall or nprobe >= index.nlist:
+            break
+        nprobe = min(nprobe * 2, index.nlist)
+    index.nprobe = nprobe
+    return nprobe, curve
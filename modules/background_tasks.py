@@ -0,0 +1,176 @@
+# modules/background_tasks.py
+"""
+Supervised runner for post-response work (reward awards, new-question
+inserts, ...).
+
+Each task type gets its own bounded queue and a fixed number of workers, and
+a global semaphore caps how many background tasks run at once, so a burst
+of post-response DB writes cannot crowd out live requests. Failed tasks are
+retried with exponential backoff. drain() is called on FastAPI shutdown and
+waits (up to a timeout) for queued work to finish.
+
+Workers are started lazily by the first submit(), usually inside a request;
+they run in a fresh context so they do not inherit that request's trace.
+"""
+import asyncio
+import contextvars
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+BACKGROUND_MAX_CONCURRENCY = 4       # tasks running at once, all types
+BACKGROUND_WORKERS_PER_TYPE = 2
+BACKGROUND_QUEUE_SIZE = 1000         # per task type
+BACKGROUND_MAX_RETRIES = 3
+BACKGROUND_RETRY_BASE_DELAY = 0.5    # seconds, doubled per attempt (+ jitter)
+BACKGROUND_DRAIN_TIMEOUT = 10.0
+
+
+@dataclass
+class _Job:
+    fn: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BackgroundRunner:
+    """
+    Usage:
+        runner = get_background_runner()
+        runner.submit("award_points", award_points, user_id, RewardType.MEDICAL)
+        await runner.drain()          # app shutdown
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = BACKGROUND_MAX_CONCURRENCY,
+        workers_per_type: int = BACKGROUND_WORKERS_PER_TYPE,
+        queue_size: int = BACKGROUND_QUEUE_SIZE,
+        max_retries: int = BACKGROUND_MAX_RETRIES,
+        retry_base_delay: float = BACKGROUND_RETRY_BASE_DELAY,
+    ):
+        self.max_concurrency = max_concurrency
+        self.workers_per_type = workers_per_type
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, List[asyncio.Task]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._closed = False
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _type_metrics(self, task_type: str) -> Dict[str, float]:
+        return self._metrics.setdefault(task_type, {
+            "submitted": 0, "completed": 0, "failed": 0, "retried": 0, "dropped": 0,
+            "last_lag_seconds": 0.0, "max_lag_seconds": 0.0,
+        })
+
+    def _ensure_type(self, task_type: str) -> asyncio.Queue:
+        queue = self._queues.get(task_type)
+        if queue is None:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            self._queues[task_type] = queue
+            loop = asyncio.get_running_loop()
+            self._workers[task_type] = [
+                loop.create_task(self._worker(task_type, queue), context=contextvars.Context())
+                for _ in range(self.workers_per_type)
+            ]
+        return queue
+
+    def submit(self, task_type: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> bool:
+        """
+        Queue fn(*args, **kwargs) under task_type. Must be called from the
+        event loop. Returns False if the job was dropped (queue full / closed).
+        """
+        metrics = self._type_metrics(task_type)
+        if self._closed:
+            metrics["dropped"] += 1
+            print(f"⚠️ Background runner closed, dropping {task_type} task")
+            return False
+        queue = self._ensure_type(task_type)
+        try:
+            queue.put_nowait(_Job(fn, args, kwargs))
+        except asyncio.QueueFull:
+            metrics["dropped"] += 1
+            print(f"⚠️ Background queue '{task_type}' full ({self.queue_size}), dropping task")
+            return False
+        metrics["submitted"] += 1
+        return True
+
+    async def _worker(self, task_type: str, queue: asyncio.Queue) -> None:
+        metrics = self._type_metrics(task_type)
+        while True:
+            job = await queue.get()
+            try:
+                lag = time.monotonic() - job.enqueued_at
+                metrics["last_lag_seconds"] = lag
+                metrics["max_lag_seconds"] = max(metrics["max_lag_seconds"], lag)
+                async with self._semaphore:
+                    await self._run_with_retry(task_type, job, metrics)
+            finally:
+                queue.task_done()
+
+    async def _run_with_retry(self, task_type: str, job: _Job, metrics: Dict[str, float]) -> None:
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await job.fn(*job.args, **job.kwargs)
+                metrics["completed"] += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    metrics["failed"] += 1
+                    print(f"❌ Background {task_type} task failed after {attempt} attempts: {e}")
+                    return
+                metrics["retried"] += 1
+                delay = self.retry_base_delay * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+                print(f"⚠️ Background {task_type} task failed (attempt {attempt}): {e}. Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def drain(self, timeout: float = BACKGROUND_DRAIN_TIMEOUT) -> bool:
+        """
+        Stop accepting work, wait for queued tasks, then stop the workers.
+        Returns False if the timeout expired with work still pending.
+        """
+        self._closed = True
+        finished = True
+        if self._queues:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(q.join() for q in self._queues.values())), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                finished = False
+                pending = {t: q.qsize() for t, q in self._queues.items() if q.qsize()}
+                print(f"⚠️ Background drain timed out, abandoning queued tasks: {pending}")
+        workers = [w for ws in self._workers.values() for w in ws]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._queues.clear()
+        self._workers.clear()
+        return finished
+
+    def stats(self) -> Dict[str, Any]:
+        """Per task type: queue depth, counters and lag (enqueue -> start)."""
+        out = {}
+        for task_type, metrics in self._metrics.items():
+            queue = self._queues.get(task_type)
+            out[task_type] = {"queue_depth": queue.qsize() if queue else 0, **metrics}
+        return out
+
+
+_background_runner: Optional[BackgroundRunner] = None
+
+
+def get_background_runner() -> BackgroundRunner:
+    global _background_runner
+    if _background_runner is None:
+        _background_runner = BackgroundRunner()
+    return _background_runner
@@ -0,0 +1,116 @@
+# modules/cancellation.py
+"""
+Request-scoped cancellation of chat turns.
+
+run_cancellable() runs a turn in its own task next to a watcher that polls
+Starlette's request.is_disconnected(). When the client goes away, or the
+turn outlives CHAT_DEADLINE_SECONDS, the task is cancelled. The
+CancelledError surfaces at whatever the turn is awaiting:
+- the asyncio.gather of translation / classification / intent, which
+  cancels all three,
+- an OpenAI or SLM HTTP call, whose connection is closed,
+- a coalescing, user-lock or admission wait.
+The turn's own finally blocks then release its lock and admission slot.
+Work already inside asyncio.to_thread (Supabase calls) finishes in its
+thread; its result is dropped.
+
+Code on the turn path records progress with checkpoint(name) so cleanup can
+tell what already happened (e.g. whether the user message was saved).
+"""
+import asyncio
+import contextvars
+import os
+import time
+from typing import Any, Awaitable, Optional, Set
+
+from modules.metrics import REGISTRY
+
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "60"))  # 0 = no deadline
+DISCONNECT_POLL_SECONDS = 0.5
+
+CANCELLED_TURNS = REGISTRY.counter(
+    "sakhi_cancelled_turns_total", "Chat turns cancelled before finishing (client disconnect or deadline).", ("reason",),
+)
+CANCELLED_WORK = REGISTRY.histogram(
+    "sakhi_cancelled_turn_seconds", "How long a cancelled turn had been running.", ("reason",),
+)
+
+
+class TurnCancelled(Exception):
+    """The turn was cancelled; `reason` is "disconnect" or "deadline"."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+_checkpoints: contextvars.ContextVar = contextvars.ContextVar("sakhi_turn_checkpoints", default=None)
+
+
+def checkpoint(name: str) -> None:
+    """Record that the current turn got past `name` (no-op outside run_cancellable)."""
+    reached_set: Optional[Set[str]] = _checkpoints.get()
+    if reached_set is not None:
+        reached_set.add(name)
+
+
+def reached(name: str) -> bool:
+    reached_set: Optional[Set[str]] = _checkpoints.get()
+    return reached_set is not None and name in reached_set
+
+
+async def _wait_disconnected(request, poll_seconds: float) -> None:
+    try:
+        while not await request.is_disconnected():
+            await asyncio.sleep(poll_seconds)
+    except Exception as e:
+        # Without a working signal only the deadline applies
+        print(f"⚠️ Disconnect watcher failed: {e}")
+        await asyncio.Event().wait()
+
+
+async def run_cancellable(
+    turn: Awaitable[Any],
+    request=None,
+    deadline: float = CHAT_DEADLINE_SECONDS,
+    poll_seconds: float = DISCONNECT_POLL_SECONDS,
+) -> Any:
+    """
+    Await `turn`, cancelling it if `request` disconnects or `deadline`
+    seconds pass. Raises TurnCancelled in that case.
+    """
+    token = _checkpoints.set(set())
+    try:
+        task = asyncio.ensure_future(turn)  # copies the context, checkpoints included
+    finally:
+        _checkpoints.reset(token)
+    watchers = set()
+    if request is not None:
+        watchers.add(asyncio.ensure_future(_wait_disconnected(request, poll_seconds)))
+
+    started = time.perf_counter()
+    try:
+        done, _ = await asyncio.wait(
+            {task, *watchers}, timeout=deadline if deadline > 0 else None, return_when=asyncio.FIRST_COMPLETED
+        )
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        for watcher in watchers:
+            watcher.cancel()
+
+    if task in done:
+        return task.result()
+
+    reason = "disconnect" if done else "deadline"
+    task.cancel()
+    await asyncio.wait({task})  # let the turn's finally blocks run
+    if not task.cancelled():
+        return task.result()  # finished (or failed) at the same moment
+
+    elapsed = time.perf_counter() - started
+    CANCELLED_TURNS.inc(reason=reason)
+    CANCELLED_WORK.observe(elapsed, reason=reason)
+    print(f"🛑 Chat turn cancelled ({reason}) after {elapsed:.1f}s")
+    raise TurnCancelled(reason)
@@ -0,0 +1,143 @@
+# modules/coalescing.py
+"""
+Per-user coalescing of rapid message bursts ("hi" / "I have PCOS" / "can I
+do IVF?") into one chat turn.
+
+Each message for a user joins that user's open burst. The burst closes
+`window_seconds` after its latest message (debounce), `max_wait_seconds`
+after its first message, or as soon as it holds `max_messages`. The caller
+whose message closed the burst gets the merged text and runs the single
+turn; callers whose messages were followed by another one get None and
+answer with merged_reply().
+
+Opt-in per request or for the worker with COALESCE_MESSAGES. Only free-form
+questions of onboarded users are merged (should_coalesce()).
+"""
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+COALESCE_MESSAGES = os.getenv("COALESCE_MESSAGES", "false").lower() in ("1", "true", "yes")
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", "1.5"))
+COALESCE_MAX_WAIT_SECONDS = float(os.getenv("COALESCE_MAX_WAIT_SECONDS", "5"))
+COALESCE_MAX_MESSAGES = int(os.getenv("COALESCE_MAX_MESSAGES", "4"))
+
+
+class _Burst:
+    __slots__ = ("messages", "first_at", "last_at", "arrived")
+
+    def __init__(self, now: float):
+        self.messages: List[str] = []
+        self.first_at = now
+        self.last_at = now
+        # Resolved (and replaced) whenever a newer message joins the burst
+        self.arrived: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class MessageCoalescer:
+    """Debounces each user's messages into bursts answered by one turn."""
+
+    def __init__(
+        self,
+        window_seconds: float = COALESCE_WINDOW_SECONDS,
+        max_wait_seconds: float = COALESCE_MAX_WAIT_SECONDS,
+        max_messages: int = COALESCE_MAX_MESSAGES,
+    ):
+        self.window_seconds = window_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.max_messages = max_messages
+        self._bursts: Dict[str, _Burst] = {}
+        self.counters = {"turns": 0, "merged": 0, "full": 0, "abandoned": 0}
+
+    async def submit(
+        self, user_key: str, message: str, on_abandon: Optional[Callable[[str], None]] = None
+    ) -> Optional[str]:
+        """
+        Add `message` to the user's burst and wait for the burst to close.
+        Returns the merged text if this caller should answer, None if a later
+        message took the burst over. If this caller is cancelled while holding
+        the burst, the burst is dropped and on_abandon gets its merged text.
+        """
+        now = time.monotonic()
+        burst = self._bursts.get(user_key)
+        if burst is None:
+            burst = self._bursts[user_key] = _Burst(now)
+        burst.messages.append(message)
+        burst.last_at = now
+        position = len(burst.messages)
+        previous, burst.arrived = burst.arrived, asyncio.get_running_loop().create_future()
+        previous.set_result(None)
+
+        if position >= self.max_messages:
+            self.counters["full"] += 1
+            return self._close(user_key, burst)
+
+        arrived = burst.arrived
+        try:
+            while True:
+                remaining = min(burst.last_at + self.window_seconds, burst.first_at + self.max_wait_seconds) - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(asyncio.shield(arrived), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if len(burst.messages) > position or self._bursts.get(user_key) is not burst:
+                    self.counters["merged"] += 1
+                    return None
+        except asyncio.CancelledError:
+            # The caller holding the burst went away; nobody will answer these messages
+            if self._bursts.get(user_key) is burst and len(burst.messages) == position:
+                del self._bursts[user_key]
+                self.counters["abandoned"] += 1
+                if on_abandon is not None:
+                    on_abandon("\n".join(burst.messages))
+            raise
+
+        if self._bursts.get(user_key) is not burst or len(burst.messages) > position:
+            self.counters["merged"] += 1
+            return None
+        return self._close(user_key, burst)
+
+    def _close(self, user_key: str, burst: _Burst) -> str:
+        if self._bursts.get(user_key) is burst:
+            del self._bursts[user_key]
+        self.counters["turns"] += 1
+        return "\n".join(burst.messages)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"open_bursts": len(self._bursts), **self.counters}
+
+
+def should_coalesce(message: str, user: Optional[Dict[str, Any]], chat_state: Optional[Dict[str, Any]]) -> bool:
+    """
+    Whether `message` may be merged with its neighbours. Onboarding answers
+    (name, gender, location), commands ("/rewards", "/newlead") and lead-flow
+    answers are one step each and must reach their flow one by one.
+    """
+    if message.strip().startswith("/") or not user:
+        return False
+    if not (user.get("name") and user.get("gender") and (user.get("location") or user.get("Location"))):
+        return False
+    lead_flow = (chat_state or {}).get("lead_flow")
+    return not (lead_flow and lead_flow.get("step"))
+
+
+_message_coalescer: Optional[MessageCoalescer] = None
+
+
+def get_message_coalescer() -> MessageCoalescer:
+    global _message_coalescer
+    if _message_coalescer is None:
+        _message_coalescer = MessageCoalescer()
+    return _message_coalescer
+
+
+def merged_reply() -> Dict[str, Any]:
+    """Acknowledgement for a message answered together with the user's next one."""
+    return {
+        "reply": "",
+        "mode": "merged",
+        "intent": "The intent is to answer together with the next message",
+    }
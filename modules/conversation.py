@@ -1,21 +1,426 @@
 # modules/conversation.py
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import deque, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import threading
+import time
 import uuid
 
-from supabase_client import supabase_insert, supabase_select
+from supabase_client import supabase_insert, supabase_insert_many, supabase_select, RETURN_MINIMAL, SupabaseHTTPError
+
+# Write-behind logging (see ConversationLogger)
+LOG_QUEUE_MAX = 10_000
+LOG_BATCH_SIZE = 100
+LOG_FLUSH_INTERVAL_SECONDS = 0.5
+LOG_SPILL_PATH = os.getenv(
+    "CONVERSATION_SPILL_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "conversation_spill.jsonl"),
+)
+
+
+# Recent-history cache (see HistoryCache)
+HISTORY_CACHE_TURNS = 20
+HISTORY_CACHE_MAX_USERS = 5000
+HISTORY_CACHE_TTL_SECONDS = 600  # bounds staleness when another worker served the user
+
+HISTORY_COLUMNS = "user_id,message_text,message_type,language,created_at"
+# Every logged row carries exactly these keys: PostgREST rejects a bulk insert
+# whose objects have different keys (PGRST102 "All object keys must match")
+LOG_COLUMNS = ("user_id", "message_text", "message_type", "language", "created_at", "chat_id")
+
+
+def _uniform_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{column: row.get(column) for column in LOG_COLUMNS} for row in rows]
+
+
+def _rejected(error: Exception) -> bool:
+    """PostgREST refused the rows themselves; sending them again cannot succeed."""
+    status = getattr(error, "status_code", None)
+    return isinstance(error, SupabaseHTTPError) and 400 <= status < 500 and status not in (408, 429)
+
+
+def _read_rows(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _append_rows(path: str, rows: List[Dict[str, Any]]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def _read_offset(path: str) -> int:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_offset(path: str, offset: int) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(offset))
+    os.replace(tmp_path, path)
+
+
+class HistoryCache:
+    """
+    Per-user ring buffer of the most recent conversation rows, LRU-bounded
+    in the number of users.
+
+    Writes append to a user's buffer only if that user is already cached; a
+    miss is filled from the table (newest first, server-side ordered), so a
+    buffer is never a partial view of the history.
+    """
+
+    def __init__(
+        self,
+        turns: int = HISTORY_CACHE_TURNS,
+        max_users: int = HISTORY_CACHE_MAX_USERS,
+        ttl_seconds: float = HISTORY_CACHE_TTL_SECONDS,
+    ):
+        self.turns = turns
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Last `limit` rows (oldest first) or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or limit > self.turns or time.monotonic() - entry["loaded_at"] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            rows = list(entry["rows"])
+        return rows[-limit:] if limit > 0 else []
+
+    def fill(self, user_id: str, rows: List[Dict[str, Any]]) -> None:
+        """Store rows (oldest first) as the user's buffer."""
+        with self._lock:
+            self._entries[user_id] = {
+                "rows": deque(rows[-self.turns:], maxlen=self.turns),
+                "loaded_at": time.monotonic(),
+            }
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def append(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            entry = self._entries.get(row.get("user_id"))
+            if entry is not None:
+                entry["rows"].append(row)
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_history_cache = HistoryCache()
+
+
+def get_history_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the history cache of this worker."""
+    return _history_cache.stats()
+
+
+class ConversationLogger:
+    """
+    Write-behind queue for sakhi_conversations.
+
+    save_* calls enqueue the row and return immediately; a background task
+    flushes batches with one bulk insert every `flush_interval` seconds, as
+    soon as `batch_size` rows are waiting, and on shutdown. Rows get strictly
+    increasing created_at stamps at enqueue time, so a user message always
+    sorts before the reply that follows it.
+
+    If Supabase is unavailable, or the queue is full, rows are appended to a
+    local JSONL spill file, which is replayed after the next successful flush
+    (and at startup). Replay records its progress after every committed
+    batch, so an interrupted replay resumes where it stopped instead of
+    inserting rows twice; rows PostgREST rejects (4xx) are moved to a
+    `.rejected` file next to the spill. Until start() is called, rows are
+    inserted inline.
+
+    Usage:
+        logger = get_conversation_logger()
+        await logger.start()          # app startup
+        logger.enqueue(row)
+        await logger.stop()           # app shutdown, flushes what is left
+    """
+
+    def __init__(
+        self,
+        max_queue: int = LOG_QUEUE_MAX,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL_SECONDS,
+        spill_path: str = LOG_SPILL_PATH,
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._queue: deque = deque()
+        self._inflight: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._last_ts: Optional[datetime] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._replaying = False
+        self.stats = {
+            "enqueued": 0, "flushed": 0, "batches": 0, "spilled": 0, "replayed": 0, "rejected": 0, "flush_errors": 0,
+        }
+
+    @property
+    def replay_path(self) -> str:
+        return f"{self.spill_path}.replay"
+
+    @property
+    def rejected_path(self) -> str:
+        return f"{self.spill_path}.rejected"
+
+    def has_spill(self) -> bool:
+        """A spill, or a replay that has not finished, is waiting on disk."""
+        return os.path.exists(self.spill_path) or os.path.exists(self.replay_path)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_depth(self) -> int:
+        """Rows waiting to be written (queued + in the batch being flushed)."""
+        with self._lock:
+            return len(self._queue) + len(self._inflight)
+
+    def next_timestamp(self) -> str:
+        """utcnow(), bumped by 1µs if needed so stamps never repeat or go back."""
+        with self._lock:
+            now = datetime.utcnow()
+            if self._last_ts is not None and now <= self._last_ts:
+                now = self._last_ts + timedelta(microseconds=1)
+            self._last_ts = now
+            return now.isoformat()
+
+    def enqueue(self, row: Dict[str, Any]) -> None:
+        if not self.running:
+            supabase_insert("sakhi_conversations", row, returning=RETURN_MINIMAL)
+            return
+
+        with self._lock:
+            full = len(self._queue) >= self.max_queue
+            if not full:
+                self._queue.append(row)
+                self.stats["enqueued"] += 1
+                wake = len(self._queue) >= self.batch_size
+        if full:
+            # Never block the request path: keep the row on disk instead
+            self._spill([row])
+            wake = True
+        if wake:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def pending_for(self, user_id: str) -> List[Dict[str, Any]]:
+        """Rows for this user that are queued or being written, oldest first."""
+        with self._lock:
+            rows = self._inflight + list(self._queue)
+        return [r for r in rows if r.get("user_id") == user_id]
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        await self.replay_spill()
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            while await self.flush_once():
+                pass
+            if self._stopping:
+                return
+
+    async def flush_once(self) -> bool:
+        """Write one batch. Returns True if more rows are waiting."""
+        with self._lock:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._inflight = batch
+        if not batch:
+            return False
+        try:
+            await asyncio.to_thread(
+                supabase_insert_many, "sakhi_conversations", _uniform_rows(batch), returning=RETURN_MINIMAL
+            )
+            self.stats["flushed"] += len(batch)
+            self.stats["batches"] += 1
+            replay = self.has_spill()
+        except Exception as e:
+            print(f"⚠️ Conversation flush failed, spilling {len(batch)} rows: {e}")
+            self.stats["flush_errors"] += 1
+            self._spill(batch)
+            replay = False
+        finally:
+            with self._lock:
+                self._inflight = []
+        if replay:
+            await self.replay_spill()
+        with self._lock:
+            return len(self._queue) > 0
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        with self._spill_lock:
+            _append_rows(self.spill_path, rows)
+        self.stats["spilled"] += len(rows)
+
+    async def replay_spill(self) -> int:
+        """
+        Insert spilled rows (in file order), recording progress after each
+        batch, and remove the files once every row is written or set aside.
+        Returns the number of rows inserted by this call.
+        """
+        if self._replaying:
+            return 0
+        self._replaying = True
+        try:
+            return await self._replay()
+        finally:
+            self._replaying = False
+
+    async def _replay(self) -> int:
+        replay_path, offset_path = self.replay_path, f"{self.replay_path}.offset"
+        with self._spill_lock:
+            # An unfinished replay goes first; otherwise take ownership of the
+            # spill so new spills go to a fresh file
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return 0
+                os.replace(self.spill_path, replay_path)
+        rows = await asyncio.to_thread(_read_rows, replay_path)
+        offset = await asyncio.to_thread(_read_offset, offset_path)
+        replayed = 0
+        while offset < len(rows):
+            batch = rows[offset:offset + self.batch_size]
+            try:
+                await asyncio.to_thread(
+                    # Older spill files may hold rows without chat_id
+                    supabase_insert_many, "sakhi_conversations", _uniform_rows(batch), returning=RETURN_MINIMAL,
+                )
+                replayed += len(batch)
+                done = len(batch)
+            except Exception as e:
+                if not _rejected(e):
+                    # Keep the replay file and offset; the rest is retried before any newer spill
+                    print(f"⚠️ Conversation spill replay failed: {e}")
+                    break
+                inserted, done = await self._replay_rows(batch)
+                replayed += inserted
+            offset += done
+            await asyncio.to_thread(_write_offset, offset_path, offset)
+            if done < len(batch):
+                break
+        else:
+            os.remove(replay_path)
+            if os.path.exists(offset_path):
+                os.remove(offset_path)
+        self.stats["replayed"] += replayed
+        if replayed:
+            print(f"✅ Replayed {replayed} spilled conversation rows")
+        return replayed
+
+    async def _replay_rows(self, batch: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Insert a rejected batch row by row, setting aside the rows that are
+        refused. Stops at the first transient failure. Returns (inserted, done).
+        """
+        inserted, rejected, done = 0, [], 0
+        for row in batch:
+            try:
+                await asyncio.to_thread(
+                    supabase_insert_many, "sakhi_conversations", _uniform_rows([row]), returning=RETURN_MINIMAL,
+                )
+                inserted += 1
+            except Exception as e:
+                if not _rejected(e):
+                    print(f"⚠️ Conversation spill replay failed: {e}")
+                    break
+                rejected.append(row)
+            done += 1
+        if rejected:
+            await asyncio.to_thread(_append_rows, self.rejected_path, rejected)
+            self.stats["rejected"] += len(rejected)
+            print(f"⚠️ Moved {len(rejected)} rejected conversation rows to {self.rejected_path}")
+        return inserted, done
+
+
+_conversation_logger: Optional[ConversationLogger] = None
+
+
+def get_conversation_logger() -> ConversationLogger:
+    global _conversation_logger
+    if _conversation_logger is None:
+        _conversation_logger = ConversationLogger()
+    return _conversation_logger
 
 
 def _save_message(user_id: str, message: str, lang: str, message_type: str, chat_id: str | None = None):
+    logger = get_conversation_logger()
     payload = {
         "user_id": user_id,
         "message_text": message,
         "message_type": message_type,
         "language": lang,
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": logger.next_timestamp(),
+        "chat_id": chat_id,
     }
-    if chat_id:
-        payload["chat_id"] = chat_id
-    return supabase_insert("sakhi_conversations", payload)
+    logger.enqueue(payload)
+    _history_cache.append(payload)
+    return payload
 
 
 def save_user_message(user_id: str, text: str, lang: str = "en"):
@@ -31,26 +436,42 @@ def save_conversation(user_id: str, message: str, message_type: str, language: s
     return _save_message(user_id, message, language, message_type)
 
 
-def get_last_messages(user_id: str, limit: int = 5):
-    """
-    Fetch last N messages for a user ordered by created_at descending.
-    Returns list of {"role": "user"|"sakhi", "content": "..."}.
-    """
+def _fetch_recent_rows(user_id: str, count: int) -> List[Dict[str, Any]]:
+    """Newest `count` rows for the user, returned oldest first."""
     rows = supabase_select(
         "sakhi_conversations",
-        select="user_id,message_text,message_type,language,created_at",
-        filters=f"user_id=eq.{user_id}",
-        limit=50,  # grab recent chunk, then trim
+        select=HISTORY_COLUMNS,
+        filters=f"user_id=eq.{user_id}&order=created_at.desc",
+        limit=count,
     )
+    if not isinstance(rows, list):
+        rows = []
+    # A row being flushed can already be visible in the table
+    stored = {(r.get("created_at", "")[:26], r.get("message_type")) for r in rows}
+    pending = [
+        r for r in get_conversation_logger().pending_for(user_id)
+        if (r["created_at"][:26], r["message_type"]) not in stored
+    ]
+    rows = list(reversed(rows)) + pending
+    return rows[-count:]
 
-    if not rows or not isinstance(rows, list):
-        return []
 
-    sorted_rows = sorted(rows, key=lambda r: r.get("created_at", ""), reverse=True)
-    recent = sorted_rows[:limit]
+def get_last_messages(user_id: str, limit: int = 5):
+    """
+    Fetch last N messages for a user, oldest to newest.
+    Returns list of {"role": "user"|"sakhi", "content": "..."}.
+    Served from the per-user history cache; a miss reads the newest rows
+    (plus any still in the write-behind queue) and fills the cache.
+    """
+    recent = _history_cache.get(user_id, limit)
+    if recent is None:
+        count = max(limit, _history_cache.turns)
+        rows = _fetch_recent_rows(user_id, count)
+        _history_cache.fill(user_id, rows)
+        recent = rows[-limit:] if limit > 0 else []
 
     history = []
-    for r in reversed(recent):  # oldest to newest
+    for r in recent:
         role = "user" if r.get("message_type") == "user" else "sakhi"
         history.append({"role": role, "content": r.get("message_text", "")})
 
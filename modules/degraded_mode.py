@@ -0,0 +1,129 @@
+# modules/degraded_mode.py
+"""
+Pipeline quality/latency modes for /sakhi/chat.
+
+- normal:    every stage.
+- lean:      skips the intent label, the history fetch and follow-up
+             questions (no follow-up rewrite call); keeps the Tinglish/Telugu
+             rewrite of the answer.
+- emergency: lean, and the answer is generated directly in the target
+             language instead of English + a rewrite pass.
+
+The mode is chosen per turn by ModeSelector from OpenAI chat-completion
+health (UPSTREAM_HEALTH) and chat admission load, can be requested per
+request, or pinned for the worker with PIPELINE_MODE. Escalation is
+immediate; stepping back down waits MODE_HOLD_SECONDS so the mode does not
+flap.
+"""
+import os
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+from modules.admission import get_admission_controller
+from modules.metrics import REGISTRY, UPSTREAM_HEALTH
+
+
+class PipelineMode(Enum):
+    NORMAL = "normal"
+    LEAN = "lean"
+    EMERGENCY = "emergency"
+
+
+@dataclass(frozen=True)
+class ModePolicy:
+    intent_label: bool   # SLM intent label call
+    history: bool        # conversation history fetch
+    rewrite: bool        # English answer + Tinglish/Telugu rewrite pass
+    follow_ups: bool     # follow-up questions (and their rewrite call)
+
+
+MODE_POLICIES = {
+    PipelineMode.NORMAL: ModePolicy(intent_label=True, history=True, rewrite=True, follow_ups=True),
+    PipelineMode.LEAN: ModePolicy(intent_label=False, history=False, rewrite=True, follow_ups=False),
+    PipelineMode.EMERGENCY: ModePolicy(intent_label=False, history=False, rewrite=False, follow_ups=False),
+}
+_SEVERITY = [PipelineMode.NORMAL, PipelineMode.LEAN, PipelineMode.EMERGENCY]
+
+# Worker-wide override ("normal" / "lean" / "emergency"); empty = automatic
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "").strip().lower()
+
+# Upstream health signal: recent OpenAI chat completions
+HEALTH_UPSTREAM = ("openai", "chat/completions")
+LEAN_LATENCY_SECONDS = float(os.getenv("LEAN_LATENCY_SECONDS", "6"))
+EMERGENCY_LATENCY_SECONDS = float(os.getenv("EMERGENCY_LATENCY_SECONDS", "12"))
+LEAN_ERROR_RATE = 0.2
+EMERGENCY_ERROR_RATE = 0.5
+# Load signal: chat admission utilisation / queue
+LEAN_UTILIZATION = 0.9
+MODE_HOLD_SECONDS = 30.0
+
+MODE_TURNS = REGISTRY.counter("sakhi_pipeline_mode_turns_total", "Chat turns served per pipeline mode.", ("mode",))
+
+
+def parse_mode(value: Optional[str]) -> Optional[PipelineMode]:
+    if not value:
+        return None
+    try:
+        return PipelineMode(value.strip().lower())
+    except ValueError:
+        return None
+
+
+class ModeSelector:
+    def __init__(self, health=UPSTREAM_HEALTH, admission=None, hold_seconds: float = MODE_HOLD_SECONDS):
+        self.health = health
+        self.admission = admission
+        self.hold_seconds = hold_seconds
+        self._mode = PipelineMode.NORMAL
+        self._escalated_at = float("-inf")
+
+    def _pressure(self) -> PipelineMode:
+        """Mode the current signals call for, without hysteresis."""
+        level = 0
+        snapshot = self.health.snapshot(*HEALTH_UPSTREAM)
+        if snapshot is not None:
+            latency, error_rate = snapshot
+            if latency >= EMERGENCY_LATENCY_SECONDS or error_rate >= EMERGENCY_ERROR_RATE:
+                level = 2
+            elif latency >= LEAN_LATENCY_SECONDS or error_rate >= LEAN_ERROR_RATE:
+                level = 1
+
+        admission = self.admission or get_admission_controller()
+        stats = admission.stats()
+        if stats["queued"] >= max(1, admission.max_queue // 2):
+            level = max(level, 2)
+        elif stats["queued"] > 0 or stats["in_flight"] >= LEAN_UTILIZATION * stats["limit"]:
+            level = max(level, 1)
+        return _SEVERITY[level]
+
+    def current(self) -> PipelineMode:
+        wanted = self._pressure()
+        now = time.monotonic()
+        if _SEVERITY.index(wanted) >= _SEVERITY.index(self._mode):
+            if wanted != self._mode:
+                print(f"⚠️ Pipeline mode {self._mode.value} -> {wanted.value}")
+            self._mode = wanted
+            if wanted != PipelineMode.NORMAL:
+                self._escalated_at = now
+        elif now - self._escalated_at >= self.hold_seconds:
+            print(f"✅ Pipeline mode {self._mode.value} -> {wanted.value}")
+            self._mode = wanted
+        return self._mode
+
+    def select(self, requested: Optional[str] = None) -> PipelineMode:
+        """Mode for one turn: PIPELINE_MODE, else the request's mode, else automatic."""
+        mode = parse_mode(PIPELINE_MODE) or parse_mode(requested) or self.current()
+        MODE_TURNS.inc(mode=mode.value)
+        return mode
+
+
+_mode_selector: Optional[ModeSelector] = None
+
+
+def get_mode_selector() -> ModeSelector:
+    global _mode_selector
+    if _mode_selector is None:
+        _mode_selector = ModeSelector()
+    return _mode_selector
@@ -0,0 +1,169 @@
+# modules/embedding_store.py
+"""
+Compact in-memory storage for embedding vectors.
+
+OpenAI returns Python lists of floats; np.array() of those is float64, i.e.
+~12 KB per 1536-dim vector in every worker. Vectors here are stored
+unit-normalised as:
+- "float32": 4 bytes/dim (reference)
+- "float16": 2 bytes/dim
+- "int8":    1 byte/dim + one float32 scale per vector (symmetric, per-vector)
+
+Search scores the float32 query against the dequantized vectors block by
+block. The full-precision originals are not kept, so quantization error in
+the stored vectors remains; compare_with_float32() measures it.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+SCORE_BLOCK_ROWS = 4096   # Rows dequantised at a time (bounds temporary memory)
+
+
+def _normalize(vectors) -> np.ndarray:
+    arr = np.asarray(vectors, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr[None, :]
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+def quantize(vectors, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode float vectors for storage. Returns (codes, scales); scales is only
+    set for int8, where vector ~= codes * scale.
+    """
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unsupported storage dtype: {dtype}")
+    arr = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float32":
+        return arr, None
+    if dtype == "float16":
+        return arr.astype(np.float16), None
+
+    scales = np.abs(arr).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(arr / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Inverse of quantize(), always returning float32."""
+    out = codes.astype(np.float32)
+    if scales is not None:
+        out *= scales[:, None]
+    return out
+
+
+class EmbeddingStore:
+    """
+    Append-only store of quantized unit vectors with exact (brute-force)
+    search over them.
+
+    Usage:
+        store = EmbeddingStore(dtype="int8")
+        store.add(vectors, ids)
+        ids, scores = store.search(query_vector, k=5)
+    """
+
+    def __init__(self, dtype: str = "int8"):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unsupported storage dtype: {dtype}")
+        self.dtype = dtype
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.ids: List = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, vectors, ids: Optional[List] = None) -> None:
+        data = _normalize(vectors)
+        codes, scales = quantize(data, self.dtype)
+        new_ids = list(ids) if ids is not None else list(range(len(self.ids), len(self.ids) + len(data)))
+        if len(new_ids) != len(data):
+            raise ValueError("ids and vectors must have the same length")
+
+        if self.codes is None:
+            self.codes, self.scales = codes, scales
+        else:
+            self.codes = np.concatenate([self.codes, codes])
+            if scales is not None:
+                self.scales = np.concatenate([self.scales, scales])
+        self.ids.extend(new_ids)
+
+    def reconstruct(self, rows=None) -> np.ndarray:
+        """float32 copies of the stored vectors (all, or the given row indices)."""
+        if self.codes is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        if rows is None:
+            return dequantize(self.codes, self.scales)
+        rows = np.asarray(rows)
+        return dequantize(self.codes[rows], self.scales[rows] if self.scales is not None else None)
+
+    def scores(self, query, rows=None) -> np.ndarray:
+        """Cosine similarity (float32 query vs stored vectors)."""
+        q = _normalize(query)[0]
+        if rows is not None:
+            return self.reconstruct(rows) @ q
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            out[start:start + SCORE_BLOCK_ROWS] = self.reconstruct(np.arange(start, min(start + SCORE_BLOCK_ROWS, len(self)))) @ q
+        return out
+
+    def search(self, query, k: int = 10) -> Tuple[List, np.ndarray]:
+        """Top-k (ids, cosine scores) of the float32 query against every stored vector."""
+        if not len(self):
+            return [], np.zeros(0, dtype=np.float32)
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.ids[i] for i in top], scores[top]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by vector payload (codes + per-vector scales)."""
+        if self.codes is None:
+            return 0
+        return int(self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def memory_report(self) -> Dict[str, float]:
+        n = len(self)
+        dim = self.codes.shape[1] if self.codes is not None else 0
+        return {
+            "dtype": self.dtype,
+            "vectors": n,
+            "dim": dim,
+            "bytes": self.memory_bytes(),
+            "bytes_per_vector": (self.memory_bytes() / n) if n else 0.0,
+            "float64_bytes": n * dim * 8,
+        }
+
+
+def compare_with_float32(vectors, queries, dtype: str, k: int = 10) -> Dict[str, float]:
+    """
+    Accuracy and memory delta of a compact store vs exact float32 search:
+    recall@k, max/mean absolute cosine error of the returned scores, and bytes.
+    """
+    full = _normalize(vectors)
+    store = EmbeddingStore(dtype=dtype)
+    store.add(full)
+
+    recalls, errors = [], []
+    for query in queries:
+        q = _normalize(query)[0]
+        exact_scores = full @ q
+        exact_top = set(np.argsort(-exact_scores)[:k].tolist())
+        ids, scores = store.search(q, k=k)
+        recalls.append(len(exact_top & set(ids)) / k)
+        errors.extend(np.abs(scores - exact_scores[np.asarray(ids)]).tolist())
+
+    report = store.memory_report()
+    report.update({
+        "recall_at_k": float(np.mean(recalls)),
+        "mean_abs_score_error": float(np.mean(errors)) if errors else 0.0,
+        "max_abs_score_error": float(np.max(errors)) if errors else 0.0,
+    })
+    return report
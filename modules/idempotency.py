@@ -0,0 +1,153 @@
+# modules/idempotency.py
+"""
+Idempotent chat turns keyed by the WhatsApp message ID.
+
+The WhatsApp middleware retries a webhook when our reply is slow. With a
+`message_id` on the request, a retry of a turn that is
+- still running awaits the original computation (singleflight) instead of
+  running the pipeline again,
+- already answered gets the stored reply from a TTL + LRU cache.
+
+The computation runs in its own task, so a retry that arrives after the
+first connection dropped still picks up the same result. Once every waiter
+has gone (cancelled on client disconnect), the computation is cancelled
+unless a retry joins within IDEMPOTENCY_ABANDON_GRACE_SECONDS. Failed turns and
+replies the caller marks as non-cacheable (e.g. the "busy" shed reply) are
+not stored, so the next retry runs again.
+
+The store is per worker process; retries routed to another worker are not
+deduplicated.
+"""
+import asyncio
+import copy
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "900"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "4096"))
+IDEMPOTENCY_ABANDON_GRACE_SECONDS = float(os.getenv("IDEMPOTENCY_ABANDON_GRACE_SECONDS", "10"))
+
+# Outcomes returned by IdempotencyStore.run()
+EXECUTED = "executed"   # this call ran the computation
+JOINED = "joined"       # awaited an in-flight computation for the same key
+REPLAYED = "replayed"   # served from the completed-reply cache
+
+
+class IdempotencyStore:
+    """Singleflight for in-flight keys plus a TTL + LRU cache of completed results."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS,
+        max_entries: int = IDEMPOTENCY_MAX_ENTRIES,
+        abandon_grace_seconds: float = IDEMPOTENCY_ABANDON_GRACE_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.abandon_grace_seconds = abandon_grace_seconds
+        self._completed: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._abandon_timers: Dict[asyncio.Task, asyncio.TimerHandle] = {}
+        self.counters = {EXECUTED: 0, JOINED: 0, REPLAYED: 0, "failed": 0, "evictions": 0, "abandoned": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        """Copy of the stored result for `key`, or None if absent/expired."""
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._completed[key]
+            return None
+        self._completed.move_to_end(key)
+        # Callers decorate replies (timings, ...); keep the stored one pristine
+        return copy.deepcopy(result)
+
+    def put(self, key: str, result: Any) -> None:
+        self._completed[key] = (time.monotonic(), copy.deepcopy(result))
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def run(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Tuple[Any, str]:
+        """
+        Result of `compute()` for `key`, computed at most once while in flight
+        and replayed for ttl_seconds afterwards. Returns (result, outcome).
+        Exceptions from the computation propagate to every waiter.
+        """
+        stored = self.get(key)
+        if stored is not None:
+            self.counters[REPLAYED] += 1
+            return stored, REPLAYED
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.counters[JOINED] += 1
+            outcome = JOINED
+        else:
+            self.counters[EXECUTED] += 1
+            outcome = EXECUTED
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done, cacheable))
+
+        timer = self._abandon_timers.pop(task, None)
+        if timer is not None:
+            timer.cancel()
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # shield: a waiter that goes away does not cancel the shared computation...
+            result = await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # ...but the last one leaving does, unless a retry joins in time
+                    self._abandon_timers[task] = asyncio.get_running_loop().call_later(
+                        self.abandon_grace_seconds, self._abandon, task
+                    )
+        return (copy.deepcopy(result) if outcome == JOINED else result), outcome
+
+    def _abandon(self, task: asyncio.Task) -> None:
+        self._abandon_timers.pop(task, None)
+        if not task.done() and task not in self._waiters:
+            self.counters["abandoned"] += 1
+            task.cancel()
+
+    def _finish(self, key: str, task: asyncio.Task, cacheable: Optional[Callable[[Any], bool]]) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        timer = self._abandon_timers.pop(task, None)
+        if timer is not None:
+            timer.cancel()
+        if task.cancelled():
+            return
+        if task.exception() is not None:  # also marks it retrieved when every waiter left
+            self.counters["failed"] += 1
+            return
+        result = task.result()
+        if cacheable is None or cacheable(result):
+            self.put(key, result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._completed), "in_flight": len(self._in_flight), **self.counters}
+
+
+_idempotency_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    global _idempotency_store
+    if _idempotency_store is None:
+        _idempotency_store = IdempotencyStore()
+    return _idempotency_store
@@ -0,0 +1,496 @@
+# modules/ingestion_pipeline.py
+"""
+Shared knowledge-base ingestion pipeline for the scripts/ingest_*.py tools.
+
+Stages:
+1. parse   - done by the calling script; yields sections as
+             {"header_path": str, "content": str, "chunks": [str, ...]}
+2. chunk   - sections are grouped into work units of SECTIONS_PER_UNIT
+3. embed   - all chunk texts of a unit go through generate_embeddings_batch
+             in requests of up to EMBED_BATCH_SIZE inputs / EMBED_BATCH_TOKENS
+4. insert  - sections (with their mean vector) and then chunks are written
+             with bulk inserts
+
+Units run on an asyncio worker pool bounded by `concurrency`; every remote
+call is retried with exponential backoff. Bulk inserts are not idempotent, so
+they are only retried when the failed attempt certainly wrote nothing. Finished units are recorded in a
+JSON checkpoint file so an interrupted run resumes where it stopped; the file
+is removed once a run finishes without failed units.
+
+Incremental mode (`source` given, needs sql/setup_content_hashes.sql): the
+document is diffed against the rows stored for that source by header_path
+and content hash. Unchanged sections are skipped, changed sections are
+updated in place with only their new chunks embedded, and stored sections
+that are no longer in the document are deleted. A section's content hash is
+written only after its chunks, so a unit that fails midway is redone.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+from urllib.parse import quote
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+from supabase_client import (
+    SupabaseHTTPError,
+    async_supabase_insert_many,
+    async_supabase_select,
+    async_supabase_update,
+    async_supabase_delete,
+    RETURN_MINIMAL,
+    RETURN_REPRESENTATION,
+)
+from rag import async_generate_embeddings_batch, embedding_columns, FULL_EMBEDDING_DIMENSIONS
+from modules.search_hierarchical import mean_section_embedding, bump_kb_version
+from modules.text_utils import count_tokens
+
+SECTIONS_PER_UNIT = 25
+EMBED_BATCH_SIZE = 2048         # OpenAI max inputs per embeddings request
+EMBED_BATCH_TOKENS = 250_000    # Stay under the 300k tokens/request limit
+INSERT_BATCH_SIZE = 500
+SELECT_PAGE_SIZE = 1000
+DELETE_BATCH_SIZE = 200         # ids per `id=in.(...)` filter (URL length)
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0          # seconds, doubled per attempt (+ jitter)
+
+
+async def with_retry(
+    label: str,
+    fn: Callable[[], Awaitable[Any]],
+    max_retries: int = MAX_RETRIES,
+    retry_if: Optional[Callable[[Exception], bool]] = None,
+) -> Any:
+    """
+    Await fn(), retrying with exponential backoff on any exception, or only
+    on those `retry_if` accepts.
+    """
+    for attempt in range(1, max_retries + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == max_retries or (retry_if is not None and not retry_if(e)):
+                raise
+            delay = RETRY_BASE_DELAY * (2 ** (attempt - 1)) * (1 + random.random() * 0.25)
+            print(f"⚠️ {label} failed (attempt {attempt}/{max_retries}): {e}. Retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def failed_before_commit(error: Exception) -> bool:
+    """
+    Whether a failed write certainly left nothing behind: PostgREST rolled
+    back on an error status, or the connection was never opened. A dropped
+    connection or read timeout after the request went out may have committed.
+    """
+    if isinstance(error, (SupabaseHTTPError, requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        # Refused / unresolvable host: urllib3's NewConnectionError (a ConnectTimeoutError)
+        return isinstance(getattr(error.args[0], "reason", None), ConnectTimeoutError)
+    return False
+
+
+def plan_embedding_batches(texts: List[str], max_inputs: int = EMBED_BATCH_SIZE, max_tokens: int = EMBED_BATCH_TOKENS) -> List[List[int]]:
+    """Split text indices into request-sized batches by input count and tokens."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text, model="text-embedding-3-small")
+        if current and (len(current) >= max_inputs or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def content_hash(text: str) -> str:
+    """sha256 hex of a chunk; matches the SQL backfill in setup_content_hashes.sql."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def section_hash(section: Dict[str, Any]) -> str:
+    """Hash of a section's content and chunk list (changes if either changes)."""
+    digest = hashlib.sha256(section["content"].encode("utf-8"))
+    for chunk in section["chunks"]:
+        digest.update(b"\0")
+        digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _parse_vector(value: Any) -> List[float]:
+    # PostgREST returns pgvector columns as a "[0.1,0.2,...]" string
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def diff_sections(
+    sections: List[Dict[str, Any]],
+    stored: List[Dict[str, Any]],
+    source: str,
+):
+    """
+    Match incoming sections to stored rows by header_path.
+
+    Returns (pending, unchanged_count, orphan_ids). Each pending section is a
+    copy of the incoming one with "content_hash" set and "existing_id" set
+    when it replaces a stored row. Orphans are rows of this source that no
+    section matched, plus legacy rows without a source left over after one of
+    them was adopted for a header_path of this document (duplicates from
+    earlier full re-ingests). Other legacy rows may belong to another
+    document and are never deleted.
+    """
+    by_path: Dict[str, List[Dict[str, Any]]] = {}
+    # Prefer rows already owned by this source over legacy rows
+    for row in sorted(stored, key=lambda r: (r.get("source") != source, r["id"])):
+        by_path.setdefault(row["header_path"], []).append(row)
+
+    pending = []
+    unchanged = 0
+    for section in sections:
+        digest = section_hash(section)
+        candidates = by_path.get(section["header_path"])
+        row = candidates.pop(0) if candidates else None
+        if row and row.get("content_hash") == digest and row.get("source") == source:
+            unchanged += 1
+            continue
+        pending.append({**section, "content_hash": digest, "existing_id": row["id"] if row else None})
+
+    own_paths = {section["header_path"] for section in sections}
+    orphan_ids = [
+        row["id"]
+        for path, rows in by_path.items()
+        for row in rows
+        if row.get("source") == source or (row.get("source") is None and path in own_paths)
+    ]
+    return pending, unchanged, orphan_ids
+
+
+class Checkpoint:
+    """Set of completed unit keys persisted as JSON (atomic rewrite)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = set(json.load(f).get("completed_units", []))
+        self._lock = asyncio.Lock()
+
+    async def mark_done(self, key: str) -> None:
+        async with self._lock:
+            self.done.add(key)
+            if not self.path:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"completed_units": sorted(self.done)}, f)
+            os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        """Forget completed units (after a clean run) so later runs redo everything."""
+        self.done = set()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _unit_key(index: int, sections: List[Dict[str, Any]]) -> str:
+    digest = hashlib.sha1()
+    for section in sections:
+        digest.update(section["header_path"].encode("utf-8"))
+        digest.update(b"\0")
+        digest.update("\n".join(section["chunks"]).encode("utf-8"))
+    return f"{index}:{digest.hexdigest()[:16]}"
+
+
+class IngestionPipeline:
+    """
+    Usage:
+        pipeline = IngestionPipeline(checkpoint_path="doc.json.checkpoint", source="doc.json")
+        stats = asyncio.run(pipeline.run(sections))
+    """
+
+    def __init__(
+        self,
+        checkpoint_path: Optional[str] = None,
+        source: Optional[str] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        sections_per_unit: int = SECTIONS_PER_UNIT,
+        insert_batch_size: int = INSERT_BATCH_SIZE,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.source = source
+        self.concurrency = concurrency
+        self.sections_per_unit = sections_per_unit
+        self.insert_batch_size = insert_batch_size
+        self.max_retries = max_retries
+        self.stats = {
+            "units": 0, "skipped_units": 0, "failed_units": 0,
+            "sections": 0, "chunks": 0, "embedding_requests": 0, "embedded_chunks": 0,
+            "unchanged_sections": 0, "updated_sections": 0, "reused_chunks": 0,
+            "deleted_sections": 0, "deleted_chunks": 0,
+        }
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for batch in plan_embedding_batches(texts):
+            batch_texts = [texts[i] for i in batch]
+            result = await with_retry(
+                f"embedding batch of {len(batch)}",
+                lambda: async_generate_embeddings_batch(batch_texts, dimensions=FULL_EMBEDDING_DIMENSIONS),
+                self.max_retries,
+            )
+            self.stats["embedding_requests"] += 1
+            self.stats["embedded_chunks"] += len(batch)
+            for i, vector in zip(batch, result):
+                vectors[i] = vector
+        return vectors
+
+    async def _insert(self, table: str, rows: List[Dict[str, Any]], columns: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Bulk insert in batches; returns `columns` of the new rows (nothing if None)."""
+        returning = RETURN_REPRESENTATION if columns else RETURN_MINIMAL
+        inserted: List[Dict[str, Any]] = []
+        for start in range(0, len(rows), self.insert_batch_size):
+            batch = rows[start:start + self.insert_batch_size]
+            result = await with_retry(
+                f"insert of {len(batch)} rows into {table}",
+                lambda: async_supabase_insert_many(table, batch, returning=returning, columns=columns),
+                self.max_retries,
+                retry_if=failed_before_commit,
+            )
+            inserted.extend(result or [])
+        return inserted
+
+    async def _select_all(self, table: str, select: str, filters: str) -> List[Dict[str, Any]]:
+        """Keyset-paginated select of every matching row."""
+        rows: List[Dict[str, Any]] = []
+        last_id = 0
+        while True:
+            page = await with_retry(
+                f"select from {table}",
+                lambda: async_supabase_select(
+                    table, select=select, filters=f"{filters}&id=gt.{last_id}&order=id.asc", limit=SELECT_PAGE_SIZE
+                ),
+                self.max_retries,
+            )
+            if not page:
+                break
+            rows.extend(page)
+            last_id = page[-1]["id"]
+            if len(page) < SELECT_PAGE_SIZE:
+                break
+        return rows
+
+    async def _delete(self, table: str, ids: List[int]) -> None:
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            await with_retry(
+                f"delete of {len(batch)} rows from {table}",
+                lambda: async_supabase_delete(
+                    table, f"id=in.({','.join(str(i) for i in batch)})", returning=RETURN_MINIMAL
+                ),
+                self.max_retries,
+            )
+
+    async def _load_stored_chunks(self, section_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        by_section: Dict[int, List[Dict[str, Any]]] = {sid: [] for sid in section_ids}
+        if not section_ids:
+            return by_section
+        rows = await self._select_all(
+            "sakhi_section_chunks",
+            "id,section_id,content_hash,embedding",
+            f"section_id=in.({','.join(str(i) for i in section_ids)})",
+        )
+        for row in rows:
+            by_section[row["section_id"]].append(row)
+        return by_section
+
+    def _section_row(self, section: Dict[str, Any], chunk_vectors: List[List[float]]) -> Dict[str, Any]:
+        row = {
+            "header_path": section["header_path"],
+            "content": section["content"],
+            "token_count": len(section["content"].split()),
+        }
+        if self.source:
+            row["source"] = self.source
+            # Set by _mark_sections_done once the chunks are written; cleared
+            # meanwhile so an interrupted update never matches a stored hash
+            row["content_hash"] = None
+        section_vector = mean_section_embedding(chunk_vectors)
+        if section_vector:
+            row.update(embedding_columns(section_vector))
+        return row
+
+    def _chunk_row(self, section_id: int, text: str, vector: List[float]) -> Dict[str, Any]:
+        row = {
+            "section_id": section_id,
+            "chunk_content": text,
+            **embedding_columns(vector),
+        }
+        if self.source:
+            row["content_hash"] = content_hash(text)
+        return row
+
+    async def _process_unit(self, sections: List[Dict[str, Any]]) -> None:
+        # Stored chunks of sections being replaced: reuse those whose text is unchanged
+        existing_ids = [s["existing_id"] for s in sections if s.get("existing_id")]
+        stored_chunks = await self._load_stored_chunks(existing_ids)
+
+        # plans[i][j] is either a reused stored chunk row or None (needs embedding)
+        plans = []
+        texts = []
+        stale_chunk_ids = []
+        for section in sections:
+            reusable: Dict[str, List[Dict[str, Any]]] = {}
+            for row in stored_chunks.get(section.get("existing_id"), []):
+                reusable.setdefault(row.get("content_hash"), []).append(row)
+            plan = []
+            for text in section["chunks"]:
+                candidates = reusable.get(content_hash(text))
+                if candidates:
+                    plan.append(candidates.pop(0))
+                else:
+                    plan.append(None)
+                    texts.append(text)
+            plans.append(plan)
+            stale_chunk_ids.extend(row["id"] for rows in reusable.values() for row in rows)
+
+        # Embed every new chunk of the unit in as few requests as possible
+        new_vectors = iter(await self._embed(texts))
+        per_section_vectors = []
+        for plan in plans:
+            per_section_vectors.append([
+                _parse_vector(row["embedding"]) if row else next(new_vectors)
+                for row in plan
+            ])
+
+        # New sections: bulk insert, ids come back in order
+        new_indices = [i for i, s in enumerate(sections) if not s.get("existing_id")]
+        inserted = await self._insert(
+            "sakhi_sections",
+            [self._section_row(sections[i], per_section_vectors[i]) for i in new_indices],
+            columns="id",
+        )
+        if len(inserted) != len(new_indices):
+            raise Exception(f"Expected {len(new_indices)} section rows back, got {len(inserted)}")
+        section_ids = {i: row["id"] for i, row in zip(new_indices, inserted)}
+
+        # Changed sections: update in place (section vector is the mean of old + new chunks)
+        for i, section in enumerate(sections):
+            if not section.get("existing_id"):
+                continue
+            section_ids[i] = section["existing_id"]
+            row = self._section_row(section, per_section_vectors[i])
+            await with_retry(
+                f"update of section {section['existing_id']}",
+                lambda: async_supabase_update(
+                    "sakhi_sections", f"id=eq.{section['existing_id']}", row, returning=RETURN_MINIMAL
+                ),
+                self.max_retries,
+            )
+            self.stats["updated_sections"] += 1
+
+        chunk_rows = []
+        for i, (section, plan) in enumerate(zip(sections, plans)):
+            for text, stored, vector in zip(section["chunks"], plan, per_section_vectors[i]):
+                if stored:
+                    self.stats["reused_chunks"] += 1
+                    continue
+                chunk_rows.append(self._chunk_row(section_ids[i], text, vector))
+        await self._insert("sakhi_section_chunks", chunk_rows)
+        await self._delete("sakhi_section_chunks", stale_chunk_ids)
+        await self._mark_sections_done(sections, section_ids)
+
+        self.stats["sections"] += len(new_indices)
+        self.stats["chunks"] += len(chunk_rows)
+        self.stats["deleted_chunks"] += len(stale_chunk_ids)
+
+    async def _mark_sections_done(self, sections: List[Dict[str, Any]], section_ids: Dict[int, int]) -> None:
+        """
+        Stamp each section with its content hash. Until then a re-run sees the
+        section as changed, so a unit that failed after writing its section
+        rows gets its chunks written (and stale ones deleted) next time.
+        """
+        if not self.source:
+            return
+        for i, section in enumerate(sections):
+            await with_retry(
+                f"content hash of section {section_ids[i]}",
+                lambda: async_supabase_update(
+                    "sakhi_sections", f"id=eq.{section_ids[i]}",
+                    {"content_hash": section["content_hash"]}, returning=RETURN_MINIMAL,
+                ),
+                self.max_retries,
+            )
+
+    async def run(self, sections: List[Dict[str, Any]]) -> Dict[str, int]:
+        sections = [s for s in sections if s.get("chunks")]
+        orphan_ids: List[int] = []
+        if self.source:
+            stored = await self._select_all(
+                "sakhi_sections",
+                "id,header_path,source,content_hash",
+                f'or=(source.eq."{quote(self.source)}",source.is.null)',
+            )
+            sections, unchanged, orphan_ids = diff_sections(sections, stored, self.source)
+            self.stats["unchanged_sections"] = unchanged
+            print(f"{unchanged} unchanged, {len(sections)} new or changed, {len(orphan_ids)} removed sections")
+
+        units = [
+            sections[start:start + self.sections_per_unit]
+            for start in range(0, len(sections), self.sections_per_unit)
+        ]
+        print(f"Ingesting {len(sections)} sections in {len(units)} units (concurrency={self.concurrency})")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def worker(index: int, unit: List[Dict[str, Any]]):
+            key = _unit_key(index, unit)
+            if key in self.checkpoint.done:
+                self.stats["skipped_units"] += 1
+                return
+            async with semaphore:
+                try:
+                    await self._process_unit(unit)
+                except Exception as e:
+                    self.stats["failed_units"] += 1
+                    print(f"❌ Unit {index + 1}/{len(units)} failed: {e}")
+                    return
+                await self.checkpoint.mark_done(key)
+                self.stats["units"] += 1
+                print(f"[{index + 1}/{len(units)}] Ingested {len(unit)} sections")
+
+        await asyncio.gather(*(worker(i, unit) for i, unit in enumerate(units)))
+        if not self.stats["failed_units"]:
+            # The checkpoint only serves to resume this run; a stale one would
+            # skip a later unit that happens to hash to an old key
+            self.checkpoint.clear()
+
+        if orphan_ids and not self.stats["failed_units"]:
+            # Chunks go with them (on delete cascade)
+            await self._delete("sakhi_sections", orphan_ids)
+            self.stats["deleted_sections"] = len(orphan_ids)
+
+        if self.stats["sections"] or self.stats["updated_sections"] or self.stats["deleted_sections"]:
+            # Let running API workers drop cached retrieval results
+            bump_kb_version()
+        print(f"Ingestion stats: {self.stats}")
+        return self.stats
+
+
+def run_ingestion(
+    sections: List[Dict[str, Any]],
+    checkpoint_path: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    source: Optional[str] = None,
+) -> Dict[str, int]:
+    """Synchronous entry point for scripts."""
+    pipeline = IngestionPipeline(checkpoint_path=checkpoint_path, concurrency=concurrency, source=source)
+    return asyncio.run(pipeline.run(sections))
@@ -2,7 +2,7 @@
 from datetime import datetime
 from typing import Dict, Any, Optional
 
-from supabase_client import supabase_insert, supabase_select, supabase_update
+from supabase_client import supabase_insert, supabase_select, supabase_update, RETURN_MINIMAL
 
 # Steps in the onboarding flow
 STEP_NAME = "ask_name"
@@ -29,17 +29,15 @@ def _get_chat_state(user_id: str) -> dict:
 
 def _update_chat_state(user_id: str, context: dict):
     """Update or insert the chat state in sakhi_chat_states table."""
-    # Check if exists
-    rows = supabase_select("sakhi_chat_states", select="user_id", filters=f"user_id=eq.{user_id}")
+    # One read tells us both whether the row exists and what to merge into
+    rows = supabase_select("sakhi_chat_states", select="context", filters=f"user_id=eq.{user_id}")
     if rows:
         match = f"user_id=eq.{user_id}"
-        # We merge with existing context ideally, but here we can just overwrite or merge
-        # For safety, let's fetch current, merge, and save
-        current = _get_chat_state(user_id)
+        current = rows[0].get("context") or {}
         current.update(context)
-        return supabase_update("sakhi_chat_states", match, {"context": current})
+        return supabase_update("sakhi_chat_states", match, {"context": current}, returning=RETURN_MINIMAL)
     else:
-        return supabase_insert("sakhi_chat_states", {"user_id": user_id, "context": context})
+        return supabase_insert("sakhi_chat_states", {"user_id": user_id, "context": context}, returning=RETURN_MINIMAL)
 
 def handle_lead_flow(user_id: str, message: str, user_profile: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -155,4 +153,4 @@ def _save_lead_to_db(data: Dict[str, str], added_by_user_id: str):
         "source": "Whatsapp-Sakhi",
         # "assigned_to_user_id": added_by_user_id, # Removed to avoid FK violation if user is not in sakhi_clinic_users
     }
-    return supabase_insert("sakhi_clinic_leads", payload)
+    return supabase_insert("sakhi_clinic_leads", payload, returning=RETURN_MINIMAL)
@@ -0,0 +1,358 @@
+# modules/metrics.py
+"""
+In-process metrics registry rendered in the Prometheus text exposition
+format (GET /metrics in main.py). No client library or push gateway needed;
+each worker exposes its own numbers.
+
+- Counter / Gauge / Histogram with labels, safe to update from threads
+  (Supabase calls run in asyncio.to_thread).
+- Callback collectors read existing stats() at scrape time (caches,
+  background queues, write-behind loggers), so hot paths are not touched.
+- observe_upstream() times a call to OpenAI / SLM / Supabase and counts
+  errors; the instrumented httpx transports do this for every HTTP request
+  made by the OpenAI and SLM clients.
+- Calls abandoned because the chat turn was cancelled (client disconnect,
+  deadline) are counted separately and do not count as errors.
+- UPSTREAM_HEALTH keeps a recent (EWMA) view of the same calls for runtime
+  decisions such as the degraded pipeline modes.
+"""
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._values.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _CallbackMetric(_Metric):
+    """Gauge/counter whose samples come from a function called at scrape time."""
+
+    def __init__(self, kind: str, name: str, help_text: str, labelnames: Sequence[str],
+                 fn: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            samples = sorted((tuple(str(v) for v in key), value) for key, value in self.fn())
+        except Exception as e:
+            print(f"⚠️ Metrics collector {self.name} failed: {e}")
+            return []
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in samples
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with a different shape")
+                if isinstance(metric, _CallbackMetric):
+                    existing.fn = metric.fn
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, labelnames: Sequence[str],
+                       fn: Callable[[], Iterable[Tuple[LabelValues, float]]]) -> None:
+        self._register(_CallbackMetric("gauge", name, help_text, labelnames, fn))
+
+    def counter_callback(self, name: str, help_text: str, labelnames: Sequence[str],
+                         fn: Callable[[], Iterable[Tuple[LabelValues, float]]]) -> None:
+        self._register(_CallbackMetric("counter", name, help_text, labelnames, fn))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Requests (recorded by the tracing middleware)
+REQUEST_LATENCY = REGISTRY.histogram(
+    "sakhi_request_duration_seconds", "HTTP request latency by path, chat route and status.",
+    ("path", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge("sakhi_requests_in_flight", "Requests currently being handled.")
+STAGE_LATENCY = REGISTRY.histogram(
+    "sakhi_stage_duration_seconds", "Time spent per request stage (summed per request).", ("stage",),
+)
+
+# Upstreams
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "sakhi_upstream_duration_seconds", "Latency of calls to OpenAI, the SLM and Supabase.",
+    ("upstream", "target"),
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "sakhi_upstream_errors_total", "Failed calls to OpenAI, the SLM and Supabase.",
+    ("upstream", "target"),
+)
+UPSTREAM_CANCELLED = REGISTRY.counter(
+    "sakhi_upstream_cancelled_total", "Upstream calls abandoned because their chat turn was cancelled.",
+    ("upstream", "target"),
+)
+
+
+class UpstreamHealth:
+    """
+    Recent latency and error rate per (upstream, target) as exponentially
+    weighted moving averages. Entries not updated for `stale_after` seconds
+    are reported as unknown (None), so an idle upstream reads as healthy.
+    """
+
+    def __init__(self, latency_alpha: float = 0.2, error_alpha: float = 0.1, stale_after: float = 60.0):
+        self.latency_alpha = latency_alpha
+        self.error_alpha = error_alpha
+        self.stale_after = stale_after
+        self._entries: Dict[Tuple[str, str], List[float]] = {}  # [latency, error_rate, updated_at]
+        self._lock = threading.Lock()
+
+    def record(self, upstream: str, target: str, seconds: float, ok: bool) -> None:
+        error = 0.0 if ok else 1.0
+        with self._lock:
+            entry = self._entries.get((upstream, target))
+            if entry is None:
+                self._entries[(upstream, target)] = [seconds, error, time.monotonic()]
+                return
+            entry[0] += self.latency_alpha * (seconds - entry[0])
+            entry[1] += self.error_alpha * (error - entry[1])
+            entry[2] = time.monotonic()
+
+    def snapshot(self, upstream: str, target: str) -> Optional[Tuple[float, float]]:
+        """(latency EWMA seconds, error rate EWMA) or None if no recent calls."""
+        with self._lock:
+            entry = self._entries.get((upstream, target))
+            if entry is None or time.monotonic() - entry[2] > self.stale_after:
+                return None
+            return entry[0], entry[1]
+
+
+UPSTREAM_HEALTH = UpstreamHealth()
+
+
+def record_request(path: str, route: str, status: int, seconds: float, stages: Dict[str, Dict[str, float]]) -> None:
+    REQUEST_LATENCY.observe(seconds, path=path, route=route, status=str(status))
+    for stage, stats in stages.items():
+        STAGE_LATENCY.observe(stats["ms"] / 1000.0, stage=stage)
+
+
+@contextmanager
+def observe_upstream(upstream: str, target: str):
+    """Time a call to an upstream service; exceptions count as errors."""
+    start = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        UPSTREAM_CANCELLED.inc(upstream=upstream, target=target)
+        raise
+    except BaseException:
+        _record_call(upstream, target, start, ok=False)
+        raise
+    else:
+        _record_call(upstream, target, start, ok=True)
+
+
+def _record_call(upstream: str, target: str, start: float, ok: bool) -> None:
+    elapsed = time.perf_counter() - start
+    UPSTREAM_LATENCY.observe(elapsed, upstream=upstream, target=target)
+    UPSTREAM_HEALTH.record(upstream, target, elapsed, ok)
+    if not ok:
+        UPSTREAM_ERRORS.inc(upstream=upstream, target=target)
+
+
+def _http_target(request: httpx.Request) -> str:
+    # "/v1/chat/completions" -> "chat/completions"; keeps label cardinality small
+    path = request.url.path.strip("/")
+    if path.startswith("v1/"):
+        path = path[3:]
+    return path or "/"
+
+
+def _record_http(upstream: str, request: httpx.Request, start: float, status: Optional[int]) -> None:
+    _record_call(upstream, _http_target(request), start, ok=status is not None and status < 400)
+
+
+class InstrumentedAsyncTransport(httpx.AsyncHTTPTransport):
+    """httpx transport that records latency/errors of every request under `upstream`."""
+
+    def __init__(self, upstream: str, **kwargs):
+        super().__init__(**kwargs)
+        self.upstream = upstream
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except asyncio.CancelledError:
+            UPSTREAM_CANCELLED.inc(upstream=self.upstream, target=_http_target(request))
+            raise
+        except BaseException:
+            _record_http(self.upstream, request, start, None)
+            raise
+        _record_http(self.upstream, request, start, response.status_code)
+        return response
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """Sync counterpart of InstrumentedAsyncTransport."""
+
+    def __init__(self, upstream: str, **kwargs):
+        super().__init__(**kwargs)
+        self.upstream = upstream
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        status = None
+        try:
+            response = super().handle_request(request)
+            status = response.status_code
+            return response
+        finally:
+            _record_http(self.upstream, request, start, status)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
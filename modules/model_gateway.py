@@ -1,10 +1,12 @@
 # modules/model_gateway.py
 import logging
 from enum import Enum
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Optional
 import numpy as np
 
 from rag import generate_embedding, async_generate_embedding
+from modules.embedding_store import EmbeddingStore
+from modules.tracing import traced
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -276,26 +278,47 @@ class ModelGateway:
     SMALL_TALK_THRESHOLD = 0.45  # Was 0.75, then 0.50
     MEDICAL_SIMPLE_THRESHOLD = 0.45  # Was 0.60
     FACILITY_INFO_THRESHOLD = 0.40  # Was 0.50
+
+    # Anchor vectors are kept in a compact store; float16 keeps cosine error
+    # around 1e-3, well below the gaps between the thresholds above
+    ANCHOR_STORAGE_DTYPE = "float16"
+    SMALL_TALK_ANCHOR = "SMALL_TALK"
+    MEDICAL_COMPLEX_ANCHOR = "MEDICAL_COMPLEX"
+    FACILITY_INFO_ANCHOR = "FACILITY_INFO"
     
-    def __init__(self):
-        """Initialize the gateway by computing anchor vectors."""
+    def __init__(self, dimensions: Optional[int] = None):
+        """
+        Initialize the gateway by computing anchor vectors.
+
+        Args:
+            dimensions: Embedding size for anchors and queries
+                        (defaults to rag.EMBEDDING_DIMENSIONS)
+        """
         logger.info("Initializing ModelGateway with anchor vectors...")
+        self.dimensions = dimensions
         
+        self.anchor_store = EmbeddingStore(dtype=self.ANCHOR_STORAGE_DTYPE)
+
         # Compute mean anchor vectors for each category
-        self.small_talk_anchor = self._compute_mean_vector(self.SMALL_TALK_EXAMPLES)
+        self.anchor_store.add([self._compute_mean_vector(self.SMALL_TALK_EXAMPLES)], [self.SMALL_TALK_ANCHOR])
         
         # Use BATCHED embedding generation to speed up initialization significantly
         # COMPUTE SEPARATE ANCHORS for each simple medical category to avoid signal dilution
-        self.medical_simple_anchors = {}
-        
         logger.info("Computing granular anchors for Simple Medical categories...")
-        for key, examples in self.MEDICAL_SIMPLE_EXAMPLES.items():
-            self.medical_simple_anchors[key] = self._compute_mean_vector(examples)
+        self.medical_simple_categories = list(self.MEDICAL_SIMPLE_EXAMPLES.keys())
+        self.anchor_store.add(
+            [self._compute_mean_vector(examples) for examples in self.MEDICAL_SIMPLE_EXAMPLES.values()],
+            self.medical_simple_categories,
+        )
             
-        self.medical_complex_anchor = self._compute_mean_vector(self.MEDICAL_COMPLEX_EXAMPLES)
-        self.facility_info_anchor = self._compute_mean_vector(self.FACILITY_INFO_EXAMPLES)
-        
-        logger.info("ModelGateway initialized successfully")
+        self.anchor_store.add([self._compute_mean_vector(self.MEDICAL_COMPLEX_EXAMPLES)], [self.MEDICAL_COMPLEX_ANCHOR])
+        self.anchor_store.add([self._compute_mean_vector(self.FACILITY_INFO_EXAMPLES)], [self.FACILITY_INFO_ANCHOR])
+
+        report = self.anchor_store.memory_report()
+        logger.info(
+            f"ModelGateway initialized successfully ({report['vectors']} anchors, "
+            f"{report['bytes'] / 1024:.1f} KB as {report['dtype']} vs {report['float64_bytes'] / 1024:.1f} KB as float64)"
+        )
     
     def _compute_mean_vector(self, examples) -> np.ndarray:
         """
@@ -318,30 +341,24 @@ class ModelGateway:
         # Avoids making 100+ separate API calls
         from rag import generate_embeddings_batch
         
-        embeddings = generate_embeddings_batch(examples)
+        embeddings = generate_embeddings_batch(examples, dimensions=self.dimensions)
         mean_vector = np.mean(embeddings, axis=0)
         return mean_vector
     
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
+    def _anchor_similarities(self, user_vector: np.ndarray) -> Dict[str, float]:
         """
-        Calculate cosine similarity between two vectors.
+        Cosine similarity of the user vector to every anchor.
         
         Args:
-            vec1: First vector
-            vec2: Second vector
+            user_vector: Query embedding
             
         Returns:
-            Cosine similarity score (0 to 1)
+            Dict of anchor name -> cosine similarity
         """
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return dot_product / (norm1 * norm2)
+        scores = self.anchor_store.scores(user_vector)
+        return dict(zip(self.anchor_store.ids, scores.tolist()))
     
+    @traced("route")
     async def decide_route(self, user_text: str) -> Route:
         """
         Determine the appropriate route for a user query based on semantic similarity.
@@ -353,22 +370,23 @@ class ModelGateway:
             Route enum indicating which model to use
         """
         # Generate embedding for user input
-        user_vector = np.array(await async_generate_embedding(user_text))
+        user_vector = np.asarray(
+            await async_generate_embedding(user_text, dimensions=self.dimensions), dtype=np.float32
+        )
         
         # Calculate similarities to each anchor
-        small_talk_sim = self._cosine_similarity(user_vector, self.small_talk_anchor)
+        sims = self._anchor_similarities(user_vector)
+        small_talk_sim = sims[self.SMALL_TALK_ANCHOR]
         
         # Calculate MAX similarity across all simple medical categories
-        simple_sims = {}
-        for key, anchor in self.medical_simple_anchors.items():
-            simple_sims[key] = self._cosine_similarity(user_vector, anchor)
+        simple_sims = {key: sims[key] for key in self.medical_simple_categories}
         
         # Get the best matching category and score
         best_simple_category = max(simple_sims, key=simple_sims.get) if simple_sims else "NONE"
         medical_simple_sim = simple_sims[best_simple_category] if simple_sims else 0.0
         
-        medical_complex_sim = self._cosine_similarity(user_vector, self.medical_complex_anchor)
-        facility_info_sim = self._cosine_similarity(user_vector, self.facility_info_anchor)
+        medical_complex_sim = sims[self.MEDICAL_COMPLEX_ANCHOR]
+        facility_info_sim = sims[self.FACILITY_INFO_ANCHOR]
         
         # Log similarity scores for debugging
         logger.info(f"Query: '{user_text[:50]}...'")
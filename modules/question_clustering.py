@@ -0,0 +1,232 @@
+# modules/question_clustering.py
+"""
+Grouping of near-duplicate user questions (sakhi_new_questions).
+
+- cluster_by_similarity: single-linkage agglomerative clustering on cosine
+  similarity with a cut-off, i.e. connected components of the graph
+  "similarity >= threshold". Similarities are computed block by block
+  (matrix products) and merged with union-find, so memory stays
+  O(block_size * n) instead of O(n^2).
+- representatives: per cluster, the member closest to the cluster centroid.
+- summarize_clusters: rows for the sakhi_new_question_clusters summary table.
+- EmbeddingCache: on-disk question -> vector cache so re-runs of the batch
+  job only embed questions it has not seen before.
+- NearDuplicateIndex: small in-memory ring of recent question vectors used on
+  the hot path to skip inserting a question that was just asked.
+"""
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules.ann_index import normalize_rows
+
+CLUSTER_SIMILARITY_THRESHOLD = 0.85
+CLUSTER_BLOCK_SIZE = 1024
+CLUSTER_SAMPLE_QUESTIONS = 5
+DEDUP_SIMILARITY = 0.95      # "within epsilon": cosine distance <= 0.05
+DEDUP_RECENT_CAPACITY = 2048
+
+
+def _find(parent: np.ndarray, i: int) -> int:
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:  # path compression
+        parent[i], i = root, parent[i]
+    return root
+
+
+def cluster_by_similarity(
+    vectors,
+    threshold: float = CLUSTER_SIMILARITY_THRESHOLD,
+    block_size: int = CLUSTER_BLOCK_SIZE,
+) -> np.ndarray:
+    """
+    Label each row with a cluster id (0..k-1, ordered by first occurrence).
+    Rows i and j end up together if a chain of pairs with cosine
+    similarity >= threshold links them.
+    """
+    data = normalize_rows(vectors)
+    n = data.shape[0]
+    parent = np.arange(n)
+    for start in range(0, n, block_size):
+        block = data[start:start + block_size]
+        # Only the upper triangle: pairs (i, j) with j > i
+        sims = block @ data[start:].T
+        rows, cols = np.nonzero(sims >= threshold)
+        cols = cols + start
+        rows = rows + start
+        keep = cols > rows
+        for i, j in zip(rows[keep].tolist(), cols[keep].tolist()):
+            ri, rj = _find(parent, i), _find(parent, j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+    roots = np.array([_find(parent, i) for i in range(n)], dtype=np.int64)
+    _, labels = np.unique(roots, return_inverse=True)
+    # Renumber so cluster ids follow first occurrence (stable across runs)
+    order = {}
+    return np.array([order.setdefault(label, len(order)) for label in labels.tolist()], dtype=np.int64)
+
+
+def representatives(vectors, labels: np.ndarray) -> Dict[int, int]:
+    """Row index of the member closest to each cluster's centroid."""
+    data = normalize_rows(vectors)
+    labels = np.asarray(labels)
+    k = int(labels.max()) + 1 if labels.size else 0
+    centroids = np.zeros((k, data.shape[1]), dtype=np.float32)
+    np.add.at(centroids, labels, data)
+    centroids = normalize_rows(centroids)
+    scores = np.einsum("ij,ij->i", data, centroids[labels])
+    best: Dict[int, int] = {}
+    for i in np.argsort(-scores).tolist():
+        best.setdefault(int(labels[i]), i)
+    return best
+
+
+def summarize_clusters(
+    rows: List[Dict[str, Any]],
+    vectors,
+    labels: np.ndarray,
+    samples: int = CLUSTER_SAMPLE_QUESTIONS,
+    min_size: int = 1,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, int]]]:
+    """
+    Build (clusters, assignments) for replace_new_question_clusters.
+    `rows` are sakhi_new_questions rows (id, question, created_at) aligned
+    with `vectors` and `labels`. Clusters are renumbered by size, largest
+    first; clusters smaller than `min_size` are dropped.
+    """
+    labels = np.asarray(labels)
+    reps = representatives(vectors, labels)
+    members: Dict[int, List[int]] = {}
+    for i, label in enumerate(labels.tolist()):
+        members.setdefault(label, []).append(i)
+
+    ranked = sorted(
+        (label for label in members if len(members[label]) >= min_size),
+        key=lambda label: (-len(members[label]), label),
+    )
+    clusters, assignments = [], []
+    for cluster_id, label in enumerate(ranked):
+        idx = members[label]
+        rep = rows[reps[label]]
+        seen = sorted(rows[i].get("created_at") or "" for i in idx)
+        distinct = list(dict.fromkeys(rows[i]["question"].strip() for i in idx))
+        clusters.append({
+            "cluster_id": cluster_id,
+            "size": len(idx),
+            "representative_id": rep["id"],
+            "representative_question": rep["question"],
+            "sample_questions": distinct[:samples],
+            "first_seen": seen[0] or None,
+            "last_seen": seen[-1] or None,
+        })
+        assignments.extend({"id": rows[i]["id"], "cluster_id": cluster_id} for i in idx)
+    return clusters, assignments
+
+
+def question_key(question: str) -> str:
+    return hashlib.sha256(question.strip().lower().encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Question embeddings keyed by sha256 of the normalised text, stored as .npz."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._vectors: Dict[str, np.ndarray] = {}
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self._vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def get(self, question: str) -> Optional[np.ndarray]:
+        return self._vectors.get(question_key(question))
+
+    def put(self, question: str, vector) -> None:
+        self._vectors[question_key(question)] = np.asarray(vector, dtype=np.float32)
+
+    def missing(self, questions: List[str]) -> List[str]:
+        """Distinct questions without a cached vector, in first-seen order."""
+        out = {}
+        for q in questions:
+            key = question_key(q)
+            if key not in self._vectors and key not in out:
+                out[key] = q
+        return list(out.values())
+
+    def save(self) -> None:
+        if not self._vectors:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        keys = np.array(list(self._vectors))
+        vectors = np.stack(list(self._vectors.values()))
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, keys=keys, vectors=vectors)
+        os.replace(tmp, self.path)
+
+
+class NearDuplicateIndex:
+    """
+    Ring buffer of the last `capacity` question vectors. check() reports
+    whether a vector is within `min_similarity` of any of them; add()
+    remembers it (oldest entries are overwritten).
+    """
+
+    def __init__(self, capacity: int = DEDUP_RECENT_CAPACITY, min_similarity: float = DEDUP_SIMILARITY):
+        self.capacity = capacity
+        self.min_similarity = min_similarity
+        self._vectors: Optional[np.ndarray] = None
+        self._count = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.duplicates = 0
+        self.checks = 0
+
+    def check(self, vector) -> Tuple[bool, float]:
+        """(is_duplicate, best similarity) against the recent vectors."""
+        vec = normalize_rows(vector)[0]
+        with self._lock:
+            self.checks += 1
+            if self._vectors is None or self._count == 0 or self._vectors.shape[1] != vec.shape[0]:
+                return False, 0.0
+            best = float((self._vectors[:self._count] @ vec).max())
+            duplicate = best >= self.min_similarity
+            if duplicate:
+                self.duplicates += 1
+            return duplicate, best
+
+    def add(self, vector) -> None:
+        vec = normalize_rows(vector)[0]
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vec.shape[0]:
+                self._vectors = np.zeros((self.capacity, vec.shape[0]), dtype=np.float32)
+                self._count = self._next = 0
+            self._vectors[self._next] = vec
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def check_and_add(self, vector) -> Tuple[bool, float]:
+        duplicate, best = self.check(vector)
+        self.add(vector)
+        return duplicate, best
+
+    def stats(self) -> Dict[str, float]:
+        return {"size": self._count, "checks": self.checks, "duplicates": self.duplicates}
+
+
+_recent_questions: Optional[NearDuplicateIndex] = None
+
+
+def get_recent_questions_index() -> NearDuplicateIndex:
+    """Process-wide index used by store_new_question."""
+    global _recent_questions
+    if _recent_questions is None:
+        _recent_questions = NearDuplicateIndex()
+    return _recent_questions
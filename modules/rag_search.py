@@ -69,7 +69,8 @@ def add_kb_entry(title: str, content: str):
         "content": content,
         "embedding": emb,
     }
-    return supabase_insert("sakhi_bot_knowledge", payload)
+    # Don't echo the 1536-float embedding back
+    return supabase_insert("sakhi_bot_knowledge", payload, columns="kb_id,title")
 
 
 def format_context(results: List[dict]) -> str:
@@ -2,13 +2,15 @@ import os
 import re
 from typing import List, Dict, Optional, Tuple, Any
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DEFAULT_CONNECTION_LIMITS
 from dotenv import load_dotenv
 
 # Internal module imports
 from modules.detect_lang import detect_language
 from modules.text_utils import truncate_response
 from modules.search_hierarchical import hierarchical_rag_query, format_hierarchical_context
+from modules.tracing import traced, span
+from modules.metrics import InstrumentedAsyncTransport
 
 # Load env variables (ensure .env is loaded)
 load_dotenv()
@@ -17,7 +19,13 @@ _api_key = os.getenv("OPENAI_API_KEY")
 if not _api_key:
     raise Exception("OPENAI_API_KEY missing")
 
-client = AsyncOpenAI(api_key=_api_key)
+client = AsyncOpenAI(
+    api_key=_api_key,
+    # httpx only applies `limits` to a transport it builds itself
+    http_client=DefaultAsyncHttpxClient(
+        transport=InstrumentedAsyncTransport("openai", limits=DEFAULT_CONNECTION_LIMITS)
+    ),
+)
 
 # =============================================================================
 # CONSTANTS & PROMPTS
@@ -97,11 +105,21 @@ def is_mostly_english(text: str) -> bool:
     # Tinglish might have 'is' or 'and' but rarely 'the', 'of', 'for' in valid grammatical positions.
     return ratio > 0.15
 
-async def force_rewrite_to_tinglish(text: str, user_name: Optional[str] = None) -> str:
+_FOLLOW_UPS_TAIL = re.compile(r'(?i)\n\s*follow\s*-?\s*ups?\s*:.*$', re.DOTALL)
+
+
+def strip_follow_ups(text: str) -> str:
+    """Drop a trailing 'Follow ups :' block from a reply."""
+    return _FOLLOW_UPS_TAIL.sub('', text).strip()
+
+
+@traced("rewrite")
+async def force_rewrite_to_tinglish(text: str, user_name: Optional[str] = None, include_follow_ups: bool = True) -> str:
     """
     Forcefully rewrite text into Tinglish (Roman script).
     Splits content into Main Body and Follow-ups to process them separately.
     Enforces 'Warmth & Hope' in the main body and 'Concise Questions' in follow-ups.
+    With include_follow_ups=False the follow-ups are dropped (one LLM call).
     """
     import re
     
@@ -122,6 +140,8 @@ async def force_rewrite_to_tinglish(text: str, user_name: Optional[str] = None)
         follow_ups_content = re.sub(r'(?i)^follow\s*-?\s*ups\s*:\s*', '', follow_ups_text).strip()
     else:
         follow_ups_content = ""
+    if not include_follow_ups:
+        follow_ups_content = ""
 
     # 2. PROCESS MAIN BODY (Warmth, Hope, Tinglish)
     system_prompt_body = (
@@ -250,11 +270,13 @@ async def force_rewrite_to_tinglish(text: str, user_name: Optional[str] = None)
     # 4. COMBINE
     return rewritten_body + rewritten_followups
 
-async def force_rewrite_to_telugu(text: str, user_name: Optional[str] = None) -> str:
+@traced("rewrite")
+async def force_rewrite_to_telugu(text: str, user_name: Optional[str] = None, include_follow_ups: bool = True) -> str:
     """
     Forcefully rewrite text into Colloquial Telugu (Telugu Script).
     Splits content into Main Body and Follow-ups to process them separately.
     Use English for complex medical terms but transliterate when possible.
+    With include_follow_ups=False the follow-ups are dropped (one LLM call).
     """
     import re
     
@@ -271,6 +293,8 @@ async def force_rewrite_to_telugu(text: str, user_name: Optional[str] = None) ->
         follow_ups_content = re.sub(r'(?i)^follow\s*-?\s*ups\s*:\s*', '', follow_ups_text).strip()
     else:
         follow_ups_content = ""
+    if not include_follow_ups:
+        follow_ups_content = ""
 
     # 2. PROCESS MAIN BODY
     system_prompt_body = (
@@ -368,6 +392,7 @@ def _build_history_block(history: Optional[List[Dict[str, str]]]) -> str:
 # PUBLIC FUNCTIONS
 # =============================================================================
 
+@traced("classify")
 async def classify_message(message: str) -> Dict[str, Any]:
     """
     1. Deterministically detect language.
@@ -470,8 +495,14 @@ async def generate_medical_response(
     target_lang: str,
     history: Optional[List[Dict[str, str]]],
     user_name: Optional[str] = None,
+    follow_ups: bool = True,
+    rewrite: bool = True,
 ) -> Tuple[str, List[dict]]:
-    
+    """
+    RAG + gpt-4o-mini answer. follow_ups=False asks for no follow-up
+    questions and rewrite=False skips the Tinglish rewrite pass (lean and
+    emergency pipeline modes).
+    """
     # 1. RAG Retrieval
     kb_results, _similarity = await hierarchical_rag_query(prompt)
     context_text = format_hierarchical_context(kb_results)
@@ -487,6 +518,20 @@ async def generate_medical_response(
         "CRITICAL: Do NOT use any name, title, or filler word.\n"
         "DO NOT start with 'Aam', 'Aayi', 'Avunu', or any interjection.\n"
     )
+    if follow_ups:
+        follow_up_rules = (
+            "   - Main helpful response (Paragraphs or lists).\n"
+            "   - Add '\\n\\n' (Double Newline).\n"
+            "   - Write ' Follow ups : ' (Note the leading space).\n"
+            "   - Add '\\n' (Single Newline).\n"
+            "   - 3 context-aware follow-up questions from the next line.\n"
+            "   - CRITICAL: Do NOT use '**Follow-up**' or 'Follow Up:' or ANY other variation. Use EXACTLY ' Follow ups : '.\n"
+        )
+    else:
+        follow_up_rules = (
+            "   - Main helpful response (Paragraphs or lists).\n"
+            "   - Do NOT add follow-up questions.\n"
+        )
     # 2. Construct System Prompt
     system_content = (
         f"{LANGUAGE_LOCK_PROMPT}\n"
@@ -505,12 +550,7 @@ async def generate_medical_response(
         "3. FORMATTING (Strict):\n"
         "   - Use Hyphens (- ) for bullet points. Do NOT use * for bullets.\n"
         "   - Use Single Asterisks (*text*) for bolding. Do NOT use **text**.\n"
-        "   - Main helpful response (Paragraphs or lists).\n"
-        "   - Add '\\n\\n' (Double Newline).\n"
-        "   - Write ' Follow ups : ' (Note the leading space).\n"
-        "   - Add '\\n' (Single Newline).\n"
-        "   - 3 context-aware follow-up questions from the next line.\n"
-        "   - CRITICAL: Do NOT use '**Follow-up**' or 'Follow Up:' or ANY other variation. Use EXACTLY ' Follow ups : '.\n"
+        f"{follow_up_rules}"
         f"{name_block}\n"
         "Address the user by name when available; if the name is long, use a shorter friendly form.\n"
         "Maintain continuity using the conversation history.\n"
@@ -520,23 +560,26 @@ async def generate_medical_response(
 
     # 3. LLM Generation
     try:
-        completion = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_content},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.4, 
-        )
+        with span("generate"):
+            completion = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": system_content},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.4, 
+            )
         response_text = completion.choices[0].message.content.strip()
         
         # Truncate
         response_text = truncate_response(response_text)
         
         # HARD ENFORCEMENT: Tinglish check
-        if target_lang.lower() == "tinglish":
+        if rewrite and target_lang.lower() == "tinglish":
             if contains_telugu_unicode(response_text) or is_mostly_english(response_text):
-                 response_text = await force_rewrite_to_tinglish(response_text, user_name=user_name)
+                 response_text = await force_rewrite_to_tinglish(
+                     response_text, user_name=user_name, include_follow_ups=follow_ups
+                 )
             
         return response_text, kb_results
 
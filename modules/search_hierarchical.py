@@ -1,15 +1,347 @@
-from typing import List, Dict, Any, Tuple
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Optional
 
-from supabase_client import async_supabase_rpc
-from rag import async_generate_embedding
+import numpy as np
 
-async def hierarchical_rag_query(user_question: str, match_threshold: float = 0.3, match_count: int = 4) -> Tuple[List[Dict[str, Any]], float]:
+from supabase_client import async_supabase_rpc, supabase_rpc
+from rag import async_generate_embedding, EMBEDDING_DIMENSIONS, FULL_EMBEDDING_DIMENSIONS
+from modules.section_store import get_section_store
+from modules.ann_index import IVFIndex
+from modules.tracing import traced, span
+
+
+# =============================================================================
+# RETRIEVAL RESULT CACHE
+# =============================================================================
+# Near-identical questions ("what is ivf", "What is IVF?") produce almost the
+# same query vector, so we key cached RPC results by a SimHash of the vector
+# (sign of random hyperplane projections) plus the search parameters.
+
+RETRIEVAL_CACHE_MAX_ENTRIES = 512
+RETRIEVAL_CACHE_TTL_SECONDS = 600       # 10 minutes
+RETRIEVAL_CACHE_HASH_BITS = 32          # More bits = fewer collisions, lower hit rate
+RETRIEVAL_CACHE_MIN_SIMILARITY = 0.97   # Guard against hash collisions between different questions
+KB_VERSION_CHECK_SECONDS = 60           # How often a worker polls get_kb_version()
+
+# Document search modes
+# - "flat": score every chunk (hierarchical_search_ids)
+# - "coarse_to_fine": pick the top COARSE_SECTION_COUNT sections by section
+#   vector, then rank only their chunks (coarse_to_fine_search_ids)
+# - "local": in-process IVF/PQ index built by scripts/build_ann_index.py
+# Picked per worker with SEARCH_MODE; every mode falls back to flat search.
+SEARCH_MODE_FLAT = "flat"
+SEARCH_MODE_COARSE_TO_FINE = "coarse_to_fine"
+SEARCH_MODE_LOCAL = "local"
+SEARCH_MODES = (SEARCH_MODE_FLAT, SEARCH_MODE_COARSE_TO_FINE, SEARCH_MODE_LOCAL)
+DEFAULT_SEARCH_MODE = os.getenv("SEARCH_MODE", SEARCH_MODE_FLAT).strip().lower()
+if DEFAULT_SEARCH_MODE not in SEARCH_MODES:
+    print(f"⚠️ Unknown SEARCH_MODE '{DEFAULT_SEARCH_MODE}', using {SEARCH_MODE_FLAT}")
+    DEFAULT_SEARCH_MODE = SEARCH_MODE_FLAT
+COARSE_SECTION_COUNT = int(os.getenv("COARSE_SECTION_COUNT", "8"))
+
+LOCAL_INDEX_PATH = os.getenv(
+    "SAKHI_ANN_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "sakhi_chunks_ivf.npz"),
+)
+LOCAL_CANDIDATES_PER_HIT = 8   # Chunks fetched per requested section (several chunks share a section)
+
+
+def _rpc_name(base: str) -> str:
+    """
+    Search RPC matching the configured embedding size: reduced-dimension mode
+    uses the parallel *_<n> functions from sql/setup_reduced_embeddings.sql.
+    """
+    if EMBEDDING_DIMENSIONS >= FULL_EMBEDDING_DIMENSIONS:
+        return base
+    return f"{base}_{EMBEDDING_DIMENSIONS}"
+
+
+class RetrievalCache:
+    """
+    TTL + LRU cache of hierarchical_search / match_faq results keyed by a
+    locality-sensitive hash of the query embedding. A query whose hash
+    collides with a different cached question is a miss and leaves that
+    entry in place.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = RETRIEVAL_CACHE_TTL_SECONDS,
+        hash_bits: int = RETRIEVAL_CACHE_HASH_BITS,
+        min_similarity: float = RETRIEVAL_CACHE_MIN_SIMILARITY,
+        seed: int = 1536,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hash_bits = hash_bits
+        self.min_similarity = min_similarity
+        self._seed = seed
+        self._planes: Optional[np.ndarray] = None
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+        # KB version seen by this worker (None until first successful check)
+        self.kb_version: Optional[int] = None
+        self._last_version_check = 0.0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.collisions = 0
+
+    def _signature(self, vector: np.ndarray) -> bytes:
+        # Planes are created lazily so the cache works for any embedding size
+        if self._planes is None or self._planes.shape[1] != vector.shape[0]:
+            rng = np.random.default_rng(self._seed)
+            self._planes = rng.standard_normal((self.hash_bits, vector.shape[0])).astype(np.float32)
+        bits = (self._planes @ vector) > 0
+        return np.packbits(bits).tobytes()
+
+    @staticmethod
+    def _normalize(query_vector) -> np.ndarray:
+        vec = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def make_key(
+        self,
+        query_vector,
+        match_threshold: float,
+        match_count: int,
+        search_mode: str = DEFAULT_SEARCH_MODE,
+    ) -> Tuple[tuple, np.ndarray]:
+        vec = self._normalize(query_vector)
+        return (self._signature(vec), round(match_threshold, 4), match_count, search_mode), vec
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return time.monotonic() - entry["stored_at"] > self.ttl_seconds
+
+    def _collides(self, entry: Dict[str, Any], vector: np.ndarray) -> bool:
+        return float(np.dot(entry["vector"].astype(np.float32), vector)) < self.min_similarity
+
+    def get(self, key: tuple, vector: np.ndarray) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if self._expired(entry):
+            del self._entries[key]
+            self.misses += 1
+            return None
+        if self._collides(entry, vector):
+            # Same hash, different question: the entry is still right for its own
+            self.collisions += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Hand out copies so callers can annotate results freely
+        return [dict(item) for item in entry["results"]], entry["best_similarity"]
+
+    def put(self, key: tuple, vector: np.ndarray, results: List[Dict[str, Any]], best_similarity: float) -> None:
+        existing = self._entries.get(key)
+        if existing is not None and not self._expired(existing) and self._collides(existing, vector):
+            return  # keep the question that got the slot first
+        self._entries[key] = {
+            # float16 is plenty for the collision guard and halves entry size
+            "vector": vector.astype(np.float16),
+            "results": [dict(item) for item in results],
+            "best_similarity": best_similarity,
+            "stored_at": time.monotonic(),
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+        self.invalidations += 1
+
+    def observe_kb_version(self, version: Optional[int]) -> None:
+        """Clear the cache when the KB version stamp moves."""
+        if version is None:
+            return
+        if self.kb_version is not None and version != self.kb_version:
+            print(f"KB version changed ({self.kb_version} -> {version}); clearing retrieval cache")
+            self.invalidate()
+        self.kb_version = version
+
+    async def refresh_kb_version(self) -> None:
+        now = time.monotonic()
+        if now - self._last_version_check < KB_VERSION_CHECK_SECONDS:
+            return
+        self._last_version_check = now
+        try:
+            version = await async_supabase_rpc("get_kb_version", {})
+            self.observe_kb_version(int(version) if version is not None else None)
+        except Exception as e:
+            # Migration not applied yet; TTL still bounds staleness
+            print(f"KB version check failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "collisions": self.collisions,
+            "kb_version": self.kb_version,
+        }
+
+
+_retrieval_cache = RetrievalCache()
+
+
+def get_retrieval_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the retrieval cache of this worker."""
+    return _retrieval_cache.stats()
+
+
+def invalidate_retrieval_cache() -> None:
+    """Drop all cached retrieval results in this process."""
+    _retrieval_cache.invalidate()
+
+
+def bump_kb_version() -> Optional[int]:
+    """
+    Tell every API worker the KB changed. Call after ingestion writes sections.
+    Workers pick the new version up within KB_VERSION_CHECK_SECONDS.
+    """
+    invalidate_retrieval_cache()
+    try:
+        version = supabase_rpc("bump_kb_version", {})
+        print(f"KB version bumped to {version}")
+        return version
+    except Exception as e:
+        print(f"Failed to bump KB version (run sql/setup_kb_version.sql?): {e}")
+        return None
+
+
+def mean_section_embedding(chunk_vectors: List[List[float]]) -> Optional[List[float]]:
+    """
+    Section-level vector used by coarse-to-fine search: the mean of the
+    section's chunk vectors. Returns None if the section has no chunks.
+    """
+    if not chunk_vectors:
+        return None
+    return np.mean(np.asarray(chunk_vectors, dtype=np.float32), axis=0).tolist()
+
+
+# =============================================================================
+# LOCAL (IN-PROCESS) RETRIEVAL
+# =============================================================================
+_local_index: Optional[Tuple[IVFIndex, np.ndarray]] = None
+_local_index_mtime: Optional[float] = None
+
+
+def _get_local_index() -> Optional[Tuple[IVFIndex, np.ndarray]]:
+    """
+    Load (or reload, if the file changed) the chunk ANN index.
+    Returns (index, section_id_per_chunk_row) or None when no index is built.
+    """
+    global _local_index, _local_index_mtime
+    try:
+        mtime = os.path.getmtime(LOCAL_INDEX_PATH)
+    except OSError:
+        return None
+    if _local_index is None or mtime != _local_index_mtime:
+        index, extra = IVFIndex.load(LOCAL_INDEX_PATH)
+        _local_index = (index, extra["section_ids"])
+        _local_index_mtime = mtime
+        print(f"Loaded local ANN index: {len(index)} chunks, nlist={index.nlist}, nprobe={index.nprobe}")
+    return _local_index
+
+
+def local_search_ids(query_vector, match_threshold: float, match_count: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Same contract as hierarchical_search_ids, answered from the local index:
+    best chunk score per section, above threshold, top match_count sections.
+    Returns None if no local index is available.
+    """
+    loaded = _get_local_index()
+    if loaded is None:
+        return None
+    index, section_ids = loaded
+    if index.dim != len(query_vector):
+        print(f"Local ANN index has dim {index.dim}, query has {len(query_vector)}; rebuild the index")
+        return None
+
+    rows, scores = index.search(query_vector, k=match_count * LOCAL_CANDIDATES_PER_HIT)
+    best: Dict[int, float] = {}
+    for row, score in zip(rows.tolist(), scores.tolist()):
+        if score <= match_threshold:
+            continue
+        section_id = int(section_ids[row])
+        if score > best.get(section_id, -1.0):
+            best[section_id] = score
+
+    ranked = sorted(best.items(), key=lambda pair: pair[1], reverse=True)[:match_count]
+    return [{"section_id": sid, "similarity": score} for sid, score in ranked]
+
+
+async def _search_documents(params: Dict[str, Any], search_mode: str = DEFAULT_SEARCH_MODE) -> List[Dict[str, Any]]:
+    """
+    Run the ID-only hierarchical search and resolve content from the section
+    store. Falls back to the full-content RPC if hierarchical_search_ids is
+    not deployed yet.
+    """
+    hits = None
+    if search_mode == SEARCH_MODE_LOCAL:
+        try:
+            hits = await asyncio.to_thread(
+                local_search_ids, params["query_embedding"], params["match_threshold"], params["match_count"]
+            )
+        except Exception as e:
+            print(f"Local ANN search failed, using RPC search: {e}")
+
+    if search_mode == SEARCH_MODE_COARSE_TO_FINE:
+        try:
+            hits = await async_supabase_rpc(
+                _rpc_name("coarse_to_fine_search_ids"),
+                {**params, "section_count": COARSE_SECTION_COUNT},
+            )
+        except Exception as e:
+            print(f"coarse_to_fine_search_ids unavailable, using flat search: {e}")
+
+    if hits is None:
+        try:
+            hits = await async_supabase_rpc(_rpc_name("hierarchical_search_ids"), params)
+        except Exception as e:
+            print(f"hierarchical_search_ids unavailable, using hierarchical_search: {e}")
+            return await async_supabase_rpc(_rpc_name("hierarchical_search"), params) or []
+
+    hits = hits or []
+    await get_section_store().ensure([hit.get("section_id") for hit in hits])
+    return hits
+
+
+@traced("rag")
+async def hierarchical_rag_query(
+    user_question: str,
+    match_threshold: float = 0.3,
+    match_count: int = 4,
+    search_mode: str = DEFAULT_SEARCH_MODE,
+) -> Tuple[List[Dict[str, Any]], float]:
     """
     Performs a hierarchical search:
     1. Embeds the user question.
     2. Searches 'section_chunks' for matches (Hierarchical) -> Primary Source for Answer.
     3. Searches 'faq' table for matches (FAQ) -> Primary Source for YouTube Link.
     4. Merges and returns results.
+
+    Results for near-identical query vectors are served from the retrieval cache.
+    search_mode selects flat chunk search or two-stage coarse-to-fine search.
     
     Returns:
         Tuple of (results_list, best_similarity_score)
@@ -18,6 +350,16 @@ async def hierarchical_rag_query(user_question: str, match_threshold: float = 0.
     
     # 1. Embed user query
     query_vector = await async_generate_embedding(user_question)
+
+    await _retrieval_cache.refresh_kb_version()
+    cache_key, cache_vector = _retrieval_cache.make_key(query_vector, match_threshold, match_count, search_mode)
+    section_store = get_section_store()
+    await section_store.sync_version(_retrieval_cache.kb_version)
+
+    cached = _retrieval_cache.get(cache_key, cache_vector)
+    if cached is not None:
+        await section_store.ensure([item.get("section_id") for item in cached[0]])
+        return cached
     
     # 2. Call Supabase RPC functions
     params = {
@@ -27,15 +369,18 @@ async def hierarchical_rag_query(user_question: str, match_threshold: float = 0.
     }
     
     merged_results = []
+    search_failed = False
 
     # A. Search Hierarchical Docs (Primary Content)
     try:
-        doc_results = await async_supabase_rpc("hierarchical_search", params)
+        with span("rag_rpc"):
+            doc_results = await _search_documents(params, search_mode)
         if doc_results:
             for item in doc_results:
                 item["source_type"] = "DOCUMENT"
                 merged_results.append(item)
     except Exception as e:
+        search_failed = True
         print(f"Hierarchical search failed: {e}")
 
     # B. Search FAQ (For YouTube Link)
@@ -47,7 +392,8 @@ async def hierarchical_rag_query(user_question: str, match_threshold: float = 0.
     }
     
     try:
-        faq_results = await async_supabase_rpc("match_faq", faq_params)
+        with span("faq_rpc"):
+            faq_results = await async_supabase_rpc(_rpc_name("match_faq"), faq_params)
         if faq_results:
             for item in faq_results:
                 # Only add if it has a YouTube link or if we have no other results
@@ -59,10 +405,15 @@ async def hierarchical_rag_query(user_question: str, match_threshold: float = 0.
                     
                     merged_results.append(item)
     except Exception as e:
+        search_failed = True
         print(f"FAQ search failed: {e}")
     
     # Calculate best similarity score for reward system
     best_similarity = max((r.get("similarity", 0) for r in merged_results), default=0.0)
+
+    # Don't cache partial results from a failed RPC
+    if not search_failed:
+        _retrieval_cache.put(cache_key, cache_vector, merged_results, best_similarity)
     
     return merged_results, best_similarity
 
@@ -71,10 +422,13 @@ def format_hierarchical_context(results: List[Dict[str, Any]]) -> str:
     Formats the raw results into a context string for the LLM.
     Prioritizes Document content for the answer.
     Appends YouTube link if found in FAQ results.
+    Document hits carrying only a section_id are resolved from the section store.
     """
     if not results:
         return "No relevant information found."
 
+    section_store = get_section_store()
+
     doc_context = ""
     youtube_link_found = None
 
@@ -97,6 +451,14 @@ def format_hierarchical_context(results: List[Dict[str, Any]]) -> str:
             path = match.get("header_path", "Unknown Path")
             content = match.get("section_content", "")
             similarity = match.get("similarity", 0)
+
+            section = section_store.get(match.get("section_id"))
+            if section:
+                path = section.get("header_path") or path
+                content = section.get("content") or content
+            elif "section_content" not in match:
+                # Section vanished between search and formatting; nothing to show
+                continue
             
             doc_context += f"""
 --- SOURCE: DOCUMENT (Relevance: {similarity:.2f}) ---
@@ -0,0 +1,120 @@
+# modules/section_store.py
+"""
+Process-local copy of sakhi_sections (id -> header_path, content).
+
+The knowledge base is small and changes only when an ingestion script runs,
+so each worker preloads every section at startup and reloads when the KB
+version stamp (sql/setup_kb_version.sql) moves. Search RPCs can then return
+section IDs and scores only, and the context is assembled from memory.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+from supabase_client import supabase_select
+
+SECTION_COLUMNS = "id,header_path,content"
+LOAD_PAGE_SIZE = 1000
+
+
+class SectionStore:
+    """In-memory map of section id -> {"header_path", "content"}."""
+
+    def __init__(self):
+        self._sections: Dict[int, Dict[str, Any]] = {}
+        self.version: Optional[int] = None
+        self.loaded = False
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+    def get(self, section_id) -> Optional[Dict[str, Any]]:
+        if section_id is None:
+            return None
+        return self._sections.get(int(section_id))
+
+    def _add_rows(self, rows: Iterable[Dict[str, Any]], target: Dict[int, Dict[str, Any]]) -> None:
+        for row in rows:
+            target[int(row["id"])] = {
+                "header_path": row.get("header_path"),
+                "content": row.get("content") or "",
+            }
+
+    def load(self) -> int:
+        """
+        Fetch every section with keyset pagination on id.
+        Returns the number of sections loaded.
+        """
+        sections: Dict[int, Dict[str, Any]] = {}
+        last_id = 0
+        while True:
+            rows = supabase_select(
+                "sakhi_sections",
+                select=SECTION_COLUMNS,
+                filters=f"id=gt.{last_id}&order=id.asc",
+                limit=LOAD_PAGE_SIZE,
+            )
+            if not rows or not isinstance(rows, list):
+                break
+            self._add_rows(rows, sections)
+            last_id = rows[-1]["id"]
+            if len(rows) < LOAD_PAGE_SIZE:
+                break
+
+        # Swap in one step so readers never see a half-loaded store
+        self._sections = sections
+        self.loaded = True
+        print(f"📚 Section store loaded {len(sections)} sections (KB version {self.version})")
+        return len(sections)
+
+    async def async_load(self) -> int:
+        async with self._lock:
+            return await asyncio.to_thread(self.load)
+
+    async def sync_version(self, version: Optional[int]) -> None:
+        """Reload when the KB version differs from the one we loaded."""
+        if version is None or version == self.version:
+            return
+        previous = self.version
+        self.version = version
+        if previous is None and self.loaded:
+            # First version observation after the startup preload
+            return
+        try:
+            await self.async_load()
+        except Exception as e:
+            # Keep the old version so the next poll retries the reload
+            self.version = previous
+            print(f"⚠️ Section store reload failed: {e}")
+
+    async def ensure(self, section_ids: List[Any]) -> None:
+        """
+        Fetch any sections we don't hold yet (e.g. ingested after the last
+        reload but before the version poll noticed).
+        """
+        missing = sorted({int(sid) for sid in section_ids if sid is not None and self.get(sid) is None})
+        if not missing:
+            return
+        id_list = ",".join(str(sid) for sid in missing)
+        rows = await asyncio.to_thread(
+            supabase_select,
+            "sakhi_sections",
+            select=SECTION_COLUMNS,
+            filters=f"id=in.({id_list})",
+        )
+        if rows and isinstance(rows, list):
+            self._add_rows(rows, self._sections)
+
+
+# Module-level singleton instance
+_store_instance = None
+
+
+def get_section_store() -> SectionStore:
+    """
+    Get or create a singleton SectionStore instance.
+    """
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = SectionStore()
+    return _store_instance
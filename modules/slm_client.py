@@ -7,6 +7,8 @@ import httpx
 from fastapi import HTTPException
 
 from modules.text_utils import truncate_response
+from modules.tracing import traced
+from modules.metrics import observe_upstream
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -58,6 +60,9 @@ RULES:
 3. Be direct and polite.
 """
 
+# Intent label used when the SLM call fails or is skipped (lean/emergency modes)
+FALLBACK_INTENT_LABEL = "Here is the information you requested."
+
 SLM_SYSTEM_PROMPT_DIRECT = f"""{SLM_LANGUAGE_LOCK}
 You are Sakhi, a friendly AI assistant.
 
@@ -235,6 +240,7 @@ class SLMClient:
             
         return system_content
     
+    @traced("generate")
     async def generate_chat(
         self,
         message: str,
@@ -282,13 +288,13 @@ class SLMClient:
                     
                     logger.info(f"Sending request to SLM endpoint: {self.endpoint_url}")
                     
-                    response = await client.post(
-                        self.endpoint_url,
-                        json=payload,
-                        headers=headers,
-                    )
-                    
-                    response.raise_for_status()
+                    with observe_upstream("slm", "chat"):
+                        response = await client.post(
+                            self.endpoint_url,
+                            json=payload,
+                            headers=headers,
+                        )
+                        response.raise_for_status()
                     result = response.json()
                     
                     # Extract response text (SLM returns {"reply": "..."})
@@ -326,6 +332,7 @@ class SLMClient:
         logger.info(f"SLM mock response: {mock_response[:100]}...")
         return mock_response
     
+    @traced("generate")
     async def generate_rag_response(
         self,
         context: str,
@@ -377,13 +384,13 @@ class SLMClient:
                     
                     logger.info(f"Sending RAG request to SLM endpoint: {self.endpoint_url}")
                     
-                    response = await client.post(
-                        self.endpoint_url,
-                        json=payload,
-                        headers=headers,
-                    )
-                    
-                    response.raise_for_status()
+                    with observe_upstream("slm", "rag"):
+                        response = await client.post(
+                            self.endpoint_url,
+                            json=payload,
+                            headers=headers,
+                        )
+                        response.raise_for_status()
                     result = response.json()
                     
                     # Extract response text (SLM returns {"reply": "..."})
@@ -430,6 +437,7 @@ class SLMClient:
         """
         return self.endpoint_url is None
 
+    @traced("intent")
     async def generate_intent_label(
         self,
         message: str,
@@ -469,13 +477,13 @@ class SLMClient:
                     if self.api_key and self.api_key != "your-api-key-if-needed":
                         headers["Authorization"] = f"Bearer {self.api_key}"
                         
-                    response = await client.post(
-                        self.endpoint_url,
-                        json=payload,
-                        headers=headers,
-                    )
-                    
-                    response.raise_for_status()
+                    with observe_upstream("slm", "intent"):
+                        response = await client.post(
+                            self.endpoint_url,
+                            json=payload,
+                            headers=headers,
+                        )
+                        response.raise_for_status()
                     result = response.json()
                     
                     if isinstance(result, dict):
@@ -494,7 +502,7 @@ class SLMClient:
             except Exception as e:
                 logger.error(f"Error generating intent label: {e}")
                 # Fallback to simple generic string if SLM fails
-                return "Here is the information you requested."
+                return FALLBACK_INTENT_LABEL
         
         # Mock mode fallback
         return f"Here is the info regarding '{message[:20]}...'"
@@ -3,21 +3,35 @@
 Utility functions for text processing.
 """
 
+import re
+from functools import lru_cache
+from typing import List
+
 import tiktoken
 
 MAX_RESPONSE_LENGTH = 1024  # WhatsApp-friendly character limit
 
+# Ingestion chunking (see chunk_text_by_tokens)
+DEFAULT_CHUNK_TOKENS = 256
+DEFAULT_CHUNK_OVERLAP = 40
+CHUNK_MODEL = "text-embedding-3-small"
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
 
 def count_tokens(text: str, model: str = "gpt-4o") -> int:
     """
     Count the number of tokens in a text string.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    
-    return len(encoding.encode(text))
+    return len(_get_encoding(model).encode(text))
 
 
 def truncate_by_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
@@ -27,11 +41,7 @@ def truncate_by_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str
     if not text:
         return text
         
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        
+    encoding = _get_encoding(model)
     tokens = encoding.encode(text)
     
     # If already within limit
@@ -45,6 +55,66 @@ def truncate_by_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str
     return truncated_text
 
 
+def split_sentences(text: str) -> List[str]:
+    """Split text on sentence-ending punctuation and line breaks."""
+    return [s.strip() for s in _SENTENCE_BOUNDARY.split(text or "") if s and s.strip()]
+
+
+def chunk_text_by_tokens(
+    text: str,
+    target_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_CHUNK_OVERLAP,
+    model: str = CHUNK_MODEL,
+) -> List[str]:
+    """
+    Sliding-window chunker for ingestion.
+
+    Sentences are packed into chunks of up to `target_tokens`; each new chunk
+    starts with the trailing sentences of the previous one that fit in
+    `overlap_tokens`, so windows overlap on sentence boundaries. A single
+    sentence longer than `target_tokens` is split on token boundaries.
+    """
+    if target_tokens <= 0:
+        raise ValueError("target_tokens must be positive")
+    overlap_tokens = max(0, min(overlap_tokens, target_tokens // 2))
+    encoding = _get_encoding(model)
+
+    # (sentence, token count), with over-long sentences pre-split
+    pieces = []
+    for sentence in split_sentences(text):
+        tokens = encoding.encode(sentence)
+        if len(tokens) <= target_tokens:
+            pieces.append((sentence, len(tokens)))
+            continue
+        step = target_tokens - overlap_tokens
+        for start in range(0, len(tokens), step):
+            part = tokens[start:start + target_tokens]
+            pieces.append((encoding.decode(part).strip(), len(part)))
+            if start + target_tokens >= len(tokens):
+                break
+
+    chunks: List[str] = []
+    window: List[tuple] = []
+    window_tokens = 0
+    for piece in pieces:
+        if window and window_tokens + piece[1] > target_tokens:
+            chunks.append(" ".join(p[0] for p in window))
+            # Carry trailing sentences into the next window, never the whole window
+            carry: List[tuple] = []
+            carry_tokens = 0
+            for prev in reversed(window[1:]):
+                if carry_tokens + prev[1] > overlap_tokens or carry_tokens + prev[1] + piece[1] > target_tokens:
+                    break
+                carry.insert(0, prev)
+                carry_tokens += prev[1]
+            window, window_tokens = carry, carry_tokens
+        window.append(piece)
+        window_tokens += piece[1]
+
+    if window:
+        chunks.append(" ".join(p[0] for p in window))
+    return chunks
+
 
 def truncate_response(text: str, max_length: int = MAX_RESPONSE_LENGTH) -> str:
     """
@@ -0,0 +1,233 @@
+# modules/tracing.py
+"""
+Request-scoped stage timing.
+
+A RequestTrace is stored in a context variable for the duration of a request
+(TracingMiddleware, installed in main.py). Code on the request
+path wraps its stages in `with span("rag"):` or decorates functions with
+`@traced("rag")`; outside a request both are no-ops. asyncio tasks and asyncio.to_thread copy
+the context, so stages run concurrently (translation, classification, intent)
+record into the same trace.
+
+Each finished request is recorded in the /metrics request and stage
+histograms (modules/metrics.py) and can be rendered as:
+- a Server-Timing header (per-stage totals, plus "total"),
+- a `timings` block for the JSON response,
+- a slow-request log line with every span, when it exceeds SLOW_REQUEST_MS.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import MutableHeaders
+
+from modules.metrics import REQUESTS_IN_FLIGHT, record_request
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "8000"))
+SLOW_REQUEST_LOG_PATH = os.getenv(
+    "SLOW_REQUEST_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "slow_requests.jsonl"),
+)
+# Include a `timings` block in every chat response (clients can also opt in per request)
+TIMINGS_IN_RESPONSE = os.getenv("TIMINGS_IN_RESPONSE", "false").lower() in ("1", "true", "yes")
+
+_METRIC_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class RequestTrace:
+    """Spans recorded for one request, as offsets from the request start."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.meta: Dict[str, Any] = {}
+
+    def record(self, stage: str, start: float, end: float, depth: int, error: Optional[str] = None) -> None:
+        entry = {
+            "stage": stage,
+            "start_ms": round((start - self.started) * 1000, 1),
+            "ms": round((end - start) * 1000, 1),
+            "depth": depth,
+        }
+        if error:
+            entry["error"] = error
+        self.spans.append(entry)
+
+    def finish(self) -> None:
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    @property
+    def total_ms(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return round((end - self.started) * 1000, 1)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage totals in first-seen order: {stage: {"ms": .., "count": ..}}."""
+        stages: Dict[str, Dict[str, float]] = {}
+        for entry in self.spans:
+            stage = stages.setdefault(entry["stage"], {"ms": 0.0, "count": 0})
+            stage["ms"] = round(stage["ms"] + entry["ms"], 1)
+            stage["count"] += 1
+        return stages
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"total_ms": self.total_ms, "stages": self.summary()}
+
+    def server_timing(self) -> str:
+        parts = [
+            f"{_METRIC_NAME.sub('_', stage)};dur={stats['ms']}"
+            for stage, stats in self.summary().items()
+        ]
+        parts.append(f"total;dur={self.total_ms}")
+        return ", ".join(parts)
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("sakhi_request_trace", default=None)
+_span_depth: contextvars.ContextVar = contextvars.ContextVar("sakhi_span_depth", default=0)
+
+
+def start_trace(name: str):
+    """Begin a trace for the current context. Returns (trace, token for end_trace)."""
+    trace = RequestTrace(name)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.finish()
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def annotate(**fields: Any) -> None:
+    """Attach fields (route, user_id, ...) to the current trace for the slow log."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.meta.update(fields)
+
+
+class span:
+    """Time a block as `stage` in the current request trace (no-op without one)."""
+
+    __slots__ = ("stage", "trace", "start", "token")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.trace = None
+
+    def __enter__(self):
+        trace = _current_trace.get()
+        # Work outliving its request (e.g. a task it spawned) must not add spans after the fact
+        self.trace = trace if trace is not None and trace.finished is None else None
+        if self.trace is not None:
+            self.token = _span_depth.set(_span_depth.get() + 1)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            end = time.perf_counter()
+            _span_depth.reset(self.token)
+            error = exc_type.__name__ if exc_type is not None else None
+            self.trace.record(self.stage, self.start, end, _span_depth.get(), error)
+        return False
+
+
+def traced(stage: str):
+    """Decorator form of span() for sync and async functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def log_if_slow(trace: RequestTrace, status: Optional[int] = None, threshold_ms: Optional[float] = None) -> bool:
+    """Print and append the full breakdown of a request slower than the threshold."""
+    threshold = SLOW_REQUEST_MS if threshold_ms is None else threshold_ms
+    total = trace.total_ms
+    if total < threshold:
+        return False
+
+    slowest = sorted(trace.summary().items(), key=lambda item: item[1]["ms"], reverse=True)[:3]
+    print(f"🐢 Slow request {trace.name} ({total:.0f}ms): "
+          + ", ".join(f"{stage}={stats['ms']:.0f}ms" for stage, stats in slowest))
+    record = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "request": trace.name,
+        "status": status,
+        "total_ms": total,
+        "meta": trace.meta,
+        "stages": trace.summary(),
+        "spans": trace.spans,
+    }
+    try:
+        os.makedirs(os.path.dirname(SLOW_REQUEST_LOG_PATH) or ".", exist_ok=True)
+        with open(SLOW_REQUEST_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write slow request log: {e}")
+    return True
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: trace the request, set Server-Timing, record metrics,
+    log if slow.
+
+    Plain ASGI rather than @app.middleware("http"): Starlette's
+    BaseHTTPMiddleware hides http.disconnect from the endpoint, so
+    request.is_disconnected() never turned true and disconnected chat
+    turns ran to completion.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = start_trace(f"{scope['method']} {scope['path']}")
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                trace.finish()
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            end_trace(token)
+            # Route template (e.g. /sakhi/chat) keeps label cardinality bounded
+            path = getattr(scope.get("route"), "path", "unmatched")
+            record_request(path, str(trace.meta.get("route", "none")), status, trace.total_ms / 1000.0, trace.summary())
+            log_if_slow(trace, status=status)
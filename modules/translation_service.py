@@ -5,9 +5,12 @@ Used for routing and internal processing.
 """
 import os
 import logging
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DEFAULT_CONNECTION_LIMITS
 from dotenv import load_dotenv
 
+from modules.tracing import traced
+from modules.metrics import InstrumentedAsyncTransport
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
@@ -18,9 +21,16 @@ _api_key = os.getenv("OPENAI_API_KEY")
 if not _api_key:
     raise Exception("OPENAI_API_KEY missing")
 
-client = AsyncOpenAI(api_key=_api_key)
+client = AsyncOpenAI(
+    api_key=_api_key,
+    # httpx only applies `limits` to a transport it builds itself
+    http_client=DefaultAsyncHttpxClient(
+        transport=InstrumentedAsyncTransport("openai", limits=DEFAULT_CONNECTION_LIMITS)
+    ),
+)
 
 
+@traced("translate")
 async def translate_query(text: str, target_lang: str = "en") -> str:
     """
     Translate a query to the target language.
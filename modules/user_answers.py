@@ -1,12 +1,13 @@
 # modules/user_answers.py
 from typing import List, Tuple
 
-from supabase_client import supabase_insert
+from supabase_client import supabase_insert, RETURN_HEADERS_ONLY
 
 
 def save_user_answer(user_id: str, question_key: str, selected_options: List[str]):
     """
     Save a single answer row to sakhi_users_answer.
+    Returns the Location header of the new row.
     """
     if not user_id:
         raise ValueError("user_id is required")
@@ -21,7 +22,7 @@ def save_user_answer(user_id: str, question_key: str, selected_options: List[str
         "selected_options": selected_options,
     }
 
-    return supabase_insert("sakhi_users_answer", payload)
+    return supabase_insert("sakhi_users_answer", payload, returning=RETURN_HEADERS_ONLY)
 
 
 def save_bulk_answers(user_id: str, answers: List[dict]) -> Tuple[int, List]:
@@ -0,0 +1,250 @@
+# modules/user_locks.py
+"""
+Per-user locks that serialize chat turns of the same user.
+
+Onboarding (name -> gender -> location) and handle_lead_flow read state,
+decide and write it back; two concurrent turns of one user would both act on
+the same state. Holding the user's lock for the whole turn makes them run one
+after the other, in arrival order (asyncio.Lock wakes waiters FIFO), while
+turns of different users never wait on each other.
+
+Locks live in a dict keyed by user and are dropped as soon as nobody holds
+or waits for them, so memory follows the number of users with a turn in
+flight rather than every user seen.
+
+With USER_LOCK_BACKEND=postgres the in-process lock is followed by a
+session-level Postgres advisory lock on the same key, so turns are also
+serialized across workers. Each held lock pins one pooled connection
+(psycopg2, USER_LOCK_DB_URL / SUPABASE_DB_URL / DATABASE_URL); when all
+USER_LOCK_DB_POOL_SIZE connections are pinned, a new turn waits as if its
+user's lock were taken. Callers take the lock only once the turn is admitted,
+so queued turns do not pin connections.
+
+Because a turn waits for its user's lock while holding an admission slot,
+callers reserve() a place for the turn on arrival: at most
+USER_LOCK_MAX_QUEUED turns of one user wait behind the running one, so a
+single user's burst cannot fill the admission limit and shed everyone else.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+from modules.metrics import REGISTRY
+
+USER_LOCK_BACKEND = os.getenv("USER_LOCK_BACKEND", "memory").strip().lower()
+USER_LOCK_TIMEOUT_SECONDS = float(os.getenv("USER_LOCK_TIMEOUT_SECONDS", "30"))
+USER_LOCK_MAX_QUEUED = int(os.getenv("USER_LOCK_MAX_QUEUED", "1"))  # turns of one user waiting behind the running one
+USER_LOCK_DB_URL = os.getenv("USER_LOCK_DB_URL") or os.getenv("SUPABASE_DB_URL") or os.getenv("DATABASE_URL")
+USER_LOCK_DB_POOL_SIZE = int(os.getenv("USER_LOCK_DB_POOL_SIZE", "16"))
+ADVISORY_LOCK_NAMESPACE = 0x5A4B  # first key of pg_advisory_lock(int, int); second is hashtext(user)
+ADVISORY_POLL_SECONDS = (0.05, 0.5)  # initial / max delay between pg_try_advisory_lock attempts
+
+LOCK_WAIT = REGISTRY.histogram(
+    "sakhi_user_lock_wait_seconds", "Time a chat turn waited for its user's lock.", ("backend",),
+)
+
+
+class UserLockTimeout(TimeoutError):
+    """The user's previous turn held the lock for longer than the timeout."""
+
+
+class PostgresAdvisoryLocks:
+    """Session-level advisory locks, one pooled connection per held lock."""
+
+    def __init__(self, dsn: str, pool_size: int = USER_LOCK_DB_POOL_SIZE):
+        from psycopg2.pool import PoolError, ThreadedConnectionPool  # optional dependency
+
+        self._pool = ThreadedConnectionPool(1, pool_size, dsn)
+        self._pool_exhausted = PoolError
+        self._held: Dict[str, Any] = {}
+
+    def _try_lock(self, key: str):
+        try:
+            conn = self._pool.getconn()
+        except self._pool_exhausted:
+            return None  # every connection pins a held lock: retry like contention
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s, hashtext(%s))", (ADVISORY_LOCK_NAMESPACE, key))
+                locked = cur.fetchone()[0]
+        except Exception:
+            self._pool.putconn(conn, close=True)
+            raise
+        if locked:
+            return conn
+        self._pool.putconn(conn)
+        return None
+
+    def _unlock(self, key: str, conn) -> None:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s, hashtext(%s))", (ADVISORY_LOCK_NAMESPACE, key))
+            self._pool.putconn(conn)
+        except Exception as e:
+            # Closing the session releases its advisory locks
+            print(f"⚠️ Advisory unlock failed for {key}, dropping connection: {e}")
+            self._pool.putconn(conn, close=True)
+
+    async def acquire(self, key: str, deadline: float) -> None:
+        delay = ADVISORY_POLL_SECONDS[0]
+        while True:
+            attempt = asyncio.ensure_future(asyncio.to_thread(self._try_lock, key))
+            try:
+                conn = await asyncio.shield(attempt)
+            except asyncio.CancelledError:
+                # The query keeps running in its thread; unlock if it got the lock
+                attempt.add_done_callback(self._unlock_abandoned(key))
+                raise
+            if conn is not None:
+                self._held[key] = conn
+                return
+            if time.monotonic() + delay > deadline:
+                raise UserLockTimeout(key)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, ADVISORY_POLL_SECONDS[1])
+
+    def _unlock_abandoned(self, key: str):
+        def callback(attempt: asyncio.Future) -> None:
+            if attempt.cancelled() or attempt.exception() is not None or attempt.result() is None:
+                return
+            asyncio.get_running_loop().run_in_executor(None, self._unlock, key, attempt.result())
+        return callback
+
+    async def release(self, key: str) -> None:
+        conn = self._held.pop(key, None)
+        if conn is not None:
+            await asyncio.to_thread(self._unlock, key, conn)
+
+
+class _UserLock:
+    __slots__ = ("lock", "refs")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.refs = 0
+
+
+class _Held:
+    """`async with manager.lock(user_key):` handle."""
+
+    __slots__ = ("manager", "key")
+
+    def __init__(self, manager: "UserLockManager", key: str):
+        self.manager = manager
+        self.key = key
+
+    async def __aenter__(self):
+        await self.manager.acquire(self.key)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.manager.release(self.key)
+        return False
+
+
+class UserLockManager:
+    def __init__(
+        self,
+        timeout: float = USER_LOCK_TIMEOUT_SECONDS,
+        distributed: Optional[PostgresAdvisoryLocks] = None,
+        max_queued: int = USER_LOCK_MAX_QUEUED,
+    ):
+        self.timeout = timeout
+        self.distributed = distributed
+        self.max_queued = max_queued
+        self.backend = "postgres" if distributed is not None else "memory"
+        self._locks: Dict[str, _UserLock] = {}
+        self._turns: Dict[str, int] = {}
+        self.counters = {"acquired": 0, "contended": 0, "timed_out": 0, "rejected": 0}
+
+    def lock(self, user_key: str) -> _Held:
+        return _Held(self, user_key)
+
+    def reserve(self, user_key: str) -> bool:
+        """
+        Count a turn of this user from its arrival until unreserve(). Returns
+        False (and counts a rejection) when the user already has one running
+        turn and `max_queued` waiting ones.
+        """
+        turns = self._turns.get(user_key, 0)
+        if turns > self.max_queued:
+            self.counters["rejected"] += 1
+            return False
+        self._turns[user_key] = turns + 1
+        return True
+
+    def unreserve(self, user_key: str) -> None:
+        turns = self._turns.pop(user_key) - 1
+        if turns:
+            self._turns[user_key] = turns
+
+    async def acquire(self, user_key: str) -> None:
+        """Wait for the user's lock; raises UserLockTimeout after `timeout` seconds."""
+        entry = self._locks.get(user_key)
+        if entry is None:
+            entry = self._locks[user_key] = _UserLock()
+        entry.refs += 1
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        if entry.refs == 1:
+            await entry.lock.acquire()  # nobody else holds or waits: returns at once
+        else:
+            self.counters["contended"] += 1
+            try:
+                await asyncio.wait_for(entry.lock.acquire(), self.timeout)
+            except BaseException as e:
+                self._unref(user_key, entry)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counters["timed_out"] += 1
+                    raise UserLockTimeout(user_key) from None
+                raise
+
+        if self.distributed is not None:
+            try:
+                await self.distributed.acquire(user_key, deadline)
+            except BaseException as e:
+                entry.lock.release()
+                self._unref(user_key, entry)
+                if isinstance(e, UserLockTimeout):
+                    self.counters["timed_out"] += 1
+                raise
+        LOCK_WAIT.observe(time.monotonic() - start, backend=self.backend)
+        self.counters["acquired"] += 1
+
+    async def release(self, user_key: str) -> None:
+        entry = self._locks[user_key]
+        try:
+            if self.distributed is not None:
+                await self.distributed.release(user_key)
+        finally:
+            entry.lock.release()
+            self._unref(user_key, entry)
+
+    def _unref(self, user_key: str, entry: _UserLock) -> None:
+        entry.refs -= 1
+        if entry.refs == 0 and self._locks.get(user_key) is entry:
+            del self._locks[user_key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "active_users": len(self._locks), **self.counters}
+
+
+_user_lock_manager: Optional[UserLockManager] = None
+
+
+def get_user_lock_manager() -> UserLockManager:
+    global _user_lock_manager
+    if _user_lock_manager is None:
+        distributed = None
+        if USER_LOCK_BACKEND == "postgres":
+            try:
+                if not USER_LOCK_DB_URL:
+                    raise RuntimeError("USER_LOCK_DB_URL / SUPABASE_DB_URL / DATABASE_URL not set")
+                distributed = PostgresAdvisoryLocks(USER_LOCK_DB_URL)
+            except Exception as e:
+                print(f"⚠️ Postgres advisory locks unavailable, using in-process user locks: {e}")
+        _user_lock_manager = UserLockManager(distributed=distributed)
+    return _user_lock_manager
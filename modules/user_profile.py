@@ -1,13 +1,179 @@
 # modules/user_profile.py
+import asyncio
 import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
 
 from supabase_client import (
     generate_user_id,
     supabase_insert,
     supabase_select,
     supabase_update,
+    RETURN_MINIMAL,
 )
 
+# Columns the app reads from sakhi_users (no password_hash / context JSON)
+PROFILE_COLUMNS = (
+    "user_id,name,email,phone_number,role,preferred_language,"
+    "relation_to_patient,gender,location,rewards"
+)
+
+PROFILE_CACHE_TTL_SECONDS = 30   # bounds staleness of writes made by other workers
+PROFILE_CACHE_MAX_USERS = 10_000
+
+
+class _KeyLock:
+    __slots__ = ("lock", "refs")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refs = 0
+
+
+class ProfileCache:
+    """
+    TTL + LRU cache of sakhi_users rows, keyed by user_id with a secondary
+    index on normalized phone number.
+
+    Writes in this module are write-through: the row PostgREST returns
+    replaces the cached one (or the entry is dropped if none came back).
+    Concurrent misses for the same key share a single fetch. Code on the
+    event loop uses aget_or_load(), which runs that fetch (and any wait for
+    it) in a worker thread.
+    """
+
+    def __init__(self, ttl_seconds: float = PROFILE_CACHE_TTL_SECONDS, max_users: int = PROFILE_CACHE_MAX_USERS):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._rows: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_phone: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, _KeyLock] = {}
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, user_id: Optional[str] = None, phone: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if user_id is None and phone is not None:
+                user_id = self._by_phone.get(phone)
+            entry = self._rows.get(user_id) if user_id else None
+            if entry is None:
+                return None
+            if time.monotonic() - entry["stored_at"] > self.ttl_seconds:
+                self._drop(user_id)
+                return None
+            self._rows.move_to_end(user_id)
+            return dict(entry["row"])
+
+    def _drop(self, user_id: str) -> None:
+        entry = self._rows.pop(user_id, None)
+        if entry:
+            phone = entry["row"].get("phone_number")
+            if phone and self._by_phone.get(phone) == user_id:
+                del self._by_phone[phone]
+
+    def put(self, row: Optional[Dict[str, Any]]) -> None:
+        if not isinstance(row, dict) or not row.get("user_id"):
+            return
+        user_id = row["user_id"]
+        with self._lock:
+            self._drop(user_id)
+            self._rows[user_id] = {"row": dict(row), "stored_at": time.monotonic()}
+            if row.get("phone_number"):
+                self._by_phone[row["phone_number"]] = user_id
+            while len(self._rows) > self.max_users:
+                oldest = next(iter(self._rows))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._rows.clear()
+                self._by_phone.clear()
+            else:
+                self._drop(user_id)
+
+    def get_or_load(
+        self,
+        loader: Callable[[], Optional[Dict[str, Any]]],
+        user_id: Optional[str] = None,
+        phone: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        row = self._lookup(user_id, phone)
+        if row is not None:
+            self.hits += 1
+            return row
+
+        key = f"id:{user_id}" if user_id else f"phone:{phone}"
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, _KeyLock())
+            key_lock.refs += 1
+        try:
+            with key_lock.lock:
+                # Another caller may have loaded it while we waited
+                row = self._lookup(user_id, phone)
+                if row is not None:
+                    self.hits += 1
+                    return row
+                self.misses += 1
+                row = loader()
+                self.put(row)
+        finally:
+            # Dropped only once nobody holds or waits for it
+            with self._lock:
+                key_lock.refs -= 1
+                if not key_lock.refs:
+                    del self._key_locks[key]
+        return dict(row) if isinstance(row, dict) else row
+
+    async def aget_or_load(
+        self,
+        loader: Callable[[], Optional[Dict[str, Any]]],
+        user_id: Optional[str] = None,
+        phone: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """get_or_load() for the event loop: hits inline, misses in a worker thread."""
+        row = self._lookup(user_id, phone)
+        if row is not None:
+            self.hits += 1
+            return row
+        return await asyncio.to_thread(self.get_or_load, loader, user_id, phone)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_profile_cache = ProfileCache()
+
+
+def get_profile_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the profile cache of this worker."""
+    return _profile_cache.stats()
+
+
+def _write_through(user_id: str, result):
+    """Cache the row returned by an update/insert, or drop the stale entry."""
+    if isinstance(result, list) and result and isinstance(result[0], dict):
+        _profile_cache.put(result[0])
+    elif isinstance(result, dict) and result.get("user_id"):
+        _profile_cache.put(result)
+    else:
+        _profile_cache.invalidate(user_id)
+    return result
+
 
 def _normalize_phone(phone: str | None) -> str | None:
     """
@@ -50,7 +216,8 @@ def create_user(
         "relation_to_patient": relation,
     }
 
-    inserted = supabase_insert("sakhi_users", data)
+    inserted = supabase_insert("sakhi_users", data, columns=PROFILE_COLUMNS)
+    _write_through(user_id, inserted)
     if isinstance(inserted, list) and inserted:
         return inserted[0]
     if isinstance(inserted, dict):
@@ -64,7 +231,7 @@ def update_relation(user_id: str, relation: str):
     if not relation:
         raise ValueError("relation is required")
     match = f"user_id=eq.{user_id}"
-    return supabase_update("sakhi_users", match, {"relation_to_patient": relation})
+    return _write_through(user_id, supabase_update("sakhi_users", match, {"relation_to_patient": relation}, columns=PROFILE_COLUMNS))
 
 
 def update_preferred_language(user_id: str, preferred_language: str):
@@ -73,14 +240,11 @@ def update_preferred_language(user_id: str, preferred_language: str):
     if not preferred_language:
         raise ValueError("preferred_language is required")
     match = f"user_id=eq.{user_id}"
-    return supabase_update("sakhi_users", match, {"preferred_language": preferred_language})
+    return _write_through(user_id, supabase_update("sakhi_users", match, {"preferred_language": preferred_language}, columns=PROFILE_COLUMNS))
 
 
-def get_user_profile(user_id: str):
-    """
-    Fetch complete user profile.
-    """
-    rows = supabase_select("sakhi_users", select="*", filters=f"user_id=eq.{user_id}")
+def _fetch_user_profile(user_id: str, columns: str = PROFILE_COLUMNS):
+    rows = supabase_select("sakhi_users", select=columns, filters=f"user_id=eq.{user_id}")
 
     if not rows or not isinstance(rows, list):
         return None
@@ -88,20 +252,50 @@ def get_user_profile(user_id: str):
     return rows[0]
 
 
+def _fetch_user_by_phone(norm_phone: str):
+    # try phone_number first
+    rows = supabase_select("sakhi_users", select=PROFILE_COLUMNS, filters=f"phone_number=eq.{norm_phone}")
+    if rows and isinstance(rows, list) and rows:
+        return rows[0]
+    return None
+
+
+def get_user_profile(user_id: str):
+    """
+    Fetch complete user profile (served from the profile cache when fresh).
+    """
+    if not user_id:
+        return None
+    return _profile_cache.get_or_load(lambda: _fetch_user_profile(user_id), user_id=user_id)
+
+
+async def async_get_user_profile(user_id: str):
+    """
+    get_user_profile() for async callers; a cache miss does not block the event loop.
+    """
+    if not user_id:
+        return None
+    return await _profile_cache.aget_or_load(lambda: _fetch_user_profile(user_id), user_id=user_id)
+
+
 def get_user_by_phone(phone_number: str):
     """
     Fetch user by phone_number (or phone).
     """
-    if not phone_number:
+    norm = _normalize_phone(phone_number)
+    if not norm:
         return None
+    return _profile_cache.get_or_load(lambda: _fetch_user_by_phone(norm), phone=norm)
+
+
+async def async_get_user_by_phone(phone_number: str):
+    """
+    get_user_by_phone() for async callers; a cache miss does not block the event loop.
+    """
     norm = _normalize_phone(phone_number)
     if not norm:
         return None
-    # try phone_number first
-    rows = supabase_select("sakhi_users", select="*", filters=f"phone_number=eq.{norm}")
-    if rows and isinstance(rows, list) and rows:
-        return rows[0]
-    return None
+    return await _profile_cache.aget_or_load(lambda: _fetch_user_by_phone(norm), phone=norm)
 
 
 def resolve_user_id_by_phone(phone_number: str) -> str | None:
@@ -125,7 +319,8 @@ def create_partial_user(phone_number: str):
     }
     
     # insert
-    inserted = supabase_insert("sakhi_users", data)
+    inserted = supabase_insert("sakhi_users", data, columns=PROFILE_COLUMNS)
+    _write_through(user_id, inserted)
     if isinstance(inserted, list) and inserted:
         return inserted[0]
     if isinstance(inserted, dict):
@@ -140,7 +335,7 @@ def update_user_profile(user_id: str, updates: dict):
         raise ValueError("user_id is required")
     
     match = f"user_id=eq.{user_id}"
-    return supabase_update("sakhi_users", match, updates)
+    return _write_through(user_id, supabase_update("sakhi_users", match, updates, columns=PROFILE_COLUMNS))
 
 
 def update_user_context(user_id: str, context: dict):
@@ -151,8 +346,8 @@ def update_user_context(user_id: str, context: dict):
     if not user_id:
         raise ValueError("user_id is required")
 
-    # Fetch existing
-    profile = get_user_profile(user_id)
+    # Fetch existing (bypass the cache: this is a read-modify-write)
+    profile = _fetch_user_profile(user_id, columns="user_id,context")
     if not profile:
         raise ValueError("User not found")
     
@@ -167,7 +362,8 @@ def update_user_context(user_id: str, context: dict):
     current_context.update(context)
     
     match = f"user_id=eq.{user_id}"
-    return supabase_update("sakhi_users", match, {"context": current_context})
+    # The cached profile does not hold context, so it stays valid
+    return supabase_update("sakhi_users", match, {"context": current_context}, returning=RETURN_MINIMAL)
 
 
 
@@ -182,7 +378,7 @@ def login_user(email: str, password: str):
         raise ValueError("password is required")
     
     # Fetch user by email
-    rows = supabase_select("sakhi_users", select="*", filters=f"email=eq.{email}")
+    rows = supabase_select("sakhi_users", select=f"{PROFILE_COLUMNS},password_hash", filters=f"email=eq.{email}")
     
     if not rows or not isinstance(rows, list) or len(rows) == 0:
         return None
@@ -190,10 +386,11 @@ def login_user(email: str, password: str):
     user = rows[0]
     
     # Check password
-    stored_password = user.get("password_hash")
+    stored_password = user.pop("password_hash", None)
     
     if stored_password != password:
         return None
     
     # Authentication successful
+    _profile_cache.put(user)
     return user
@@ -10,10 +10,13 @@ Reward Criteria:
 - CONVERSATIONAL (1 pt): Basic small talk
 """
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional
 import asyncio
+import threading
 
-from supabase_client import supabase_update, supabase_insert, supabase_select
+from supabase_client import supabase_select, async_supabase_insert, async_supabase_rpc, RETURN_MINIMAL
+from rag import async_generate_embedding
+from modules.question_clustering import get_recent_questions_index
 
 
 class RewardType(Enum):
@@ -27,6 +30,9 @@ class RewardType(Enum):
 # Similarity threshold below which a question is considered "new"
 NEW_QUESTION_THRESHOLD = 0.4
 
+# How often coalesced point awards are written (see RewardsLedger)
+REWARDS_FLUSH_SECONDS = 2.0
+
 
 def classify_for_reward(
     route: str,
@@ -72,62 +78,164 @@ def classify_for_reward(
     return RewardType.CONVERSATIONAL  # 1 pt
 
 
+class RewardsLedger:
+    """
+    In-process aggregator for reward points.
+
+    award_points only adds to a per-user pending delta; a background task
+    flushes all pending deltas every `flush_interval` seconds with one
+    increment_rewards_bulk RPC (sql/setup_rewards_increment.sql), which adds
+    them atomically in Postgres. Failed flushes put the deltas back.
+    Readers add the not-yet-flushed points to the stored total.
+    """
+
+    def __init__(self, flush_interval: float = REWARDS_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, int] = {}
+        self._inflight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.stats = {"awards": 0, "flushes": 0, "flushed_users": 0, "flush_errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending_users(self) -> int:
+        """Users with points not yet written to sakhi_users."""
+        with self._lock:
+            return len(set(self._pending) | set(self._inflight))
+
+    def add(self, user_id: str, points: int) -> None:
+        with self._lock:
+            self._pending[user_id] = self._pending.get(user_id, 0) + points
+            self.stats["awards"] += 1
+
+    def unflushed(self, user_id: str) -> int:
+        """Points awarded to this user that are not in the table yet."""
+        with self._lock:
+            return self._pending.get(user_id, 0) + self._inflight.get(user_id, 0)
+
+    async def flush(self) -> int:
+        """Write all pending deltas in one RPC. Returns the number of users."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            self._inflight, self._pending = self._pending, {}
+            batch = dict(self._inflight)
+        try:
+            await async_supabase_rpc("increment_rewards_bulk", {
+                "deltas": [{"user_id": uid, "delta": delta} for uid, delta in batch.items()],
+            })
+            self.stats["flushes"] += 1
+            self.stats["flushed_users"] += len(batch)
+        except Exception as e:
+            print(f"⚠️ Rewards flush failed, keeping {len(batch)} users pending: {e}")
+            self.stats["flush_errors"] += 1
+            with self._lock:
+                for uid, delta in batch.items():
+                    self._pending[uid] = self._pending.get(uid, 0) + delta
+        finally:
+            with self._lock:
+                self._inflight = {}
+        return len(batch)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+        # Shutdown may arrive before the first wait
+        await self.flush()
+
+
+_rewards_ledger: Optional[RewardsLedger] = None
+
+
+def get_rewards_ledger() -> RewardsLedger:
+    global _rewards_ledger
+    if _rewards_ledger is None:
+        _rewards_ledger = RewardsLedger()
+    return _rewards_ledger
+
+
 async def award_points(user_id: str, reward_type: RewardType) -> None:
     """
     Add reward points to user's total. Runs asynchronously.
     
+    Points are coalesced in the rewards ledger and flushed in bulk; without
+    a running ledger (scripts) they are added with one atomic RPC. Errors
+    are raised so the background runner can retry them.
+    
     Args:
         user_id: The user's unique identifier
         reward_type: The type of reward to award
     """
-    try:
-        points = reward_type.value
-        
-        # Fetch current rewards
-        rows = supabase_select(
-            "sakhi_users",
-            select="rewards",
-            filters=f"user_id=eq.{user_id}"
-        )
-        
-        current_rewards = 0
-        if rows and isinstance(rows, list) and len(rows) > 0:
-            current_rewards = rows[0].get("rewards") or 0
-        
-        new_total = current_rewards + points
-        
-        # Update the rewards
-        match = f"user_id=eq.{user_id}"
-        supabase_update("sakhi_users", match, {"rewards": new_total})
-        
-        print(f"🏆 Awarded {points} points ({reward_type.name}) to user {user_id}. New total: {new_total}")
-        
-    except Exception as e:
-        # Log but don't fail the main request
-        print(f"⚠️ Failed to award points: {e}")
+    points = reward_type.value
+    ledger = get_rewards_ledger()
+    if ledger.running:
+        ledger.add(user_id, points)
+        print(f"🏆 Awarded {points} points ({reward_type.name}) to user {user_id}")
+        return
+
+    new_total = await async_supabase_rpc("increment_rewards", {"p_user_id": user_id, "p_delta": points})
+    print(f"🏆 Awarded {points} points ({reward_type.name}) to user {user_id}. New total: {new_total}")
 
 
 async def store_new_question(user_id: str, question: str, similarity: float) -> None:
     """
     Store novel questions for future KB expansion.
     
+    Runs on the background runner, which logs and retries failures, so
+    errors are raised rather than swallowed. A question within
+    DEDUP_SIMILARITY of one stored recently by this worker is skipped;
+    scripts/cluster_new_questions.py groups the rest offline.
+    
     Args:
         user_id: The user's unique identifier
         question: The question text
         similarity: The similarity score that triggered NEW_QUESTION
     """
+    recent = get_recent_questions_index()
+    vector = None
     try:
-        payload = {
-            "user_id": user_id,
-            "question": question,
-            "similarity_score": similarity
-        }
-        supabase_insert("sakhi_new_questions", payload)
-        print(f"📝 Stored new question for KB expansion: '{question[:50]}...' (similarity: {similarity:.2f})")
-        
+        vector = await async_generate_embedding(question)
     except Exception as e:
-        # Log but don't fail the main request
-        print(f"⚠️ Failed to store new question: {e}")
+        # Dedup is best-effort; never lose the question because of it
+        print(f"⚠️ New-question dedup skipped (embedding failed): {e}")
+    if vector is not None:
+        duplicate, best = recent.check(vector)
+        if duplicate:
+            print(f"📝 Skipped near-duplicate new question: '{question[:50]}...' (match: {best:.3f})")
+            return
+
+    payload = {
+        "user_id": user_id,
+        "question": question,
+        "similarity_score": similarity
+    }
+    await async_supabase_insert("sakhi_new_questions", payload, returning=RETURN_MINIMAL)
+    if vector is not None:
+        # Only after the insert, so a retried attempt is not mistaken for a duplicate
+        recent.add(vector)
+    print(f"📝 Stored new question for KB expansion: '{question[:50]}...' (similarity: {similarity:.2f})")
 
 
 def get_user_rewards(user_id: str) -> int:
@@ -147,9 +255,11 @@ def get_user_rewards(user_id: str) -> int:
             filters=f"user_id=eq.{user_id}"
         )
         
+        stored = 0
         if rows and isinstance(rows, list) and len(rows) > 0:
-            return rows[0].get("rewards") or 0
-        return 0
+            stored = rows[0].get("rewards") or 0
+        # Read through the ledger so /rewards includes points not flushed yet
+        return stored + get_rewards_ledger().unflushed(user_id)
         
     except Exception as e:
         print(f"⚠️ Failed to fetch rewards: {e}")
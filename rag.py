@@ -1,33 +1,108 @@
 import os
 import asyncio
+from typing import Dict, List, Optional
+
+import numpy as np
+
 import supabase_client  # ensures .env is loaded once
-from openai import OpenAI, AsyncOpenAI
+from modules.tracing import traced
+from modules.metrics import InstrumentedTransport, InstrumentedAsyncTransport
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, DEFAULT_CONNECTION_LIMITS
 
 EMBEDDING_MODEL = "text-embedding-3-small"  # 1536 dimensions
+FULL_EMBEDDING_DIMENSIONS = 1536
+
+# Matryoshka-reduced mode: text-embedding-3 vectors can be shortened (e.g. to
+# 512 or 256) and still rank well. When set below 1536, query embeddings are
+# requested at this size and searches use the parallel reduced columns/RPCs
+# (sql/setup_reduced_embeddings.sql, scripts/reembed_reduced.py).
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", str(FULL_EMBEDDING_DIMENSIONS)))
+
+# Reduced sizes sql/setup_reduced_embeddings.sql creates columns and RPCs for
+REDUCED_EMBEDDING_DIMENSIONS = (512,)
+
+
+def check_embedding_dimensions(dimensions: int) -> None:
+    """Fail fast on a size whose *_<n> columns/RPCs do not exist in the database."""
+    if dimensions != FULL_EMBEDDING_DIMENSIONS and dimensions not in REDUCED_EMBEDDING_DIMENSIONS:
+        supported = ", ".join(str(d) for d in (FULL_EMBEDDING_DIMENSIONS, *REDUCED_EMBEDDING_DIMENSIONS))
+        raise Exception(
+            f"EMBEDDING_DIMENSIONS={dimensions} is not supported (use {supported}); "
+            "see sql/setup_reduced_embeddings.sql"
+        )
+
+
+check_embedding_dimensions(EMBEDDING_DIMENSIONS)
 
 _api_key = os.getenv("OPENAI_API_KEY")
 if not _api_key:
     raise Exception("OPENAI_API_KEY missing")
 
-client = OpenAI(api_key=_api_key)
-async_client = AsyncOpenAI(api_key=_api_key)
+# httpx only applies `limits` to a transport it builds itself
+client = OpenAI(
+    api_key=_api_key,
+    http_client=DefaultHttpxClient(transport=InstrumentedTransport("openai", limits=DEFAULT_CONNECTION_LIMITS)),
+)
+async_client = AsyncOpenAI(
+    api_key=_api_key,
+    http_client=DefaultAsyncHttpxClient(
+        transport=InstrumentedAsyncTransport("openai", limits=DEFAULT_CONNECTION_LIMITS)
+    ),
+)
+
+
+def _dimension_kwargs(dimensions: Optional[int]) -> dict:
+    # Only send `dimensions` when shortening; full size is the model default
+    dims = dimensions or EMBEDDING_DIMENSIONS
+    return {"dimensions": dims} if dims < FULL_EMBEDDING_DIMENSIONS else {}
+
+
+def reduce_embedding(vector: List[float], dimensions: int) -> List[float]:
+    """
+    Shorten a full text-embedding-3 vector to `dimensions` (Matryoshka):
+    keep the leading components and re-normalise to unit length. Equivalent
+    to requesting `dimensions` from the API, without another call.
+    """
+    head = np.asarray(vector[:dimensions], dtype=np.float32)
+    norm = np.linalg.norm(head)
+    return (head / norm if norm else head).tolist()
+
+
+def embedding_column(base: str = "embedding", dimensions: Optional[int] = None) -> str:
+    """Column holding vectors of the given size, e.g. embedding -> embedding_512."""
+    dims = dimensions or EMBEDDING_DIMENSIONS
+    return base if dims >= FULL_EMBEDDING_DIMENSIONS else f"{base}_{dims}"
+
+
+def embedding_columns(vector: List[float], base: str = "embedding") -> Dict[str, List[float]]:
+    """
+    Row payload for a full-size vector: the full column, plus the reduced
+    column when reduced mode is on. Ingestion writes both so either mode works.
+    """
+    columns = {base: vector}
+    if EMBEDDING_DIMENSIONS < FULL_EMBEDDING_DIMENSIONS:
+        columns[embedding_column(base)] = reduce_embedding(vector, EMBEDDING_DIMENSIONS)
+    return columns
 
 
-def generate_embedding(text: str):
+def generate_embedding(text: str, dimensions: Optional[int] = None):
     """
-    Converts text into a 1536-dimensional embedding vector using OpenAI.
+    Converts text into an embedding vector using OpenAI.
+    Size is EMBEDDING_DIMENSIONS unless `dimensions` is given.
     """
     cleaned = text.strip().replace("\n", " ")
 
     resp = client.embeddings.create(
         model=EMBEDDING_MODEL,
-        input=cleaned
+        input=cleaned,
+        **_dimension_kwargs(dimensions),
     )
 
     return resp.data[0].embedding
 
 
-async def async_generate_embedding(text: str):
+@traced("embed")
+async def async_generate_embedding(text: str, dimensions: Optional[int] = None):
     """
     Async version of generate_embedding.
     """
@@ -35,22 +110,24 @@ async def async_generate_embedding(text: str):
 
     resp = await async_client.embeddings.create(
         model=EMBEDDING_MODEL,
-        input=cleaned
+        input=cleaned,
+        **_dimension_kwargs(dimensions),
     )
 
     return resp.data[0].embedding
 
 
-def generate_embeddings_batch(texts: list) -> list:
+def generate_embeddings_batch(texts: list, dimensions: Optional[int] = None) -> list:
     """
     Converts a list of texts into embedding vectors using OpenAI's batch API.
     More efficient than calling generate_embedding() individually for each text.
     
     Args:
         texts: List of text strings to embed
+        dimensions: Vector size (defaults to EMBEDDING_DIMENSIONS)
         
     Returns:
-        List of embedding vectors (each 1536 dimensions)
+        List of embedding vectors
     """
     if not texts:
         return []
@@ -61,14 +138,15 @@ def generate_embeddings_batch(texts: list) -> list:
     # OpenAI embeddings API accepts a list of inputs
     resp = client.embeddings.create(
         model=EMBEDDING_MODEL,
-        input=cleaned_texts
+        input=cleaned_texts,
+        **_dimension_kwargs(dimensions),
     )
     
     # Return embeddings in the same order as input texts
     return [item.embedding for item in resp.data]
 
 
-async def async_generate_embeddings_batch(texts: list) -> list:
+async def async_generate_embeddings_batch(texts: list, dimensions: Optional[int] = None) -> list:
     """
     Async version of generate_embeddings_batch.
     """
@@ -81,7 +159,8 @@ async def async_generate_embeddings_batch(texts: list) -> list:
     # OpenAI embeddings API accepts a list of inputs
     resp = await async_client.embeddings.create(
         model=EMBEDDING_MODEL,
-        input=cleaned_texts
+        input=cleaned_texts,
+        **_dimension_kwargs(dimensions),
     )
     
     # Return embeddings in the same order as input texts
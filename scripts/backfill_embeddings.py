@@ -1,44 +1,160 @@
 # backfill_embeddings.py
 """
-Backfill embeddings for sakhi_kb rows that are missing an embedding.
+Backfill missing embeddings as a streaming job.
+
+Rows are read in keyset-paginated pages (only key + text columns, with a
+server-side filter for a missing full or, in reduced mode, reduced vector), embedded in batches with
+generate_embeddings_batch and written back in bulk through the
+bulk_set_embeddings RPC (sql/setup_bulk_embedding_update.sql). Batches run
+with bounded concurrency; every remote call is retried with backoff.
+
+Targets:
+    sakhi_bot_knowledge   kb_id / content        -> embedding
+    sakhi_section_chunks  id    / chunk_content  -> embedding (+ reduced column)
+    sakhi_faq             id    / question       -> question_vector (+ reduced column)
 
 Usage:
-    python backfill_embeddings.py
+    python scripts/backfill_embeddings.py
+    python scripts/backfill_embeddings.py --table sakhi_faq --concurrency 8
 Requires:
     - .env with OPENAI_API_KEY and Supabase service role credentials
 """
 import os
 import sys
+import time
+import asyncio
+import argparse
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from supabase_client import supabase_select, supabase_update
-from modules.rag_search import _generate_embedding
+from supabase_client import async_supabase_select, async_supabase_rpc
+from rag import async_generate_embeddings_batch, embedding_column, embedding_columns, FULL_EMBEDDING_DIMENSIONS
+from modules.ingestion_pipeline import with_retry, plan_embedding_batches, DEFAULT_CONCURRENCY
+
+PAGE_SIZE = 500
+EMBED_BATCH_SIZE = 256
+
+# table -> (key column, text column, full-size vector column, also write reduced column)
+TARGETS = {
+    "sakhi_bot_knowledge": ("kb_id", "content", "embedding", False),
+    "sakhi_section_chunks": ("id", "chunk_content", "embedding", True),
+    "sakhi_faq": ("id", "question", "question_vector", True),
+}
+
+
+def missing_filter(table: str) -> str:
+    """
+    Rows missing any vector this run writes. The columns are written by
+    separate RPCs, so a row can have its full vector but not its reduced one.
+    """
+    _, _, vector_column, with_reduced = TARGETS[table]
+    reduced_column = embedding_column(vector_column)
+    if with_reduced and reduced_column != vector_column:
+        return f"or=({vector_column}.is.null,{reduced_column}.is.null)"
+    return f"{vector_column}=is.null"
+
+
+async def fetch_pages(table: str):
+    """Yield pages of rows still missing a vector, ordered by key."""
+    key, text_column, _, _ = TARGETS[table]
+    last_key = None
+    while True:
+        filters = f"{missing_filter(table)}&order={key}.asc"
+        if last_key is not None:
+            filters = f"{key}=gt.{last_key}&{filters}"
+        rows = await with_retry(
+            f"select from {table}",
+            lambda: async_supabase_select(table, select=f"{key},{text_column}", filters=filters, limit=PAGE_SIZE),
+        )
+        if not rows:
+            return
+        yield rows
+        last_key = rows[-1][key]
+        if len(rows) < PAGE_SIZE:
+            return
+
+
+async def embed_and_write(table: str, rows: list) -> int:
+    key, text_column, vector_column, with_reduced = TARGETS[table]
+    texts = [row[text_column].strip() for row in rows]
+    vectors = await with_retry(
+        f"embedding batch of {len(texts)}",
+        lambda: async_generate_embeddings_batch(texts, dimensions=FULL_EMBEDDING_DIMENSIONS),
+    )
+
+    # One RPC per column (full, and reduced when EMBEDDING_DIMENSIONS is set)
+    per_column = {}
+    for row, vector in zip(rows, vectors):
+        columns = embedding_columns(vector, base=vector_column) if with_reduced else {vector_column: vector}
+        for column, value in columns.items():
+            per_column.setdefault(column, []).append({"key": str(row[key]), "vector": value})
+
+    for column, updates in per_column.items():
+        await with_retry(
+            f"bulk update of {table}.{column}",
+            lambda: async_supabase_rpc("bulk_set_embeddings", {
+                "target_table": table,
+                "key_column": key,
+                "vector_column": column,
+                "updates": updates,
+            }),
+        )
+    return len(rows)
+
+
+async def backfill_table(table: str, concurrency: int) -> int:
+    _, text_column, vector_column, _ = TARGETS[table]
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+    progress = {"seen": 0, "updated": 0, "failed": 0}
+    started = time.perf_counter()
+
+    async def run_batch(batch):
+        try:
+            progress["updated"] += await embed_and_write(table, batch)
+        except Exception as e:
+            progress["failed"] += len(batch)
+            print(f"❌ {table}: batch of {len(batch)} failed: {e}")
+        finally:
+            semaphore.release()
+        elapsed = time.perf_counter() - started
+        print(f"  {table}: {progress['updated']} updated / {progress['seen']} read "
+              f"({progress['updated'] / max(elapsed, 1e-6):.1f} rows/s)")
+
+    print(f"Backfilling {table}.{vector_column}...")
+    async for page in fetch_pages(table):
+        rows = [row for row in page if (row.get(text_column) or "").strip()]
+        progress["seen"] += len(page)
+        texts = [row[text_column] for row in rows]
+        for batch in plan_embedding_batches(texts, max_inputs=EMBED_BATCH_SIZE):
+            # Backpressure: don't read further ahead than the workers can embed
+            await semaphore.acquire()
+            task = asyncio.create_task(run_batch([rows[i] for i in batch]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    print(f"✅ {table}: updated {progress['updated']} rows, {progress['failed']} failed.")
+    return progress["updated"]
+
+
+async def main_async(tables, concurrency: int):
+    total = 0
+    for table in tables:
+        total += await backfill_table(table, concurrency)
+    print(f"Completed. Updated embeddings for {total} rows.")
 
 
 def main():
-    # Target the real KB table
-    rows = supabase_select("sakhi_bot_knowledge", select="kb_id,title,content,embedding")
-    if not rows or not isinstance(rows, list):
-        print("No rows returned from sakhi_bot_knowledge")
-        return
-
-    updated = 0
-    for row in rows:
-        if row.get("embedding"):
-            continue
-        content = (row.get("content") or "").strip()
-        if not content:
-            continue
-
-        emb = _generate_embedding(content)
-        match = f"kb_id=eq.{row['kb_id']}"
-        supabase_update("sakhi_bot_knowledge", match, {"embedding": emb})
-        updated += 1
-        print(f"Updated embedding for: {row.get('kb_id')} ({row.get('title')})")
-
-    print(f"Completed. Updated embeddings for {updated} rows.")
+    parser = argparse.ArgumentParser(description="Backfill missing embeddings")
+    parser.add_argument("--table", choices=sorted(TARGETS), help="Only this table (default: all)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Embedding batches in flight")
+    args = parser.parse_args()
+
+    tables = [args.table] if args.table else list(TARGETS)
+    asyncio.run(main_async(tables, args.concurrency))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+# benchmark_ann.py
+"""
+Recall@k and latency of the IVF / IVF-PQ index against exact search on
+synthetic clustered vectors.
+
+Usage:
+    python scripts/benchmark_ann.py                      # 10k, 100k, 1M at dim 256
+    python scripts/benchmark_ann.py --sizes 10000 --dim 1536
+    python scripts/benchmark_ann.py --refine float16       # PQ shortlist re-scored from float16
+
+IVF-PQ is reported both alone and with the refine step build_ann_index.py
+ships by default (--refine int8); PQ scores alone rank poorly.
+
+Note: 1M x 1536 float32 is ~6 GB, so the default dimension is 256; recall
+behaviour is driven by n and nlist/nprobe far more than by dim.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.ann_index import IVFIndex, normalize_rows, exact_search, recall_at_k
+
+
+def make_dataset(n: int, dim: int, n_queries: int, seed: int = 0):
+    """Gaussian blobs around random topic centres, like embeddings of a KB."""
+    rng = np.random.default_rng(seed)
+    n_topics = max(10, n // 500)
+    centres = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    data = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        size = min(100_000, n - start)
+        data[start:start + size] = centres[rng.integers(0, n_topics, size)] + 0.6 * rng.standard_normal((size, dim))
+    queries = centres[rng.integers(0, n_topics, n_queries)] + 0.6 * rng.standard_normal((n_queries, dim))
+    return normalize_rows(data), normalize_rows(queries)
+
+
+def bench(n: int, dim: int, k: int, n_queries: int, pq_m: int, nprobes, refine: str):
+    data, queries = make_dataset(n, dim, n_queries)
+
+    t0 = time.perf_counter()
+    exact = [exact_search(data, q, k)[0] for q in queries]
+    exact_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+    nlist = max(16, int(4 * np.sqrt(n)))
+    print(f"\n=== n={n:,} dim={dim} nlist={nlist} (exact: {exact_ms:.2f} ms/query, "
+          f"{data.nbytes / 1e6:.0f} MB) ===")
+
+    configs = [("IVF-Flat", None, None), (f"IVF-PQ{pq_m}", pq_m, None), (f"IVF-PQ{pq_m}+{refine}", pq_m, refine)]
+    for label, m, refine_storage in configs:
+        index = IVFIndex(nlist=nlist, pq_m=m, refine_storage=refine_storage)
+        t0 = time.perf_counter()
+        index.train(data, n_iter=10)
+        index.add(data)
+        build_s = time.perf_counter() - t0
+        payload = sum(a.nbytes for a in (index.codes, index.vectors) if a is not None)
+        print(f"{label}: build {build_s:.1f}s, payload {payload / 1e6:.1f} MB")
+
+        for nprobe in nprobes:
+            if nprobe > nlist:
+                continue
+            t0 = time.perf_counter()
+            approx = [index.search(q, k=k, nprobe=nprobe)[0] for q in queries]
+            ms = (time.perf_counter() - t0) * 1000 / n_queries
+            print(f"  nprobe={nprobe:<4} recall@{k}={recall_at_k(approx, exact, k):.3f}  {ms:.2f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IVF/PQ recall against exact search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--pq-m", type=int, default=32)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--refine", default="int8", choices=["float32", "float16", "int8"],
+                        help="Vector storage for re-scoring the PQ shortlist")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        bench(n, args.dim, args.k, args.queries, args.pq_m, args.nprobe, args.refine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmark_embedding_store.py
+"""
+Memory per worker and accuracy delta of float16 / int8 embedding storage
+against exact float32 search.
+
+Uses the vectors of the local ANN index (scripts/build_ann_index.py) when it
+exists and was built with float32 storage, otherwise synthetic 1536-dim
+vectors.
+
+Usage:
+    python scripts/benchmark_embedding_store.py [--n 20000] [--k 10]
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.embedding_store import compare_with_float32
+
+DIM = 1536  # text-embedding-3-small
+
+
+def load_vectors(n: int):
+    from modules.ann_index import IVFIndex
+    from modules.search_hierarchical import LOCAL_INDEX_PATH
+
+    if os.path.exists(LOCAL_INDEX_PATH):
+        index, _ = IVFIndex.load(LOCAL_INDEX_PATH)
+        if not index.uses_pq and index.storage == "float32":
+            print(f"Using {len(index)} chunk vectors from {LOCAL_INDEX_PATH}")
+            return index.vectors[:n]
+
+    print(f"Using {n} synthetic {DIM}-dim vectors")
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((max(10, n // 200), DIM)).astype(np.float32)
+    return centres[rng.integers(0, len(centres), n)] + 0.6 * rng.standard_normal((n, DIM)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compact embedding storage with float32")
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.n)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)] + 0.3 * rng.standard_normal(
+        (args.queries, vectors.shape[1])
+    ).astype(np.float32)
+
+    print(f"\n{'dtype':<8} {'MB':>8} {'B/vector':>10} {'vs float64':>11} {'recall@' + str(args.k):>10} {'mean err':>10} {'max err':>10}")
+    for dtype in ("float32", "float16", "int8"):
+        r = compare_with_float32(vectors, queries, dtype, k=args.k)
+        ratio = r["bytes"] / r["float64_bytes"] if r["float64_bytes"] else 0.0
+        print(f"{dtype:<8} {r['bytes'] / 1e6:>8.1f} {r['bytes_per_vector']:>10.0f} {ratio:>10.1%} "
+              f"{r['recall_at_k']:>10.3f} {r['mean_abs_score_error']:>10.5f} {r['max_abs_score_error']:>10.5f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# build_ann_index.py
+"""
+Build the local IVF(/PQ) index over sakhi_section_chunks for search_mode="local".
+
+Pulls every chunk embedding from Supabase, trains k-means offline, tunes
+nprobe against exact search on a held-out sample, and writes the .npz file
+loaded by modules/search_hierarchical.py. Re-run after ingesting new content.
+
+Usage:
+    python scripts/build_ann_index.py [--nlist 256] [--pq-m 64] [--refine int8] [--storage int8] [--target-recall 0.95]
+"""
+import os
+import sys
+import json
+import argparse
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supabase_client import supabase_select
+from rag import embedding_column
+from modules.ann_index import IVFIndex, normalize_rows, exact_search, tune_nprobe
+from modules.search_hierarchical import LOCAL_INDEX_PATH
+
+PAGE_SIZE = 1000
+
+
+def fetch_chunk_vectors():
+    """Keyset-paginate sakhi_section_chunks. Returns (chunk_ids, section_ids, vectors)."""
+    # Full or reduced (EMBEDDING_DIMENSIONS) vectors, matching query embeddings
+    column = embedding_column()
+    chunk_ids, section_ids, vectors = [], [], []
+    last_id = 0
+    while True:
+        rows = supabase_select(
+            "sakhi_section_chunks",
+            select=f"id,section_id,{column}",
+            filters=f"id=gt.{last_id}&{column}=not.is.null&order=id.asc",
+            limit=PAGE_SIZE,
+        )
+        if not rows or not isinstance(rows, list):
+            break
+        for row in rows:
+            emb = row[column]
+            # PostgREST returns pgvector columns as a "[0.1,0.2,...]" string
+            vectors.append(json.loads(emb) if isinstance(emb, str) else emb)
+            chunk_ids.append(row["id"])
+            section_ids.append(row["section_id"])
+        last_id = rows[-1]["id"]
+        print(f"Fetched {len(vectors)} chunks...")
+        if len(rows) < PAGE_SIZE:
+            break
+    return (
+        np.asarray(chunk_ids, dtype=np.int64),
+        np.asarray(section_ids, dtype=np.int64),
+        np.asarray(vectors, dtype=np.float32),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local ANN index over section chunks")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (default: ~4*sqrt(n))")
+    parser.add_argument("--pq-m", type=int, default=0, help="PQ sub-spaces (0 = store full vectors)")
+    parser.add_argument("--storage", default="float16", choices=["float32", "float16", "int8"],
+                        help="Vector dtype when PQ is off")
+    parser.add_argument("--refine", default="int8", choices=["none", "float32", "float16", "int8"],
+                        help="With PQ: dtype of the vectors that re-score PQ candidates (none = PQ scores only)")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="recall@k used to pick nprobe")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--out", default=LOCAL_INDEX_PATH)
+    args = parser.parse_args()
+
+    chunk_ids, section_ids, vectors = fetch_chunk_vectors()
+    if not len(vectors):
+        print("No chunk embeddings found.")
+        return
+
+    nlist = args.nlist or max(1, int(4 * np.sqrt(len(vectors))))
+    refine = None if args.refine == "none" else args.refine
+    print(f"Training IVF index: n={len(vectors)}, dim={vectors.shape[1]}, nlist={nlist}, "
+          f"pq_m={args.pq_m or 'off'}, storage={refine if args.pq_m else args.storage}")
+    index = IVFIndex(nlist=nlist, pq_m=args.pq_m or None, storage=args.storage, refine_storage=refine)
+    index.train(vectors)
+    # ids are row positions; extra arrays map rows back to chunk/section ids
+    index.add(vectors)
+
+    # Tune nprobe with held-out chunk vectors as queries
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), min(200, len(vectors)), replace=False)
+    normed = normalize_rows(vectors)
+    queries = normed[sample]
+    exact = [exact_search(normed, q, args.k)[0] for q in queries]
+    nprobe, curve = tune_nprobe(index, queries, exact, k=args.k, target_recall=args.target_recall)
+    for probe, recall in curve.items():
+        print(f"  nprobe={probe:<5} recall@{args.k}={recall:.3f}")
+    print(f"Selected nprobe={nprobe}")
+
+    index.save(args.out, extra={"chunk_ids": chunk_ids, "section_ids": section_ids})
+    print(f"✅ Saved index to {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
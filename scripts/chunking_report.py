@@ -0,0 +1,80 @@
+# chunking_report.py
+"""
+Chunk count and embedding-token cost of the bundled KB documents, before
+and after the token-aware chunker (no API calls, tokenizer only).
+
+    before (json)  : the document's own chunks, as ingest_json.py used to embed them
+    before (split) : section content split on '. ' (> 15 chars), the old
+                     ingest_hierarchical.py chunking
+    after          : chunk_text_by_tokens(content, --chunk-tokens, --chunk-overlap)
+
+Usage:
+    python scripts/chunking_report.py
+    python scripts/chunking_report.py data/emotional_data.json --chunk-tokens 300
+"""
+import os
+import sys
+import glob
+import json
+import argparse
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.text_utils import count_tokens, chunk_text_by_tokens, DEFAULT_CHUNK_TOKENS, DEFAULT_CHUNK_OVERLAP, CHUNK_MODEL
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+PRICE_PER_MILLION_TOKENS = 0.02  # text-embedding-3-small, USD
+
+
+def iter_h3_sections(nodes):
+    for node in nodes:
+        if node.get("level") == "H3":
+            texts = [c.get("text", "").strip() for c in node.get("chunks", [])]
+            yield [t for t in texts if t]
+        else:
+            yield from iter_h3_sections(node.get("children", []))
+
+
+def summarize(chunks):
+    tokens = sum(count_tokens(c, model=CHUNK_MODEL) for c in chunks)
+    return len(chunks), tokens
+
+
+def report(path: str, chunk_tokens: int, chunk_overlap: int):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    sections = list(iter_h3_sections(data.get("document_structure", [])))
+
+    strategies = {"before (json)": [], "before (split)": [], "after": []}
+    for texts in sections:
+        content = "\n".join(texts)
+        strategies["before (json)"].extend(texts)
+        strategies["before (split)"].extend(c.strip() for c in content.split(". ") if len(c) > 15)
+        strategies["after"].extend(chunk_text_by_tokens(content, chunk_tokens, chunk_overlap))
+
+    print(f"\n{os.path.basename(path)}: {len(sections)} sections")
+    print(f"  {'strategy':<16}{'chunks':>8}{'tokens':>10}{'avg tok':>9}{'cost $':>10}")
+    for name, chunks in strategies.items():
+        count, tokens = summarize(chunks)
+        cost = tokens / 1_000_000 * PRICE_PER_MILLION_TOKENS
+        print(f"  {name:<16}{count:>8}{tokens:>10}{tokens / max(count, 1):>9.1f}{cost:>10.5f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunking strategies on KB documents")
+    parser.add_argument("files", nargs="*", help="JSON documents (default: data/*.json with a document_structure)")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(DATA_DIR, "*.json")))
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            if not isinstance(json.load(f), dict):
+                continue
+        report(path, args.chunk_tokens, args.chunk_overlap)
+
+
+if __name__ == "__main__":
+    main()
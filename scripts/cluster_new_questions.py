@@ -0,0 +1,107 @@
+# cluster_new_questions.py
+"""
+Offline clustering of sakhi_new_questions.
+
+1. Stream id/question/created_at with keyset pagination.
+2. Embed questions in batches; vectors are cached on disk
+   (data/new_question_embeddings.npz) so re-runs only embed new questions.
+3. Cluster with cluster_by_similarity (single-linkage at a cosine cut-off).
+4. Replace the summary in sakhi_new_question_clusters and set
+   sakhi_new_questions.cluster_id through the replace_new_question_clusters
+   RPC (sql/setup_new_question_clusters.sql).
+
+Usage:
+    python scripts/cluster_new_questions.py
+    python scripts/cluster_new_questions.py --threshold 0.88 --min-size 2 --dry-run
+"""
+import os
+import sys
+import time
+import argparse
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from supabase_client import supabase_select, supabase_rpc
+from rag import generate_embeddings_batch
+from modules.ingestion_pipeline import plan_embedding_batches
+from modules.question_clustering import (
+    EmbeddingCache,
+    cluster_by_similarity,
+    summarize_clusters,
+    CLUSTER_SIMILARITY_THRESHOLD,
+)
+
+PAGE_SIZE = 1000
+EMBED_BATCH_SIZE = 512
+CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "new_question_embeddings.npz"
+)
+
+
+def fetch_questions() -> list:
+    rows, last_id = [], 0
+    while True:
+        page = supabase_select(
+            "sakhi_new_questions",
+            select="id,question,created_at",
+            filters=f"id=gt.{last_id}&order=id.asc",
+            limit=PAGE_SIZE,
+        )
+        if not page or not isinstance(page, list):
+            break
+        rows.extend(row for row in page if (row.get("question") or "").strip())
+        last_id = page[-1]["id"]
+        if len(page) < PAGE_SIZE:
+            break
+    return rows
+
+
+def embed_missing(cache: EmbeddingCache, questions: list) -> int:
+    missing = cache.missing(questions)
+    for batch in plan_embedding_batches(missing, max_inputs=EMBED_BATCH_SIZE):
+        texts = [missing[i] for i in batch]
+        vectors = generate_embeddings_batch(texts)
+        for text, vector in zip(texts, vectors):
+            cache.put(text, vector)
+        cache.save()
+        print(f"  embedded {len(texts)} questions ({len(cache)} cached)")
+    return len(missing)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster sakhi_new_questions by embedding similarity")
+    parser.add_argument("--threshold", type=float, default=CLUSTER_SIMILARITY_THRESHOLD, help="Cosine similarity cut-off")
+    parser.add_argument("--min-size", type=int, default=1, help="Drop clusters smaller than this from the summary")
+    parser.add_argument("--cache", default=CACHE_PATH, help="Embedding cache (.npz)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the top clusters without writing")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = fetch_questions()
+    print(f"Fetched {len(rows)} questions.")
+    if not rows:
+        return
+
+    cache = EmbeddingCache(args.cache)
+    questions = [row["question"] for row in rows]
+    embedded = embed_missing(cache, questions)
+    vectors = np.stack([cache.get(q) for q in questions])
+
+    labels = cluster_by_similarity(vectors, threshold=args.threshold)
+    clusters, assignments = summarize_clusters(rows, vectors, labels, min_size=args.min_size)
+    print(f"{len(rows)} questions -> {int(labels.max()) + 1} clusters "
+          f"({len(clusters)} with size >= {args.min_size}); embedded {embedded} new")
+    for cluster in clusters[:10]:
+        print(f"  #{cluster['cluster_id']:<4} size={cluster['size']:<4} {cluster['representative_question'][:70]}")
+
+    if args.dry_run:
+        return
+    written = supabase_rpc("replace_new_question_clusters", {"clusters": clusters, "assignments": assignments})
+    print(f"✅ Wrote {written} clusters in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
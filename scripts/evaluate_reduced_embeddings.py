@@ -0,0 +1,94 @@
+# evaluate_reduced_embeddings.py
+"""
+Offline comparison of full (1536) vs Matryoshka-reduced embeddings.
+
+1. Routing: accuracy of ModelGateway on the data/test_cases.json cases that
+   have an expected_route, at full size and at the reduced size.
+2. Retrieval: overlap of the section IDs returned by hierarchical_search_ids
+   (full) and hierarchical_search_ids_<n> (reduced) for every test query.
+
+Requires OpenAI + Supabase credentials and sql/setup_reduced_embeddings.sql
+applied and populated (scripts/reembed_reduced.py).
+
+Usage:
+    python scripts/evaluate_reduced_embeddings.py --dimensions 512
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supabase_client import supabase_rpc
+from rag import generate_embedding, reduce_embedding, FULL_EMBEDDING_DIMENSIONS
+from modules.model_gateway import ModelGateway
+
+TEST_CASES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "test_cases.json")
+
+
+def load_queries():
+    with open(TEST_CASES_PATH, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    routed = [(c["query"], c["expected_route"]) for c in cases if c.get("query") and c.get("expected_route")]
+    queries = []
+    for c in cases:
+        queries.extend([c["query"]] if c.get("query") else c.get("queries", []))
+    return routed, queries
+
+
+async def evaluate_routing(routed, dimensions: int):
+    results = {}
+    for label, dims in (("full", FULL_EMBEDDING_DIMENSIONS), ("reduced", dimensions)):
+        gateway = ModelGateway(dimensions=dims)
+        decisions = [(await gateway.decide_route(q)).value for q, _ in routed]
+        results[label] = decisions
+
+    print(f"\n=== Routing ({len(routed)} labelled cases) ===")
+    for label in ("full", "reduced"):
+        correct = sum(d == expected for d, (_, expected) in zip(results[label], routed))
+        print(f"{label:<8} accuracy: {correct}/{len(routed)}")
+    agree = sum(a == b for a, b in zip(results["full"], results["reduced"]))
+    print(f"agreement full vs reduced: {agree}/{len(routed)}")
+    for (q, expected), full, reduced in zip(routed, results["full"], results["reduced"]):
+        flag = "" if full == reduced else "  <-- differs"
+        print(f"  {q[:45]:<45} expected={expected:<11} full={full:<11} reduced={reduced}{flag}")
+
+
+def evaluate_retrieval(queries, dimensions: int, k: int, threshold: float):
+    print(f"\n=== Retrieval overlap@{k} ({len(queries)} queries) ===")
+    overlaps = []
+    for q in queries:
+        full = generate_embedding(q, dimensions=FULL_EMBEDDING_DIMENSIONS)
+        reduced = reduce_embedding(full, dimensions)
+        params = {"match_threshold": threshold, "match_count": k}
+        full_ids = [h["section_id"] for h in supabase_rpc("hierarchical_search_ids", {**params, "query_embedding": full}) or []]
+        reduced_ids = [
+            h["section_id"]
+            for h in supabase_rpc(f"hierarchical_search_ids_{dimensions}", {**params, "query_embedding": reduced}) or []
+        ]
+        overlap = len(set(full_ids) & set(reduced_ids)) / max(1, len(full_ids)) if full_ids else 1.0
+        overlaps.append(overlap)
+        print(f"  {q[:45]:<45} overlap={overlap:.2f}  full={full_ids} reduced={reduced_ids}")
+
+    print(f"mean overlap@{k}: {sum(overlaps) / max(1, len(overlaps)):.3f}")
+    full_bytes = len(json.dumps(generate_embedding("payload size", dimensions=FULL_EMBEDDING_DIMENSIONS)))
+    print(f"query vector JSON payload: ~{full_bytes} bytes full vs ~{full_bytes * dimensions // FULL_EMBEDDING_DIMENSIONS} reduced")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full vs reduced embedding dimensions")
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    args = parser.parse_args()
+
+    routed, queries = load_queries()
+    asyncio.run(evaluate_routing(routed, args.dimensions))
+    evaluate_retrieval(queries, args.dimensions, args.k, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,8 @@ from typing import List, Dict, Any
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import from existing modules
-from supabase_client import supabase_insert
-from rag import generate_embedding
+from modules.ingestion_pipeline import run_ingestion, DEFAULT_CONCURRENCY
+from modules.text_utils import chunk_text_by_tokens, DEFAULT_CHUNK_TOKENS, DEFAULT_CHUNK_OVERLAP
 
 def parse_hierarchical_text(raw_text: str) -> List[Dict[str, Any]]:
     """
@@ -83,58 +83,24 @@ def parse_hierarchical_text(raw_text: str) -> List[Dict[str, Any]]:
     
     return parsed_data
 
-def ingest_to_supabase(sections: List[Dict[str, Any]]):
+def chunk_section(content: str, chunk_tokens: int = DEFAULT_CHUNK_TOKENS, chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
+    """Split section content into overlapping token windows (sentence-snapped)."""
+    return chunk_text_by_tokens(content, chunk_tokens, chunk_overlap)
+
+def ingest_to_supabase(
+    sections: List[Dict[str, Any]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint_path: str = None,
+    source: str = None,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+):
     print(f"Starting ingestion of {len(sections)} parent sections...")
-    
-    for idx, section in enumerate(sections):
-        # 1. Insert Parent Section
-        parent_data = {
-            "header_path": section['header_path'],
-            "content": section['content'],
-            "token_count": len(section['content'].split())
-        }
-        
-        try:
-            # Using supabase_insert from supabase_client.py
-            # Note: supabase_insert returns the inserted data (list of dicts)
-            response_data = supabase_insert("sakhi_sections", parent_data)
-            
-            if not response_data:
-                print(f"Error inserting section: {section['header_path']}")
-                continue
-                
-            parent_id = response_data[0]['id']
-            
-            # 2. Create Children (Chunks)
-            # Split by period to get sentence-level chunks. 
-            raw_chunks = section['content'].split('. ')
-            
-            # Clean chunks and filter empty ones
-            chunks_to_embed = [c.strip() for c in raw_chunks if len(c) > 15]
-            
-            if not chunks_to_embed:
-                continue
-
-            # Process each chunk
-            for chunk in chunks_to_embed:
-                # Generate embedding using rag.py
-                vector = generate_embedding(chunk)
-                
-                child_data = {
-                    "section_id": parent_id,
-                    "chunk_content": chunk,
-                    "embedding": vector
-                }
-                
-                # Insert child
-                supabase_insert("sakhi_section_chunks", child_data)
-                
-            print(f"[{idx+1}/{len(sections)}] Processed: {section['header_path']}")
-            
-        except Exception as e:
-            print(f"Failed to process section {idx}: {e}")
-            # Optional: sleep to avoid rate limits if needed
-            # time.sleep(0.5)
+    pipeline_sections = [
+        {**section, "chunks": chunk_section(section['content'], chunk_tokens, chunk_overlap)}
+        for section in sections
+    ]
+    return run_ingestion(pipeline_sections, checkpoint_path=checkpoint_path, concurrency=concurrency, source=source)
 
 import sys
 import os
@@ -183,6 +149,11 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description='Ingest Hierarchical Data from Word Document')
     parser.add_argument('file', nargs='?', help='Path to the .docx file')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Parallel work units')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: <file>.ingest_checkpoint.json)')
+    parser.add_argument('--no-resume', action='store_true', help='Ignore an existing checkpoint and start over')
+    parser.add_argument('--chunk-tokens', type=int, default=DEFAULT_CHUNK_TOKENS, help='Target tokens per chunk')
+    parser.add_argument('--chunk-overlap', type=int, default=DEFAULT_CHUNK_OVERLAP, help='Overlap tokens between chunks')
     args = parser.parse_args()
 
     file_path = args.file
@@ -216,8 +187,20 @@ if __name__ == "__main__":
             print("Sample Section 1:", parsed_sections[0]['header_path'])
             confirm = input("Proceed with ingestion to Supabase? (y/n): ")
             if confirm.lower() == 'y':
-                ingest_to_supabase(parsed_sections)
-                print("Ingestion Complete!")
+                checkpoint_path = args.checkpoint or f"{file_path}.ingest_checkpoint.json"
+                if args.no_resume and os.path.exists(checkpoint_path):
+                    os.remove(checkpoint_path)
+                # Incremental: only new/changed sections are embedded, removed ones deleted
+                stats = ingest_to_supabase(
+                    parsed_sections, args.concurrency, checkpoint_path,
+                    source=os.path.basename(file_path),
+                    chunk_tokens=args.chunk_tokens,
+                    chunk_overlap=args.chunk_overlap,
+                )
+                if stats["failed_units"]:
+                    print(f"Ingestion incomplete: {stats['failed_units']} unit(s) failed. Re-run to resume.")
+                else:
+                    print("Ingestion Complete!")
             else:
                 print("Ingestion aborted.")
         else:
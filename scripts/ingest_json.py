@@ -9,17 +9,17 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # --- Import your existing modules ---
 try:
-    from supabase_client import supabase_insert
-    from rag import generate_embedding
+    from modules.ingestion_pipeline import run_ingestion, DEFAULT_CONCURRENCY
+    from modules.text_utils import chunk_text_by_tokens, DEFAULT_CHUNK_TOKENS, DEFAULT_CHUNK_OVERLAP
 except ImportError:
     print("Error: Could not import 'supabase_client' or 'rag'. Ensure these files exist.")
     exit(1)
 
-def process_node(node: Dict[str, Any], path_stack: List[str]):
+def process_node(node: Dict[str, Any], path_stack: List[str], sections: List[Dict[str, Any]], **chunking):
     """
     Recursive function to traverse the JSON tree.
     It identifies H3 nodes as the 'Leaf/Parent' entry for the database
-    and processes their chunks.
+    and collects their chunks into `sections`.
     """
     
     current_level = node.get("level", "")
@@ -29,20 +29,27 @@ def process_node(node: Dict[str, Any], path_stack: List[str]):
     current_path = path_stack + [title]
     
     # Case 1: We are at the H3 level (The "Section")
-    # This is where we act: Insert Parent -> Insert Chunks
     if current_level == "H3":
-        process_h3_section(node, current_path)
+        section = process_h3_section(node, current_path, **chunking)
+        if section:
+            sections.append(section)
         return
 
     # Case 2: We are at H1 or H2 (Container levels)
     # Recurse into children if they exist
     if "children" in node:
         for child in node["children"]:
-            process_node(child, current_path)
+            process_node(child, current_path, sections, **chunking)
 
-def process_h3_section(node: Dict[str, Any], path_stack: List[str]):
+def process_h3_section(
+    node: Dict[str, Any],
+    path_stack: List[str],
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+):
     """
-    Ingests a specific H3 section and its chunks into Supabase.
+    Turns a specific H3 section into a pipeline section dict (or None if empty).
+    The document's own (sentence-sized) chunks are re-packed into token windows.
     """
     # 1. Construct Header Path (e.g., "Inner Battle > Psychology > Why do I feel guilty?")
     header_path = " > ".join(path_stack)
@@ -50,57 +57,27 @@ def process_h3_section(node: Dict[str, Any], path_stack: List[str]):
     chunks = node.get("chunks", [])
     if not chunks:
         print(f"Skipping empty H3 section: {header_path}")
-        return
+        return None
 
-    # 2. Prepare Parent Section Data
-    # We combine all chunk texts to create the 'full content' representation for the parent
+    # 2. We combine all chunk texts to create the 'full content' representation for the parent
     full_content = "\n".join([c.get("text", "") for c in chunks])
-    
-    parent_data = {
+
+    return {
         "header_path": header_path,
         "content": full_content,
-        "token_count": len(full_content.split())
+        "chunks": chunk_text_by_tokens(full_content, chunk_tokens, chunk_overlap),
     }
 
-    try:
-        # A. Insert Parent into 'sakhi_sections'
-        print(f"Inserting Parent: {header_path}")
-        response_data = supabase_insert("sakhi_sections", parent_data)
-        
-        if not response_data:
-            print(f"Error: DB returned no data for section: {header_path}")
-            return
-            
-        parent_id = response_data[0]['id']
-        
-        # B. Process and Insert Chunks
-        for i, chunk_item in enumerate(chunks):
-            chunk_text = chunk_item.get("text", "").strip()
-            
-            if not chunk_text:
-                continue
-
-            # Generate Embedding
-            vector = generate_embedding(chunk_text)
-            
-            child_data = {
-                "section_id": parent_id,
-                "chunk_content": chunk_text,
-                "embedding": vector,
-                # Optional: You can store source_id if your DB schema allows metadata
-                # "metadata": {"source_id": chunk_item.get("source_id")} 
-            }
-            
-            # Insert into 'sakhi_section_chunks'
-            supabase_insert("sakhi_section_chunks", child_data)
-            print(f"  -> Ingested Chunk {i+1}/{len(chunks)}")
-
-    except Exception as e:
-        print(f"Failed to process section '{header_path}': {e}")
-
-def ingest_json_file(file_path: str):
+def ingest_json_file(
+    file_path: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint_path: str = None,
+    resume: bool = True,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+):
     """
-    Main entry point to read JSON and start traversal.
+    Main entry point to read JSON, collect sections and run the ingestion pipeline.
     """
     print(f"Reading JSON file: {file_path}")
     
@@ -111,10 +88,25 @@ def ingest_json_file(file_path: str):
         root_nodes = data.get("document_structure", [])
         print(f"Found {len(root_nodes)} root (H1) nodes.")
         
+        sections: List[Dict[str, Any]] = []
         for node in root_nodes:
-            process_node(node, [])
-            
-        print("\n--- Ingestion Complete ---")
+            process_node(node, [], sections, chunk_tokens=chunk_tokens, chunk_overlap=chunk_overlap)
+
+        checkpoint_path = checkpoint_path or f"{file_path}.ingest_checkpoint.json"
+        if not resume and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        # Incremental: only new/changed sections are embedded, removed ones deleted
+        stats = run_ingestion(
+            sections,
+            checkpoint_path=checkpoint_path,
+            concurrency=concurrency,
+            source=os.path.basename(file_path),
+        )
+        if stats["failed_units"]:
+            print(f"\n--- Ingestion incomplete: {stats['failed_units']} unit(s) failed. Re-run to resume. ---")
+        else:
+            print("\n--- Ingestion Complete ---")
         
     except FileNotFoundError:
         print("Error: File not found.")
@@ -130,6 +122,11 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='Ingest Hierarchical JSON into Supabase')
     parser.add_argument('file', nargs='?', help='Path to the .json file')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Parallel work units')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: <file>.ingest_checkpoint.json)')
+    parser.add_argument('--no-resume', action='store_true', help='Ignore an existing checkpoint and start over')
+    parser.add_argument('--chunk-tokens', type=int, default=DEFAULT_CHUNK_TOKENS, help='Target tokens per chunk')
+    parser.add_argument('--chunk-overlap', type=int, default=DEFAULT_CHUNK_OVERLAP, help='Overlap tokens between chunks')
     args = parser.parse_args()
 
     file_path = args.file
@@ -144,4 +141,7 @@ if __name__ == "__main__":
             print("Usage: python ingest_json.py <path_to_json_file>")
             exit(1)
 
-    ingest_json_file(file_path)
\ No newline at end of file
+    ingest_json_file(
+        file_path, args.concurrency, args.checkpoint, resume=not args.no_resume,
+        chunk_tokens=args.chunk_tokens, chunk_overlap=args.chunk_overlap,
+    )
\ No newline at end of file
@@ -6,7 +6,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from supabase_client import supabase_select, supabase_update
-from rag import generate_embedding
+from rag import generate_embedding, FULL_EMBEDDING_DIMENSIONS
 
 # Step 1: Fetch all rows
 rows = supabase_select("sakhi_bot_knowledge", "*")
@@ -32,7 +32,7 @@ for row in rows_to_update:
 
     print(f"Generating embedding for KB ID: {kb_id}")
 
-    emb = generate_embedding(content)
+    emb = generate_embedding(content, dimensions=FULL_EMBEDDING_DIMENSIONS)
 
     match = f"kb_id=eq.{kb_id}"
     data = {"embedding": emb}
@@ -0,0 +1,84 @@
+# reembed_reduced.py
+"""
+Fill the reduced-dimension vector columns added by sql/setup_reduced_embeddings.sql.
+
+text-embedding-3 vectors are Matryoshka-trained: the first n components,
+re-normalised, are what the API returns for `dimensions=n`. So the reduced
+columns are derived from the stored full vectors without new OpenAI calls.
+
+Usage:
+    python scripts/reembed_reduced.py --dimensions 512
+    python scripts/reembed_reduced.py --dimensions 512 --table sakhi_faq
+"""
+import os
+import sys
+import json
+import argparse
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supabase_client import supabase_select, supabase_update, RETURN_MINIMAL
+from rag import reduce_embedding, embedding_column
+
+PAGE_SIZE = 500
+
+# table -> full-size vector column
+TARGETS = {
+    "sakhi_section_chunks": "embedding",
+    "sakhi_sections": "embedding",
+    "sakhi_faq": "question_vector",
+}
+
+
+def reembed_table(table: str, source_column: str, dimensions: int) -> int:
+    target_column = embedding_column(source_column, dimensions)
+    updated = 0
+    last_id = 0
+    while True:
+        rows = supabase_select(
+            table,
+            select=f"id,{source_column}",
+            filters=(
+                f"id=gt.{last_id}&{source_column}=not.is.null"
+                f"&{target_column}=is.null&order=id.asc"
+            ),
+            limit=PAGE_SIZE,
+        )
+        if not rows or not isinstance(rows, list):
+            break
+
+        for row in rows:
+            vector = row[source_column]
+            # PostgREST returns pgvector columns as a "[0.1,0.2,...]" string
+            if isinstance(vector, str):
+                vector = json.loads(vector)
+            supabase_update(
+                table, f"id=eq.{row['id']}", {target_column: reduce_embedding(vector, dimensions)},
+                returning=RETURN_MINIMAL,
+            )
+            updated += 1
+
+        last_id = rows[-1]["id"]
+        print(f"  {table}: {updated} rows -> {target_column}")
+        if len(rows) < PAGE_SIZE:
+            break
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Populate reduced-dimension embedding columns")
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--table", choices=sorted(TARGETS), help="Only this table (default: all)")
+    args = parser.parse_args()
+
+    tables = [args.table] if args.table else list(TARGETS)
+    total = 0
+    for table in tables:
+        print(f"Re-embedding {table}.{TARGETS[table]} at {args.dimensions} dims...")
+        total += reembed_table(table, TARGETS[table], args.dimensions)
+    print(f"✅ Completed. Wrote {total} reduced vectors.")
+
+
+if __name__ == "__main__":
+    main()
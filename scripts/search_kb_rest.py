@@ -6,13 +6,13 @@ import requests
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from rag import generate_embedding
+from rag import generate_embedding, FULL_EMBEDDING_DIMENSIONS
 from supabase_client import SUPABASE_URL, SUPABASE_SERVICE_ROLE, HEADERS
 import json
 
 def search_sakhi_knowledge(query: str, top_k: int = 5):
     # 1. Generate embedding for user query
-    query_embedding = generate_embedding(query)
+    query_embedding = generate_embedding(query, dimensions=FULL_EMBEDDING_DIMENSIONS)
 
     # 2. Send REST RPC call using pgvector cosine operator
     url = f"{SUPABASE_URL}/rest/v1/rpc/match_sakhi_kb"
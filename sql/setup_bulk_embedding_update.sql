@@ -0,0 +1,44 @@
+-- setup_bulk_embedding_update.sql
+-- Write many embeddings in one round-trip (scripts/backfill_embeddings.py).
+-- `updates` is a JSON array of {"key": <primary key>, "vector": [..floats..]}.
+-- Table and column names are quoted with %I; the key is cast to the key
+-- column's own type so the primary-key index is used.
+-- Only the service role should be able to call this.
+
+create or replace function bulk_set_embeddings (
+  target_table text,
+  key_column text,
+  vector_column text,
+  updates jsonb
+)
+returns int
+language plpgsql
+as $$
+declare
+  key_type text;
+  updated int;
+begin
+  select format_type(a.atttypid, a.atttypmod) into key_type
+  from pg_attribute a
+  where a.attrelid = target_table::regclass
+    and a.attname = key_column
+    and not a.attisdropped;
+
+  if key_type is null then
+    raise exception 'Unknown column %.%', target_table, key_column;
+  end if;
+
+  execute format(
+    'update %1$I as t set %3$I = (u.vector)::text::vector
+     from jsonb_to_recordset($1) as u(key text, vector jsonb)
+     where t.%2$I = u.key::%4$s',
+    target_table, key_column, vector_column, key_type
+  )
+  using updates;
+
+  get diagnostics updated = row_count;
+  return updated;
+end;
+$$;
+
+revoke execute on function bulk_set_embeddings(text, text, text, jsonb) from public, anon, authenticated;
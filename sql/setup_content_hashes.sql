@@ -0,0 +1,26 @@
+-- setup_content_hashes.sql
+-- Content hashes for incremental ingestion (modules/ingestion_pipeline.py).
+-- Re-running an ingestion script on an edited document then only embeds new
+-- or changed chunks, updates changed sections in place and deletes sections
+-- that were removed from the document.
+-- Requires setup_hierarchical_rag.sql.
+
+-- 1. Columns
+--    source       : document the section came from (e.g. emotional_data.json)
+--    content_hash : sha256 hex of the section content + its chunk list
+alter table sakhi_sections add column if not exists source text;
+alter table sakhi_sections add column if not exists content_hash text;
+--    content_hash : sha256 hex of chunk_content (same as hashlib.sha256 in Python)
+alter table sakhi_section_chunks add column if not exists content_hash text;
+
+create index if not exists idx_sakhi_sections_source_header_path
+  on sakhi_sections (source, header_path);
+create index if not exists idx_sakhi_section_chunks_section_hash
+  on sakhi_section_chunks (section_id, content_hash);
+
+-- 2. Backfill chunk hashes so existing chunks are reused instead of re-embedded.
+--    Section hashes stay null: the first incremental run diffs those sections
+--    chunk by chunk, adopts rows with a null source and fills both columns.
+update sakhi_section_chunks
+set content_hash = encode(sha256(convert_to(chunk_content, 'UTF8')), 'hex')
+where content_hash is null and chunk_content is not null;
@@ -0,0 +1,8 @@
+-- setup_conversation_index.sql
+-- Index for "latest N turns of a user" (modules/conversation.py):
+--   select ... from sakhi_conversations
+--   where user_id = $1 order by created_at desc limit N
+-- Turns the per-turn history read into a short index range scan.
+
+create index if not exists idx_sakhi_conversations_user_created
+  on sakhi_conversations (user_id, created_at desc);
@@ -0,0 +1,34 @@
+-- setup_kb_version.sql
+-- Single-row version stamp for the knowledge base.
+-- Ingestion scripts bump it after writing new sections so every API worker
+-- can drop its cached retrieval results without a restart.
+
+create table if not exists sakhi_kb_meta (
+  id int primary key default 1,
+  version bigint not null default 0,
+  updated_at timestamptz not null default now(),
+  constraint sakhi_kb_meta_single_row check (id = 1)
+);
+
+insert into sakhi_kb_meta (id, version) values (1, 0)
+on conflict (id) do nothing;
+
+-- Read the current version (cheap, called periodically by each worker)
+create or replace function get_kb_version()
+returns bigint
+language sql
+stable
+as $$
+  select version from sakhi_kb_meta where id = 1;
+$$;
+
+-- Increment the version (called by ingestion scripts after a write)
+create or replace function bump_kb_version()
+returns bigint
+language sql
+as $$
+  update sakhi_kb_meta
+  set version = version + 1, updated_at = now()
+  where id = 1
+  returning version;
+$$;
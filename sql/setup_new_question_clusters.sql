@@ -0,0 +1,64 @@
+-- setup_new_question_clusters.sql
+-- Cluster summary for sakhi_new_questions (scripts/cluster_new_questions.py).
+-- Each run replaces the summary wholesale: one row per cluster with its size,
+-- a representative question and a few samples, plus cluster_id on every
+-- clustered question. Requires setup_rewards.sql.
+
+-- 1. Summary table
+create table if not exists sakhi_new_question_clusters (
+  cluster_id int primary key,
+  size int not null,
+  representative_id int,
+  representative_question text not null,
+  sample_questions jsonb not null default '[]'::jsonb,
+  first_seen timestamptz,
+  last_seen timestamptz,
+  updated_at timestamptz not null default now()
+);
+
+create index if not exists idx_new_question_clusters_size
+  on sakhi_new_question_clusters (size desc);
+
+-- 2. Per-question assignment
+alter table sakhi_new_questions add column if not exists cluster_id int;
+create index if not exists idx_new_questions_cluster_id on sakhi_new_questions (cluster_id);
+
+-- 3. Atomic replace: clusters = [{cluster_id, size, representative_id,
+--    representative_question, sample_questions, first_seen, last_seen}, ...]
+--    assignments = [{id, cluster_id}, ...]
+create or replace function replace_new_question_clusters (
+  clusters jsonb,
+  assignments jsonb
+)
+returns int
+language plpgsql
+as $$
+declare
+  v_count int;
+begin
+  delete from sakhi_new_question_clusters where true;
+  -- Questions not in this run's assignments must not point at a dropped cluster
+  update sakhi_new_questions set cluster_id = null where cluster_id is not null;
+
+  insert into sakhi_new_question_clusters (
+    cluster_id, size, representative_id, representative_question,
+    sample_questions, first_seen, last_seen, updated_at
+  )
+  select c.cluster_id, c.size, c.representative_id, c.representative_question,
+         coalesce(c.sample_questions, '[]'::jsonb), c.first_seen, c.last_seen, now()
+  from jsonb_to_recordset(clusters) as c(
+    cluster_id int, size int, representative_id int, representative_question text,
+    sample_questions jsonb, first_seen timestamptz, last_seen timestamptz
+  );
+  get diagnostics v_count = row_count;
+
+  update sakhi_new_questions q
+  set cluster_id = a.cluster_id
+  from jsonb_to_recordset(assignments) as a(id int, cluster_id int)
+  where q.id = a.id;
+
+  return v_count;
+end;
+$$;
+
+revoke execute on function replace_new_question_clusters(jsonb, jsonb) from public, anon, authenticated;
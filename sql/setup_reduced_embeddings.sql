@@ -0,0 +1,144 @@
+-- setup_reduced_embeddings.sql
+-- Parallel 512-dimension (Matryoshka-reduced) vectors for text-embedding-3-small.
+-- Used when the API runs with EMBEDDING_DIMENSIONS=512: query embeddings are
+-- requested at 512 dims and the *_512 RPCs below search the reduced columns.
+-- The full vector(1536) columns are untouched, so both modes keep working.
+--
+-- Fill the new columns with: python scripts/reembed_reduced.py --dimensions 512
+-- For another size (e.g. 256) copy this file replacing every 512, and add
+-- the size to REDUCED_EMBEDDING_DIMENSIONS in rag.py (the API refuses to
+-- start with a size that is not listed there).
+-- Requires setup_hierarchical_rag.sql and setup_section_embeddings.sql.
+
+-- 1. Reduced columns + HNSW indexes
+alter table sakhi_section_chunks add column if not exists embedding_512 vector(512);
+alter table sakhi_sections add column if not exists embedding_512 vector(512);
+alter table sakhi_faq add column if not exists question_vector_512 vector(512);
+
+create index if not exists idx_sakhi_section_chunks_embedding_512
+  on sakhi_section_chunks using hnsw (embedding_512 vector_cosine_ops);
+create index if not exists idx_sakhi_sections_embedding_512
+  on sakhi_sections using hnsw (embedding_512 vector_cosine_ops);
+create index if not exists idx_sakhi_faq_question_vector_512
+  on sakhi_faq using hnsw (question_vector_512 vector_cosine_ops);
+
+-- 2. Reduced search RPCs (same contracts as the full-size versions)
+create or replace function hierarchical_search_ids_512 (
+  query_embedding vector(512),
+  match_threshold float,
+  match_count int
+)
+returns table (
+  section_id bigint,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  return query
+  select best.section_id, best.similarity
+  from (
+    select distinct on (sakhi_section_chunks.section_id)
+      sakhi_section_chunks.section_id,
+      1 - (sakhi_section_chunks.embedding_512 <=> query_embedding) as similarity
+    from sakhi_section_chunks
+    where 1 - (sakhi_section_chunks.embedding_512 <=> query_embedding) > match_threshold
+    order by sakhi_section_chunks.section_id, similarity desc
+  ) as best
+  order by best.similarity desc
+  limit match_count;
+end;
+$$;
+
+-- Fallback used when hierarchical_search_ids_512 is unavailable
+create or replace function hierarchical_search_512 (
+  query_embedding vector(512),
+  match_threshold float,
+  match_count int
+)
+returns table (
+  section_content text,
+  header_path text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  return query
+  select distinct on (sakhi_sections.id)
+    sakhi_sections.content,
+    sakhi_sections.header_path,
+    1 - (sakhi_section_chunks.embedding_512 <=> query_embedding) as similarity
+  from sakhi_section_chunks
+  join sakhi_sections on sakhi_sections.id = sakhi_section_chunks.section_id
+  where 1 - (sakhi_section_chunks.embedding_512 <=> query_embedding) > match_threshold
+  order by sakhi_sections.id, similarity desc
+  limit match_count;
+end;
+$$;
+
+create or replace function coarse_to_fine_search_ids_512 (
+  query_embedding vector(512),
+  section_count int,
+  match_threshold float,
+  match_count int
+)
+returns table (
+  section_id bigint,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  return query
+  with candidate_sections as (
+    select sakhi_sections.id
+    from sakhi_sections
+    where sakhi_sections.embedding_512 is not null
+    order by sakhi_sections.embedding_512 <=> query_embedding
+    limit section_count
+  )
+  select best.section_id, best.similarity
+  from (
+    select distinct on (sakhi_section_chunks.section_id)
+      sakhi_section_chunks.section_id,
+      1 - (sakhi_section_chunks.embedding_512 <=> query_embedding) as similarity
+    from sakhi_section_chunks
+    join candidate_sections on candidate_sections.id = sakhi_section_chunks.section_id
+    where 1 - (sakhi_section_chunks.embedding_512 <=> query_embedding) > match_threshold
+    order by sakhi_section_chunks.section_id, similarity desc
+  ) as best
+  order by best.similarity desc
+  limit match_count;
+end;
+$$;
+
+create or replace function match_faq_512 (
+  query_embedding vector(512),
+  match_count int
+)
+returns table (
+  id int,
+  question text,
+  answer text,
+  youtube_link text,
+  infographic_url text,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  return query
+  select
+    sakhi_faq.id,
+    sakhi_faq.question,
+    sakhi_faq.answer,
+    sakhi_faq.youtube_link,
+    sakhi_faq.infographic_url,
+    1 - (sakhi_faq.question_vector_512 <=> query_embedding) as similarity
+  from sakhi_faq
+  where 1 - (sakhi_faq.question_vector_512 <=> query_embedding) > 0.5 -- Threshold
+  order by similarity desc
+  limit match_count;
+end;
+$$;
@@ -0,0 +1,58 @@
+-- setup_rewards_increment.sql
+-- Atomic reward increments (modules/user_rewards.py).
+-- Replaces the read-then-write of sakhi_users.rewards, which lost points
+-- when two messages of the same user were rewarded concurrently.
+-- Requires setup_rewards.sql.
+
+-- Single user: returns the new total (null if the user does not exist)
+create or replace function increment_rewards (
+  p_user_id text,
+  p_delta int
+)
+returns int
+language plpgsql
+as $$
+declare
+  v_user sakhi_users.user_id%type := p_user_id;  -- cast to the column type
+  v_total int;
+begin
+  update sakhi_users
+  set rewards = coalesce(rewards, 0) + p_delta
+  where user_id = v_user
+  returning rewards into v_total;
+  return v_total;
+end;
+$$;
+
+-- Many users in one round-trip.
+-- deltas: [{"user_id": "...", "delta": 3}, ...]; returns {"<user_id>": new_total, ...}
+create or replace function increment_rewards_bulk (
+  deltas jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  r record;
+  v_user sakhi_users.user_id%type;
+  v_total int;
+  totals jsonb := '{}'::jsonb;
+begin
+  for r in
+    select x.user_id, sum(x.delta)::int as delta
+    from jsonb_to_recordset(deltas) as x(user_id text, delta int)
+    group by x.user_id
+    order by x.user_id  -- fixed lock order across concurrent flushes
+  loop
+    v_user := r.user_id;
+    update sakhi_users
+    set rewards = coalesce(rewards, 0) + r.delta
+    where user_id = v_user
+    returning rewards into v_total;
+    if v_total is not null then
+      totals := totals || jsonb_build_object(r.user_id, v_total);
+    end if;
+  end loop;
+  return totals;
+end;
+$$;
@@ -0,0 +1,64 @@
+-- setup_section_embeddings.sql
+-- Section-level vectors for two-stage (coarse-to-fine) retrieval.
+-- Stage 1 picks the top sections by sakhi_sections.embedding (mean of the
+-- section's chunk vectors); stage 2 ranks only those sections' chunks.
+-- Requires setup_hierarchical_rag.sql.
+
+-- 1. Section vector column + ANN index
+alter table sakhi_sections add column if not exists embedding vector(1536);
+
+create index if not exists idx_sakhi_sections_embedding
+  on sakhi_sections using hnsw (embedding vector_cosine_ops);
+
+-- Stage 2 filters chunks by section_id
+create index if not exists idx_sakhi_section_chunks_section_id
+  on sakhi_section_chunks (section_id);
+
+-- 2. Backfill existing sections with the mean of their chunk vectors
+update sakhi_sections
+set embedding = child.mean_embedding
+from (
+  select section_id, avg(embedding) as mean_embedding
+  from sakhi_section_chunks
+  where embedding is not null
+  group by section_id
+) as child
+where sakhi_sections.id = child.section_id
+  and sakhi_sections.embedding is null;
+
+-- 3. Two-stage search returning IDs and scores only
+create or replace function coarse_to_fine_search_ids (
+  query_embedding vector(1536),
+  section_count int,
+  match_threshold float,
+  match_count int
+)
+returns table (
+  section_id bigint,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  return query
+  with candidate_sections as (
+    select sakhi_sections.id
+    from sakhi_sections
+    where sakhi_sections.embedding is not null
+    order by sakhi_sections.embedding <=> query_embedding
+    limit section_count
+  )
+  select best.section_id, best.similarity
+  from (
+    select distinct on (sakhi_section_chunks.section_id)
+      sakhi_section_chunks.section_id,
+      1 - (sakhi_section_chunks.embedding <=> query_embedding) as similarity
+    from sakhi_section_chunks
+    join candidate_sections on candidate_sections.id = sakhi_section_chunks.section_id
+    where 1 - (sakhi_section_chunks.embedding <=> query_embedding) > match_threshold
+    order by sakhi_section_chunks.section_id, similarity desc
+  ) as best
+  order by best.similarity desc
+  limit match_count;
+end;
+$$;
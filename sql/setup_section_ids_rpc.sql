@@ -0,0 +1,33 @@
+-- setup_section_ids_rpc.sql
+-- ID-only variant of hierarchical_search.
+-- Returns just (section_id, similarity) per hit; the API workers keep
+-- sakhi_sections content in memory (modules/section_store.py), so the full
+-- section text no longer travels over the wire on every query.
+-- Requires setup_hierarchical_rag.sql and setup_kb_version.sql.
+
+create or replace function hierarchical_search_ids (
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int
+)
+returns table (
+  section_id bigint,
+  similarity float
+)
+language plpgsql
+as $$
+begin
+  return query
+  select best.section_id, best.similarity
+  from (
+    select distinct on (sakhi_section_chunks.section_id)
+      sakhi_section_chunks.section_id,
+      1 - (sakhi_section_chunks.embedding <=> query_embedding) as similarity
+    from sakhi_section_chunks
+    where 1 - (sakhi_section_chunks.embedding <=> query_embedding) > match_threshold
+    order by sakhi_section_chunks.section_id, similarity desc
+  ) as best
+  order by best.similarity desc
+  limit match_count;
+end;
+$$;
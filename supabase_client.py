@@ -2,12 +2,14 @@
 
 import os
 import uuid
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import requests
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from modules.metrics import observe_upstream
+
 # Ensure .env is loaded exactly once from this module
 _ENV_LOADED = False
 
@@ -37,13 +39,81 @@ HEADERS = {
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
+# Prefer: return=<mode> for writes
+#   representation : written rows in the body (optionally only `columns`)
+#   minimal        : empty body, returns None
+#   headers-only   : empty body, returns the Location header of the new row
+RETURN_REPRESENTATION = "representation"
+RETURN_MINIMAL = "minimal"
+RETURN_HEADERS_ONLY = "headers-only"
+RETURN_MODES = (RETURN_REPRESENTATION, RETURN_MINIMAL, RETURN_HEADERS_ONLY)
+
+
+class SupabaseHTTPError(Exception):
+    """
+    PostgREST answered with an error status. Each request runs in its own
+    transaction, so nothing from the failed request was written.
+    """
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _write_headers(returning: str) -> Dict[str, str]:
+    if returning not in RETURN_MODES:
+        raise ValueError(f"returning must be one of {RETURN_MODES}, got {returning!r}")
+    return {**HEADERS, "Prefer": f"return={returning}"}
 
-def supabase_insert(table: str, data: Dict[str, Any]):
+
+def _write_url(table: str, query: str, returning: str, columns: Optional[str]) -> str:
+    params = [query] if query else []
+    if columns and returning == RETURN_REPRESENTATION:
+        params.append(f"select={columns}")
     url = f"{SUPABASE_URL}/rest/v1/{table}"
-    resp = requests.post(url, headers=HEADERS, json=data)
-    if resp.status_code >= 300:
-        raise Exception(f"Supabase insert failed: {resp.status_code} - {resp.text}")
-    return resp.json()
+    return f"{url}?{'&'.join(params)}" if params else url
+
+
+def _write_result(resp, returning: str):
+    if returning == RETURN_MINIMAL:
+        return None
+    if returning == RETURN_HEADERS_ONLY:
+        return resp.headers.get("Location")
+    return resp.json() if resp.content else []
+
+
+def supabase_insert(
+    table: str,
+    data: Dict[str, Any],
+    returning: str = RETURN_REPRESENTATION,
+    columns: Optional[str] = None,
+):
+    url = _write_url(table, "", returning, columns)
+    with observe_upstream("supabase", table):
+        resp = requests.post(url, headers=_write_headers(returning), json=data)
+        if resp.status_code >= 300:
+            raise SupabaseHTTPError(f"Supabase insert failed: {resp.status_code} - {resp.text}", resp.status_code)
+    return _write_result(resp, returning)
+
+
+def supabase_insert_many(
+    table: str,
+    rows: List[Dict[str, Any]],
+    returning: str = RETURN_REPRESENTATION,
+    columns: Optional[str] = None,
+):
+    """
+    Bulk insert: one POST with a JSON array. PostgREST returns the inserted
+    rows in the same order as `rows`.
+    """
+    if not rows:
+        return [] if returning == RETURN_REPRESENTATION else None
+    url = _write_url(table, "", returning, columns)
+    with observe_upstream("supabase", table):
+        resp = requests.post(url, headers=_write_headers(returning), json=rows)
+        if resp.status_code >= 300:
+            raise SupabaseHTTPError(f"Supabase bulk insert failed: {resp.status_code} - {resp.text}", resp.status_code)
+    return _write_result(resp, returning)
 
 
 def supabase_select(
@@ -57,31 +127,56 @@ def supabase_select(
     """
     Fetch rows from a table or call an RPC when rpc is provided.
     """
-    if rpc:
-        url = f"{SUPABASE_URL}/rest/v1/rpc/{rpc}"
-        resp = requests.post(url, headers=HEADERS, json=payload or {})
-    else:
-        base_query = f"{SUPABASE_URL}/rest/v1/{table}?select={select}"
-        if filters:
-            base_query = f"{base_query}&{filters}"
-        if limit:
-            base_query = f"{base_query}&limit={limit}"
-        resp = requests.get(base_query, headers=HEADERS)
-
-    if resp.status_code >= 300:
-        raise Exception(f"Supabase select failed: {resp.status_code} - {resp.text}")
+    with observe_upstream("supabase", f"rpc/{rpc}" if rpc else table):
+        if rpc:
+            url = f"{SUPABASE_URL}/rest/v1/rpc/{rpc}"
+            resp = requests.post(url, headers=HEADERS, json=payload or {})
+        else:
+            base_query = f"{SUPABASE_URL}/rest/v1/{table}?select={select}"
+            if filters:
+                base_query = f"{base_query}&{filters}"
+            if limit:
+                base_query = f"{base_query}&limit={limit}"
+            resp = requests.get(base_query, headers=HEADERS)
+
+        if resp.status_code >= 300:
+            raise SupabaseHTTPError(f"Supabase select failed: {resp.status_code} - {resp.text}", resp.status_code)
     return resp.json()
 
 
-def supabase_update(table: str, match: str, data: Dict[str, Any]):
+def supabase_update(
+    table: str,
+    match: str,
+    data: Dict[str, Any],
+    returning: str = RETURN_REPRESENTATION,
+    columns: Optional[str] = None,
+):
     """
     match example: \"user_id=eq.<id>\"
     """
-    url = f"{SUPABASE_URL}/rest/v1/{table}?{match}"
-    resp = requests.patch(url, headers=HEADERS, json=data)
-    if resp.status_code >= 300:
-        raise Exception(f"Supabase update failed: {resp.status_code} - {resp.text}")
-    return resp.json()
+    url = _write_url(table, match, returning, columns)
+    with observe_upstream("supabase", table):
+        resp = requests.patch(url, headers=_write_headers(returning), json=data)
+        if resp.status_code >= 300:
+            raise SupabaseHTTPError(f"Supabase update failed: {resp.status_code} - {resp.text}", resp.status_code)
+    return _write_result(resp, returning)
+
+
+def supabase_delete(
+    table: str,
+    match: str,
+    returning: str = RETURN_REPRESENTATION,
+    columns: Optional[str] = None,
+):
+    """
+    match example: \"id=in.(1,2,3)\"
+    """
+    url = _write_url(table, match, returning, columns)
+    with observe_upstream("supabase", table):
+        resp = requests.delete(url, headers=_write_headers(returning))
+        if resp.status_code >= 300:
+            raise SupabaseHTTPError(f"Supabase delete failed: {resp.status_code} - {resp.text}", resp.status_code)
+    return _write_result(resp, returning)
 
 
 def generate_user_id() -> str:
@@ -92,11 +187,12 @@ def supabase_rpc(function_name: str, params: Dict[str, Any]):
     """
     Call a Postgres function via Supabase RPC.
     """
-    res = supabase.rpc(function_name, params=params).execute()
+    with observe_upstream("supabase", f"rpc/{function_name}"):
+        res = supabase.rpc(function_name, params=params).execute()
 
-    # supabase-py returns data and possibly error on the response object
-    if hasattr(res, "error") and res.error:
-        raise Exception(f"Supabase RPC error: {res.error}")
+        # supabase-py returns data and possibly error on the response object
+        if hasattr(res, "error") and res.error:
+            raise Exception(f"Supabase RPC error: {res.error}")
 
     if hasattr(res, "data"):
         return res.data
@@ -112,11 +208,29 @@ async def async_supabase_rpc(function_name: str, params: Dict[str, Any]):
     return await asyncio.to_thread(supabase_rpc, function_name, params)
 
 
-async def async_supabase_insert(table: str, data: Dict[str, Any]):
+async def async_supabase_insert(table: str, data: Dict[str, Any], **kwargs):
     """
     Async wrapper for supabase_insert.
     """
-    return await asyncio.to_thread(supabase_insert, table, data)
+    return await asyncio.to_thread(supabase_insert, table, data, **kwargs)
+
+async def async_supabase_insert_many(table: str, rows: List[Dict[str, Any]], **kwargs):
+    """
+    Async wrapper for supabase_insert_many.
+    """
+    return await asyncio.to_thread(supabase_insert_many, table, rows, **kwargs)
+
+async def async_supabase_update(table: str, match: str, data: Dict[str, Any], **kwargs):
+    """
+    Async wrapper for supabase_update.
+    """
+    return await asyncio.to_thread(supabase_update, table, match, data, **kwargs)
+
+async def async_supabase_delete(table: str, match: str, **kwargs):
+    """
+    Async wrapper for supabase_delete.
+    """
+    return await asyncio.to_thread(supabase_delete, table, match, **kwargs)
 
 async def async_supabase_select(
     table: str,
@@ -0,0 +1,115 @@
+# test_admission.py
+"""
+Tests for the adaptive admission controller (modules/admission.py).
+"""
+import os
+import sys
+import asyncio
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.admission import AdmissionController, busy_reply, BUSY_REPLY
+
+
+def test_admits_up_to_limit_then_queues_and_hands_over():
+    async def scenario():
+        ctl = AdmissionController(initial_limit=2, min_limit=1, max_queue=4, queue_timeout=1.0)
+        assert await ctl.acquire() and await ctl.acquire()
+        assert ctl.in_flight == 2
+
+        waiter = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        assert ctl.queued == 1 and not waiter.done()
+
+        ctl.release(0.1)
+        assert await waiter is True
+        assert ctl.in_flight == 2 and ctl.queued == 0
+        return ctl.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["admitted"] == 3 and stats["queued"] == 1
+    print("✅ Admits up to limit, then queues and hands over: PASS")
+
+
+def test_sheds_on_full_queue_and_deadline():
+    async def scenario():
+        ctl = AdmissionController(initial_limit=1, min_limit=1, max_queue=1, queue_timeout=0.05)
+        assert await ctl.acquire()
+        queued = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        # Queue is full: rejected immediately
+        assert await ctl.acquire() is False
+        # Queued turn hits its deadline
+        assert await queued is False
+        assert ctl.queued == 0 and ctl.in_flight == 1
+        return ctl.counters
+
+    counters = asyncio.run(scenario())
+    assert counters["rejected"] == 1 and counters["timed_out"] == 1
+    print("✅ Sheds on full queue and deadline: PASS")
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        ctl = AdmissionController(initial_limit=1, min_limit=1, max_queue=2, queue_timeout=5)
+        assert await ctl.acquire()
+        waiter = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        assert ctl.queued == 0
+        ctl.release(0.1)
+        assert ctl.in_flight == 0
+        # The freed slot is still usable
+        assert await ctl.acquire()
+
+    asyncio.run(scenario())
+    print("✅ Cancelled waiter leaves the queue: PASS")
+
+
+def test_aimd_limit_adapts_to_latency():
+    async def scenario():
+        ctl = AdmissionController(initial_limit=4, min_limit=2, max_limit=6, latency_target=1.0, cooldown=60)
+        for _ in range(20):
+            assert await ctl.acquire()
+            ctl.release(0.2)
+        grown = ctl.limit
+
+        # Two slow turns in the same cooldown window count as one decrease
+        for _ in range(2):
+            assert await ctl.acquire()
+            ctl.release(5.0)
+        after_slow = ctl.limit
+
+        ctl._last_decrease -= 120
+        for _ in range(5):
+            assert await ctl.acquire()
+            ctl.release(0.1, ok=False)
+            ctl._last_decrease -= 120
+        return grown, after_slow, ctl.limit, ctl.counters["decreases"]
+
+    grown, after_slow, floor, decreases = asyncio.run(scenario())
+    assert grown == 6
+    assert after_slow == 4  # 6 * 0.75 = 4.5
+    assert floor == 2
+    assert decreases == 6
+    print("✅ AIMD limit adapts to latency: PASS")
+
+
+def test_busy_reply_shape():
+    reply = busy_reply()
+    assert reply["mode"] == "busy" and reply["reply"] == BUSY_REPLY
+    assert reply["retry_after_seconds"] > 0
+    print("✅ Busy reply shape: PASS")
+
+
+if __name__ == "__main__":
+    test_admits_up_to_limit_then_queues_and_hands_over()
+    test_sheds_on_full_queue_and_deadline()
+    test_cancelled_waiter_leaves_queue()
+    test_aimd_limit_adapts_to_latency()
+    test_busy_reply_shape()
@@ -0,0 +1,105 @@
+# test_ann_index.py
+"""
+Tests for the pure-numpy IVF/PQ index.
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.ann_index import IVFIndex, normalize_rows, exact_search, recall_at_k, tune_nprobe
+
+
+def _dataset(n=3000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((20, dim))
+    data = centres[rng.integers(0, 20, n)] + 0.3 * rng.standard_normal((n, dim))
+    queries = centres[rng.integers(0, 20, 20)] + 0.3 * rng.standard_normal((20, dim))
+    return normalize_rows(data), normalize_rows(queries)
+
+
+def test_ivf_probing_all_lists_is_exact():
+    """With nprobe == nlist, IVF-Flat must match brute force."""
+    data, queries = _dataset()
+    index = IVFIndex(nlist=16)
+    index.train(data, n_iter=5)
+    index.add(data)
+    exact = [exact_search(data, q, 10)[0] for q in queries]
+    approx = [index.search(q, k=10, nprobe=16)[0] for q in queries]
+    assert recall_at_k(approx, exact, 10) == 1.0
+    print("✅ IVF full probe is exact: PASS")
+
+
+def test_tune_nprobe_reaches_target():
+    data, queries = _dataset()
+    index = IVFIndex(nlist=32)
+    index.train(data, n_iter=5)
+    index.add(data)
+    exact = [exact_search(data, q, 10)[0] for q in queries]
+    nprobe, curve = tune_nprobe(index, queries, exact, k=10, target_recall=0.9)
+    assert curve[nprobe] >= 0.9
+    assert index.nprobe == nprobe
+    print("✅ nprobe tuning: PASS")
+
+
+def test_pq_scores_approximate_cosine():
+    """PQ asymmetric scores should be close to the true inner products."""
+    data, queries = _dataset()
+    index = IVFIndex(nlist=8, pq_m=8, pq_ksub=64)
+    index.train(data, n_iter=5)
+    index.add(data)
+    ids, scores = index.search(queries[0], k=20, nprobe=8)
+    true = data[ids] @ queries[0]
+    assert np.max(np.abs(scores - true)) < 0.1
+    print("✅ PQ score approximation: PASS")
+
+
+def test_pq_refine_restores_recall():
+    """Re-scoring the PQ shortlist with stored vectors fixes PQ-only ranking."""
+    data, queries = _dataset()
+    exact = [exact_search(data, q, 10)[0] for q in queries]
+    recall = {}
+    for refine in (None, "int8"):
+        index = IVFIndex(nlist=8, pq_m=8, pq_ksub=64, refine_storage=refine)
+        index.train(data, n_iter=5)
+        index.add(data[:1500])
+        index.add(data[1500:], ids=np.arange(1500, 3000))
+        approx = [index.search(q, k=10, nprobe=8)[0] for q in queries]
+        recall[refine] = recall_at_k(approx, exact, 10)
+    ids, scores = index.search(queries[0], k=10, nprobe=8)
+    assert np.allclose(scores, data[ids] @ queries[0], atol=0.02)
+    assert recall[None] < 0.5 and recall["int8"] >= 0.8
+    print("✅ PQ refine re-scoring: PASS")
+
+
+def test_save_and_load_roundtrip():
+    data, queries = _dataset(n=500)
+    for pq_m, refine in ((None, None), (4, None), (4, "float16")):
+        index = IVFIndex(nlist=8, pq_m=pq_m, pq_ksub=16, refine_storage=refine)
+        index.train(data, n_iter=3)
+        index.add(data[:250])
+        index.add(data[250:], ids=np.arange(250, 500))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.npz")
+            index.save(path, extra={"section_ids": np.arange(500) // 10})
+            loaded, extra = IVFIndex.load(path)
+        assert len(loaded) == 500 and loaded.refine_storage == refine
+        assert extra["section_ids"][499] == 49
+        ids_a, _ = index.search(queries[0], k=5)
+        ids_b, _ = loaded.search(queries[0], k=5)
+        assert ids_a.tolist() == ids_b.tolist()
+    print("✅ Save/load roundtrip: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== ANN Index Tests ===\n")
+    test_ivf_probing_all_lists_is_exact()
+    test_tune_nprobe_reaches_target()
+    test_pq_scores_approximate_cosine()
+    test_pq_refine_restores_recall()
+    test_save_and_load_roundtrip()
+    print("\n=== All Tests Passed! ===\n")
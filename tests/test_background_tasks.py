@@ -0,0 +1,105 @@
+# test_background_tasks.py
+"""
+Tests for the supervised background task runner.
+"""
+import os
+import sys
+import asyncio
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.background_tasks import BackgroundRunner
+from modules.tracing import start_trace, end_trace, traced
+
+
+def test_concurrency_cap_and_drain():
+    state = {"running": 0, "peak": 0, "done": 0}
+
+    async def job():
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        state["done"] += 1
+
+    async def scenario():
+        runner = BackgroundRunner(max_concurrency=3, workers_per_type=4)
+        for _ in range(10):
+            runner.submit("a", job)
+            runner.submit("b", job)
+        assert runner.stats()["a"]["queue_depth"] == 10
+        assert await runner.drain(timeout=5)
+        assert not runner.submit("a", job)   # closed after drain
+        return runner.stats()
+
+    stats = asyncio.run(scenario())
+    assert state["done"] == 20 and state["peak"] <= 3
+    assert stats["a"]["completed"] == 10 and stats["a"]["dropped"] == 1
+    assert stats["a"]["max_lag_seconds"] > 0
+    print("✅ Concurrency cap + drain: PASS")
+
+
+def test_retries_with_backoff():
+    attempts = {"n": 0}
+
+    async def flaky():
+        attempts["n"] += 1
+        if attempts["n"] < 3:
+            raise Exception("transient")
+
+    async def scenario():
+        runner = BackgroundRunner(max_retries=3, retry_base_delay=0.001)
+        runner.submit("flaky", flaky)
+        await runner.drain(timeout=5)
+        return runner.stats()["flaky"]
+
+    stats = asyncio.run(scenario())
+    assert attempts["n"] == 3
+    assert stats["retried"] == 2 and stats["completed"] == 1 and stats["failed"] == 0
+    print("✅ Retry with backoff: PASS")
+
+
+def test_bounded_queue_drops():
+    async def job():
+        await asyncio.sleep(0)
+
+    async def scenario():
+        runner = BackgroundRunner(queue_size=2, workers_per_type=1)
+        accepted = [runner.submit("t", job) for _ in range(4)]
+        await runner.drain(timeout=5)
+        return accepted, runner.stats()["t"]
+
+    accepted, stats = asyncio.run(scenario())
+    assert accepted == [True, True, False, False] and stats["dropped"] == 2
+    print("✅ Bounded queue: PASS")
+
+
+def test_workers_do_not_inherit_request_trace():
+    @traced("award_points")
+    async def job():
+        await asyncio.sleep(0)
+
+    async def scenario():
+        runner = BackgroundRunner(workers_per_type=1)
+        trace, token = start_trace("POST /chat")
+        try:
+            runner.submit("t", job)  # first submit starts the workers inside the request
+            await runner.drain(timeout=5)
+        finally:
+            end_trace(token)
+        return trace, runner.stats()["t"]
+
+    trace, stats = asyncio.run(scenario())
+    assert stats["completed"] == 1
+    assert trace.spans == []
+    print("✅ Workers run outside request traces: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Background Runner Tests ===\n")
+    test_concurrency_cap_and_drain()
+    test_retries_with_backoff()
+    test_bounded_queue_drops()
+    test_workers_do_not_inherit_request_trace()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,238 @@
+# test_cancellation.py
+"""
+Tests for request-scoped cancellation (modules/cancellation.py) and how the
+idempotency store, coalescer, admission controller and upstream metrics
+behave when a turn is cancelled.
+"""
+import os
+import sys
+import asyncio
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from modules.tracing import TracingMiddleware
+from modules.cancellation import run_cancellable, TurnCancelled, checkpoint, reached, CANCELLED_TURNS
+from modules.idempotency import IdempotencyStore
+from modules.coalescing import MessageCoalescer
+from modules.admission import AdmissionController
+from modules.metrics import observe_upstream, UPSTREAM_CANCELLED, UPSTREAM_ERRORS
+
+
+class FakeRequest:
+    """Reports a disconnect after `polls` checks."""
+
+    def __init__(self, polls):
+        self.polls = polls
+
+    async def is_disconnected(self):
+        self.polls -= 1
+        return self.polls < 0
+
+
+def test_finished_turn_is_returned():
+    async def turn():
+        checkpoint("user_message_saved")
+        await asyncio.sleep(0.01)
+        return {"reply": "ok", "saved": reached("user_message_saved")}
+
+    result = asyncio.run(run_cancellable(turn(), FakeRequest(polls=100), deadline=1, poll_seconds=0.005))
+    assert result == {"reply": "ok", "saved": True}
+    assert not reached("user_message_saved")  # scoped to the turn
+    print("✅ Finished turn is returned: PASS")
+
+
+def test_disconnect_cancels_gathered_calls():
+    cancelled = []
+
+    async def llm_call(name):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+
+    async def turn():
+        await asyncio.gather(llm_call("translate"), llm_call("classify"), llm_call("intent"))
+
+    before = CANCELLED_TURNS.value(reason="disconnect")
+    try:
+        asyncio.run(run_cancellable(turn(), FakeRequest(polls=2), deadline=5, poll_seconds=0.01))
+        raise AssertionError("expected TurnCancelled")
+    except TurnCancelled as e:
+        assert e.reason == "disconnect"
+    assert sorted(cancelled) == ["classify", "intent", "translate"]
+    assert CANCELLED_TURNS.value(reason="disconnect") == before + 1
+    print("✅ Disconnect cancels gathered calls: PASS")
+
+
+def test_deadline_cancels_and_runs_cleanup():
+    cleanup = []
+
+    async def turn():
+        try:
+            await asyncio.sleep(5)
+        finally:
+            cleanup.append(reached("user_message_saved"))
+
+    try:
+        asyncio.run(run_cancellable(turn(), None, deadline=0.02))
+        raise AssertionError("expected TurnCancelled")
+    except TurnCancelled as e:
+        assert e.reason == "deadline"
+    assert cleanup == [False]
+    print("✅ Deadline cancels and runs cleanup: PASS")
+
+
+def test_abandoned_idempotent_computation_is_cancelled():
+    runs = []
+
+    async def compute():
+        runs.append("start")
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            runs.append("cancelled")
+            raise
+        return {"reply": "done"}
+
+    async def leave_then(store, rejoin_after):
+        first = asyncio.create_task(store.run("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(rejoin_after)
+        return await store.run("k", compute)
+
+    async def scenario():
+        kept = IdempotencyStore(ttl_seconds=60, abandon_grace_seconds=0.1)
+        rejoined = await leave_then(kept, rejoin_after=0.02)
+        dropped = IdempotencyStore(ttl_seconds=60, abandon_grace_seconds=0.01)
+        rerun = await leave_then(dropped, rejoin_after=0.05)
+        return kept, rejoined, dropped, rerun
+
+    kept, rejoined, dropped, rerun = asyncio.run(scenario())
+    assert rejoined == ({"reply": "done"}, "joined") and kept.counters["abandoned"] == 0
+    assert rerun == ({"reply": "done"}, "executed") and dropped.counters["abandoned"] == 1
+    assert runs.count("cancelled") == 1
+    print("✅ Abandoned idempotent computation is cancelled: PASS")
+
+
+def test_abandoned_burst_is_handed_back():
+    abandoned = []
+
+    async def scenario():
+        coalescer = MessageCoalescer(window_seconds=1, max_wait_seconds=2, max_messages=10)
+        first = asyncio.create_task(coalescer.submit("u1", "hi", on_abandon=abandoned.append))
+        await asyncio.sleep(0.01)
+        holder = asyncio.create_task(coalescer.submit("u1", "I have PCOS", on_abandon=abandoned.append))
+        assert await first is None
+        holder.cancel()
+        try:
+            await holder
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert abandoned == ["hi\nI have PCOS"]
+    print("✅ Abandoned burst is handed back: PASS")
+
+
+def test_cancelled_work_is_not_an_upstream_error_or_slow_turn():
+    async def call():
+        with observe_upstream("openai-cancel-test", "chat/completions"):
+            await asyncio.sleep(5)
+
+    async def scenario():
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert UPSTREAM_CANCELLED.value(upstream="openai-cancel-test", target="chat/completions") == 1
+    assert UPSTREAM_ERRORS.value(upstream="openai-cancel-test", target="chat/completions") == 0
+
+    ctl = AdmissionController(initial_limit=4, min_limit=1, cooldown=0)
+    ctl.in_flight = 1
+    ctl.release(60.0, ok=False, observe=False)
+    assert ctl.limit == 4 and ctl.counters["decreases"] == 0
+    print("✅ Cancelled work is not an upstream error or slow turn: PASS")
+
+
+def _drive_asgi(app, body: bytes, disconnect_after: float):
+    """Minimal ASGI server: sends the body, then reports http.disconnect after a delay."""
+    sent = []
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        disconnect_at = loop.time() + disconnect_after
+        body_sent = False
+        disconnected = asyncio.Event()
+        loop.call_later(disconnect_after, disconnected.set)
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            if loop.time() < disconnect_at:
+                await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": "/chat", "raw_path": b"/chat", "root_path": "", "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+            "client": ("127.0.0.1", 1234), "server": ("test", 80),
+        }
+        await asyncio.wait_for(app(scope, receive, send), 3)
+
+    asyncio.run(scenario())
+    return sent
+
+
+def test_disconnect_detected_through_app_stack():
+    """Same middleware stack as main.py: the disconnect must reach the endpoint."""
+    outcomes = []
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    app.add_middleware(TracingMiddleware)
+
+    class Body(BaseModel):
+        message: str
+
+    @app.post("/chat")
+    async def chat(req: Body, request: Request):
+        try:
+            await run_cancellable(asyncio.sleep(5), request, deadline=5, poll_seconds=0.01)
+        except TurnCancelled as e:
+            outcomes.append(e.reason)
+            return Response(status_code=499)
+        return {"reply": req.message}
+
+    sent = _drive_asgi(app, b'{"message": "hi"}', disconnect_after=0.1)
+    assert outcomes == ["disconnect"]
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    assert start["status"] == 499 and any(name == b"server-timing" for name, _ in start["headers"])
+    print("✅ Disconnect detected through the app stack: PASS")
+
+
+if __name__ == "__main__":
+    test_finished_turn_is_returned()
+    test_disconnect_cancels_gathered_calls()
+    test_deadline_cancels_and_runs_cleanup()
+    test_abandoned_idempotent_computation_is_cancelled()
+    test_abandoned_burst_is_handed_back()
+    test_cancelled_work_is_not_an_upstream_error_or_slow_turn()
+    test_disconnect_detected_through_app_stack()
@@ -0,0 +1,84 @@
+# test_chunking.py
+"""
+Tests for the token-aware sliding-window chunker. A whitespace "tokenizer"
+stands in for tiktoken so the tests run offline.
+"""
+import os
+import sys
+import contextlib
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.text_utils as text_utils
+from modules.text_utils import chunk_text_by_tokens, split_sentences
+
+
+class WordEncoding:
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@contextlib.contextmanager
+def _word_encoding():
+    original = text_utils._get_encoding
+    text_utils._get_encoding = lambda model: WordEncoding()
+    try:
+        yield
+    finally:
+        text_utils._get_encoding = original
+
+
+def _sentence(i, words=5):
+    return " ".join([f"s{i}w{j}" for j in range(words - 1)] + [f"end{i}."])
+
+
+def test_split_sentences():
+    assert split_sentences("One two. Three? Four!\nFive") == ["One two.", "Three?", "Four!", "Five"]
+    print("✅ Sentence split: PASS")
+
+
+def test_chunks_respect_target_and_snap_to_sentences():
+    with _word_encoding():
+        text = " ".join(_sentence(i) for i in range(20))
+        chunks = chunk_text_by_tokens(text, target_tokens=20, overlap_tokens=5)
+        assert all(len(c.split()) <= 20 for c in chunks)
+        assert all(c.endswith(".") for c in chunks)
+        # Every sentence is covered
+        for i in range(20):
+            assert any(f"end{i}." in c for c in chunks)
+    print("✅ Target size + sentence snapping: PASS")
+
+
+def test_overlap_repeats_trailing_sentence():
+    with _word_encoding():
+        text = " ".join(_sentence(i) for i in range(8))
+        chunks = chunk_text_by_tokens(text, target_tokens=15, overlap_tokens=5)
+        assert chunks[0].endswith("end2.")
+        assert chunks[1].startswith("s2w0")
+        no_overlap = chunk_text_by_tokens(text, target_tokens=15, overlap_tokens=0)
+        assert no_overlap[1].startswith("s3w0")
+        assert len(no_overlap) < len(chunks)
+    print("✅ Sentence-snapped overlap: PASS")
+
+
+def test_long_sentence_is_split_on_tokens():
+    with _word_encoding():
+        text = " ".join(f"w{i}" for i in range(50)) + "."
+        chunks = chunk_text_by_tokens(text, target_tokens=20, overlap_tokens=4)
+        assert all(len(c.split()) <= 20 for c in chunks)
+        assert chunks[0].split()[-4:] == chunks[1].split()[:4]
+        assert chunks[-1].endswith("w49.")
+    print("✅ Long sentence split: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Chunking Tests ===\n")
+    test_split_sentences()
+    test_chunks_respect_target_and_snap_to_sentences()
+    test_overlap_repeats_trailing_sentence()
+    test_long_sentence_is_split_on_tokens()
+    print("\n=== All Tests Passed! ===\n")
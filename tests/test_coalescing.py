@@ -0,0 +1,100 @@
+# test_coalescing.py
+"""
+Tests for per-user message burst coalescing (modules/coalescing.py).
+"""
+import os
+import sys
+import asyncio
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.coalescing import MessageCoalescer, merged_reply, should_coalesce
+
+
+async def _send_burst(coalescer, user_key, messages, gap):
+    tasks = []
+    for message in messages:
+        tasks.append(asyncio.create_task(coalescer.submit(user_key, message)))
+        await asyncio.sleep(gap)
+    return await asyncio.gather(*tasks)
+
+
+def test_burst_is_answered_once_by_last_message():
+    async def scenario():
+        coalescer = MessageCoalescer(window_seconds=0.1, max_wait_seconds=2, max_messages=10)
+        results = await _send_burst(coalescer, "u1", ["hi", "I have PCOS", "can I do IVF?"], gap=0.02)
+        return coalescer, results
+
+    coalescer, results = asyncio.run(scenario())
+    assert results == [None, None, "hi\nI have PCOS\ncan I do IVF?"]
+    assert coalescer.stats() == {"open_bursts": 0, "turns": 1, "merged": 2, "full": 0, "abandoned": 0}
+    print("✅ Burst answered once by the last message: PASS")
+
+
+def test_users_and_spaced_messages_are_separate_turns():
+    async def scenario():
+        coalescer = MessageCoalescer(window_seconds=0.03, max_wait_seconds=2, max_messages=10)
+        spaced = await _send_burst(coalescer, "u1", ["hi", "what is IVF?"], gap=0.08)
+        other_users = await asyncio.gather(coalescer.submit("u2", "hello"), coalescer.submit("u3", "hey"))
+        return spaced, other_users
+
+    spaced, other_users = asyncio.run(scenario())
+    assert spaced == ["hi", "what is IVF?"]
+    assert other_users == ["hello", "hey"]
+    print("✅ Users and spaced messages are separate turns: PASS")
+
+
+def test_burst_closes_on_max_messages_and_max_wait():
+    async def scenario():
+        full = MessageCoalescer(window_seconds=5, max_wait_seconds=5, max_messages=2)
+        full_results = await _send_burst(full, "u1", ["a", "b"], gap=0.01)
+
+        capped = MessageCoalescer(window_seconds=0.05, max_wait_seconds=0.12, max_messages=10)
+        capped_results = await _send_burst(capped, "u1", ["1", "2", "3", "4", "5", "6"], gap=0.03)
+        return full, full_results, capped_results
+
+    full, full_results, capped_results = asyncio.run(scenario())
+    assert full_results == [None, "a\nb"] and full.counters["full"] == 1
+    # The debounce never expires, so max_wait splits the stream into several turns
+    answered = [r for r in capped_results if r is not None]
+    assert 2 <= len(answered) and "\n".join(answered) == "1\n2\n3\n4\n5\n6"
+    print("✅ Burst closes on max messages and max wait: PASS")
+
+
+def test_cancelled_holder_drops_burst():
+    async def scenario():
+        coalescer = MessageCoalescer(window_seconds=1, max_wait_seconds=2, max_messages=10)
+        holder = asyncio.create_task(coalescer.submit("u1", "hi"))
+        await asyncio.sleep(0.01)
+        holder.cancel()
+        try:
+            await holder
+        except asyncio.CancelledError:
+            pass
+        return coalescer.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["open_bursts"] == 0 and stats["abandoned"] == 1
+    assert merged_reply()["mode"] == "merged"
+    print("✅ Cancelled holder drops the burst: PASS")
+
+
+def test_only_free_form_questions_of_onboarded_users_coalesce():
+    onboarded = {"user_id": "u1", "name": "Asha", "gender": "Female", "Location": "Vizag"}
+    assert should_coalesce("can I do IVF?", onboarded, {})
+    assert should_coalesce("can I do IVF?", onboarded, {"lead_flow": {}})
+    # Commands, onboarding answers and lead-flow answers go one by one
+    assert not should_coalesce(" /rewards", onboarded, {})
+    assert not should_coalesce("Female", {"user_id": "u1", "name": "Asha"}, None)
+    assert not should_coalesce("hi", None, None)
+    assert not should_coalesce("Ravi", onboarded, {"lead_flow": {"step": "name"}})
+    print("✅ Coalescing eligibility: PASS")
+
+
+if __name__ == "__main__":
+    test_burst_is_answered_once_by_last_message()
+    test_users_and_spaced_messages_are_separate_turns()
+    test_burst_closes_on_max_messages_and_max_wait()
+    test_cancelled_holder_drops_burst()
+    test_only_free_form_questions_of_onboarded_users_coalesce()
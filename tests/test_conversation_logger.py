@@ -0,0 +1,229 @@
+# test_conversation_logger.py
+"""
+Tests for the write-behind conversation logger (Supabase calls are replaced
+on the module, spill files go to a temp dir).
+"""
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.conversation as conversation
+from modules.conversation import ConversationLogger
+from supabase_client import SupabaseHTTPError
+
+
+class FakeTable:
+    def __init__(self):
+        self.batches = []
+        self.down = False
+        self.fail_after = None    # go down after this many more successful inserts
+        self.bad_text = None      # rows with this message_text fail a CHECK constraint
+
+    def insert_many(self, table, rows, **kwargs):
+        if self.fail_after == 0:
+            self.down = True
+        if self.down:
+            raise Exception("connection refused")
+        if any(row.get("message_text") == self.bad_text for row in rows):
+            raise SupabaseHTTPError("400 - 23514 violates check constraint", 400)
+        if self.fail_after:
+            self.fail_after -= 1
+        # Like PostgREST: every object in a bulk insert must have the same keys
+        if len({frozenset(row) for row in rows}) > 1:
+            raise Exception("400 - PGRST102 All object keys must match")
+        self.batches.append(list(rows))
+        return rows
+
+
+def _row(i, user_id="u1"):
+    return {"user_id": user_id, "message_text": f"m{i}", "message_type": "user", "created_at": f"2026-01-01T00:00:{i:02d}"}
+
+
+def test_timestamps_are_strictly_increasing():
+    logger = ConversationLogger()
+    stamps = [logger.next_timestamp() for _ in range(1000)]
+    assert stamps == sorted(stamps) and len(set(stamps)) == len(stamps)
+    print("✅ Monotonic timestamps: PASS")
+
+
+def test_batches_flush_on_size_and_shutdown():
+    original = conversation.supabase_insert_many
+    try:
+        table = FakeTable()
+        conversation.supabase_insert_many = table.insert_many
+
+        async def scenario():
+            logger = ConversationLogger(batch_size=10, flush_interval=60, spill_path=os.path.join(tempfile.mkdtemp(), "spill.jsonl"))
+            await logger.start()
+            for i in range(25):
+                logger.enqueue(_row(i))
+            assert len(logger.pending_for("u1")) > 0
+            await asyncio.sleep(0.05)   # size trigger, long before the 60s interval
+            assert [len(b) for b in table.batches] == [10, 10, 5]
+            logger.enqueue(_row(25))
+            await logger.stop()         # shutdown drains the rest
+            return logger
+
+        logger = asyncio.run(scenario())
+        assert [len(b) for b in table.batches] == [10, 10, 5, 1]
+        assert [r["message_text"] for b in table.batches for r in b] == [f"m{i}" for i in range(26)]
+        assert logger.pending_for("u1") == []
+        print("✅ Size + shutdown flush: PASS")
+    finally:
+        conversation.supabase_insert_many = original
+
+
+def test_spill_when_unavailable_and_replay():
+    original = conversation.supabase_insert_many
+    try:
+        table = FakeTable()
+        conversation.supabase_insert_many = table.insert_many
+        spill_path = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+
+        async def scenario():
+            logger = ConversationLogger(batch_size=5, flush_interval=0.01, spill_path=spill_path)
+            await logger.start()
+            table.down = True
+            for i in range(3):
+                logger.enqueue(_row(i))
+            await asyncio.sleep(0.05)
+            assert os.path.exists(spill_path)
+            table.down = False
+            logger.enqueue(_row(3))
+            await asyncio.sleep(0.05)
+            await logger.stop()
+            return logger
+
+        logger = asyncio.run(scenario())
+        written = [r["message_text"] for b in table.batches for r in b]
+        assert sorted(written) == ["m0", "m1", "m2", "m3"]
+        assert logger.stats["spilled"] == 3 and logger.stats["replayed"] == 3
+        assert not os.path.exists(spill_path)
+        print("✅ Spill + replay: PASS")
+    finally:
+        conversation.supabase_insert_many = original
+
+
+def _write_spill(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def test_interrupted_replay_resumes_without_duplicates():
+    original = conversation.supabase_insert_many
+    try:
+        table = FakeTable()
+        conversation.supabase_insert_many = table.insert_many
+        spill_path = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+        _write_spill(spill_path, [_row(i) for i in range(5)])
+        logger = ConversationLogger(batch_size=2, spill_path=spill_path)
+
+        table.fail_after = 1    # first batch commits, second fails
+        assert asyncio.run(logger.replay_spill()) == 2
+        assert not os.path.exists(spill_path) and os.path.exists(logger.replay_path)
+
+        # A fresh process finds only the unfinished replay and picks it up at startup
+        table.down, table.fail_after = False, None
+        logger = ConversationLogger(batch_size=2, flush_interval=60, spill_path=spill_path)
+
+        async def scenario():
+            await logger.start()
+            await logger.stop()
+
+        asyncio.run(scenario())
+        written = [r["message_text"] for b in table.batches for r in b]
+        assert written == [f"m{i}" for i in range(5)]
+        assert not logger.has_spill() and os.listdir(os.path.dirname(spill_path)) == []
+        print("✅ Interrupted replay resumes without duplicates: PASS")
+    finally:
+        conversation.supabase_insert_many = original
+
+
+def test_rejected_rows_are_moved_aside():
+    original = conversation.supabase_insert_many
+    try:
+        table = FakeTable()
+        table.bad_text = "m1"
+        conversation.supabase_insert_many = table.insert_many
+        spill_path = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+        _write_spill(spill_path, [_row(i) for i in range(4)])
+        logger = ConversationLogger(batch_size=2, spill_path=spill_path)
+
+        assert asyncio.run(logger.replay_spill()) == 3
+        written = [r["message_text"] for b in table.batches for r in b]
+        assert written == ["m0", "m2", "m3"]
+        assert not logger.has_spill() and logger.stats["rejected"] == 1
+        with open(logger.rejected_path, encoding="utf-8") as f:
+            assert [json.loads(line)["message_text"] for line in f] == ["m1"]
+        print("✅ Rejected rows moved aside: PASS")
+    finally:
+        conversation.supabase_insert_many = original
+
+
+def test_full_queue_spills_instead_of_blocking():
+    original = conversation.supabase_insert_many
+    try:
+        table = FakeTable()
+        conversation.supabase_insert_many = table.insert_many
+        spill_path = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+
+        async def scenario():
+            logger = ConversationLogger(max_queue=2, batch_size=100, flush_interval=60, spill_path=spill_path)
+            await logger.start()
+            for i in range(4):
+                logger.enqueue(_row(i))
+            assert logger.stats["spilled"] == 2
+            await logger.stop()
+
+        asyncio.run(scenario())
+        print("✅ Bounded queue: PASS")
+    finally:
+        conversation.supabase_insert_many = original
+
+
+def test_logged_rows_have_uniform_keys():
+    table = FakeTable()
+    original_insert, original_logger = conversation.supabase_insert_many, conversation._conversation_logger
+    conversation.supabase_insert_many = table.insert_many
+    spill_path = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+    try:
+        async def scenario():
+            logger = conversation._conversation_logger = ConversationLogger(
+                batch_size=10, flush_interval=60, spill_path=spill_path
+            )
+            await logger.start()
+            conversation.save_user_message("u-keys", "What is IVF?", "en")
+            conversation.save_sakhi_message("u-keys", "IVF is ...", "en")
+            # A spill written before every row carried chat_id
+            with open(spill_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(_row(0, user_id="u-keys")) + "\n")
+            await logger.stop()
+            return logger
+
+        logger = asyncio.run(scenario())
+    finally:
+        conversation.supabase_insert_many, conversation._conversation_logger = original_insert, original_logger
+
+    rows = [r for b in table.batches for r in b]
+    assert logger.stats["flush_errors"] == 0 and len(rows) == 3
+    assert len({frozenset(r) for r in rows}) == 1 and "chat_id" in rows[0]
+    assert not os.path.exists(spill_path)
+    print("✅ Logged rows have uniform keys: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Conversation Logger Tests ===\n")
+    test_timestamps_are_strictly_increasing()
+    test_batches_flush_on_size_and_shutdown()
+    test_spill_when_unavailable_and_replay()
+    test_interrupted_replay_resumes_without_duplicates()
+    test_rejected_rows_are_moved_aside()
+    test_full_queue_spills_instead_of_blocking()
+    test_logged_rows_have_uniform_keys()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,161 @@
+# test_degraded_mode.py
+"""
+Tests for pipeline mode selection (modules/degraded_mode.py) and the stage
+shortcuts it drives in response_builder (the OpenAI client and RAG query are
+replaced on the module).
+"""
+import os
+import sys
+import asyncio
+import types
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.degraded_mode as degraded_mode
+import modules.response_builder as response_builder
+from modules.admission import AdmissionController
+from modules.degraded_mode import ModeSelector, PipelineMode, MODE_POLICIES
+from modules.metrics import UpstreamHealth
+
+
+def _selector(hold_seconds=30.0):
+    health = UpstreamHealth(latency_alpha=1.0, error_alpha=1.0)
+    admission = AdmissionController(initial_limit=10, min_limit=1, max_queue=4)
+    return ModeSelector(health=health, admission=admission, hold_seconds=hold_seconds), health, admission
+
+
+def test_upstream_health_ewma_and_staleness():
+    health = UpstreamHealth(latency_alpha=0.5, error_alpha=0.5, stale_after=60)
+    assert health.snapshot("openai", "chat/completions") is None
+    health.record("openai", "chat/completions", 2.0, True)
+    health.record("openai", "chat/completions", 4.0, False)
+    latency, error_rate = health.snapshot("openai", "chat/completions")
+    assert latency == 3.0 and error_rate == 0.5
+
+    health.stale_after = -1
+    assert health.snapshot("openai", "chat/completions") is None
+    print("✅ UpstreamHealth EWMA and staleness: PASS")
+
+
+def test_mode_follows_upstream_latency_with_hold():
+    selector, health, _ = _selector(hold_seconds=3600)
+    assert selector.current() == PipelineMode.NORMAL
+
+    health.record("openai", "chat/completions", degraded_mode.LEAN_LATENCY_SECONDS + 1, True)
+    assert selector.current() == PipelineMode.LEAN
+    health.record("openai", "chat/completions", degraded_mode.EMERGENCY_LATENCY_SECONDS + 1, True)
+    assert selector.current() == PipelineMode.EMERGENCY
+
+    # Recovered upstream: held in emergency until the hold expires
+    health.record("openai", "chat/completions", 1.0, True)
+    assert selector.current() == PipelineMode.EMERGENCY
+    selector.hold_seconds = 0
+    assert selector.current() == PipelineMode.NORMAL
+    print("✅ Mode follows upstream latency with hold: PASS")
+
+
+def test_mode_follows_errors_and_admission_load():
+    selector, health, admission = _selector(hold_seconds=0)
+    health.record("openai", "chat/completions", 1.0, False)
+    assert selector.current() == PipelineMode.EMERGENCY
+    health.record("openai", "chat/completions", 1.0, True)
+    assert selector.current() == PipelineMode.NORMAL
+
+    admission.in_flight = 9
+    assert selector.current() == PipelineMode.LEAN
+    admission.in_flight = 0
+    assert selector.current() == PipelineMode.NORMAL
+    print("✅ Mode follows errors and admission load: PASS")
+
+
+def test_select_overrides():
+    selector, health, _ = _selector()
+    health.record("openai", "chat/completions", 60.0, True)
+    assert selector.select("normal") == PipelineMode.NORMAL
+    assert selector.select("bogus") == PipelineMode.EMERGENCY
+
+    original = degraded_mode.PIPELINE_MODE
+    degraded_mode.PIPELINE_MODE = "lean"
+    try:
+        assert selector.select("normal") == PipelineMode.LEAN
+    finally:
+        degraded_mode.PIPELINE_MODE = original
+
+    assert MODE_POLICIES[PipelineMode.NORMAL].follow_ups
+    assert not MODE_POLICIES[PipelineMode.LEAN].history and MODE_POLICIES[PipelineMode.LEAN].rewrite
+    assert not MODE_POLICIES[PipelineMode.EMERGENCY].rewrite
+    print("✅ select() overrides: PASS")
+
+
+class FakeCompletions:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = types.SimpleNamespace(content=self.reply)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def _with_fake_client(reply, fn):
+    completions = FakeCompletions(reply)
+    original = response_builder.client
+    response_builder.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    try:
+        return asyncio.run(fn()), completions.calls
+    finally:
+        response_builder.client = original
+
+
+def test_rewrite_without_follow_ups_is_one_call():
+    text = "IVF has steps.\n\n Follow ups :\n1. Cost?\n2. Risks?"
+
+    result, calls = _with_fake_client(
+        "IVF lo steps untayi.",
+        lambda: response_builder.force_rewrite_to_tinglish(text, include_follow_ups=False),
+    )
+    assert result == "IVF lo steps untayi." and len(calls) == 1
+
+    result, calls = _with_fake_client("Telugu", lambda: response_builder.force_rewrite_to_telugu(text))
+    assert len(calls) == 2 and "Follow ups" in result
+
+    assert response_builder.strip_follow_ups(text) == "IVF has steps."
+    print("✅ Rewrite without follow-ups is one call: PASS")
+
+
+def test_medical_response_lean_prompt():
+    async def fake_rag(query):
+        return [], 0.0
+
+    original = response_builder.hierarchical_rag_query
+    response_builder.hierarchical_rag_query = fake_rag
+    try:
+        (answer, _), calls = _with_fake_client(
+            "Answer",
+            lambda: response_builder.generate_medical_response(
+                "What is IVF?", "Tinglish", history=None, follow_ups=False, rewrite=False
+            ),
+        )
+        (_, _), normal_calls = _with_fake_client(
+            "Answer", lambda: response_builder.generate_medical_response("What is IVF?", "English", history=None),
+        )
+    finally:
+        response_builder.hierarchical_rag_query = original
+
+    # rewrite=False: the English-looking answer is not sent to a Tinglish rewrite
+    assert answer == "Answer" and len(calls) == 1
+    system = calls[0]["messages"][0]["content"]
+    assert "Do NOT add follow-up questions" in system and "Follow ups :" not in system
+    assert "Follow ups :" in normal_calls[0]["messages"][0]["content"]
+    print("✅ Medical response lean prompt: PASS")
+
+
+if __name__ == "__main__":
+    test_upstream_health_ewma_and_staleness()
+    test_mode_follows_upstream_latency_with_hold()
+    test_mode_follows_errors_and_admission_load()
+    test_select_overrides()
+    test_rewrite_without_follow_ups_is_one_call()
+    test_medical_response_lean_prompt()
@@ -0,0 +1,69 @@
+# test_embedding_store.py
+"""
+Tests for compact float16/int8 embedding storage.
+"""
+import os
+import sys
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.embedding_store import EmbeddingStore, quantize, dequantize, compare_with_float32
+
+
+def _vectors(n=500, dim=64, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_int8_roundtrip_error_is_small():
+    """Per-vector symmetric int8 should reconstruct within half a step."""
+    data = _vectors()
+    codes, scales = quantize(data, "int8")
+    assert codes.dtype == np.int8
+    restored = dequantize(codes, scales)
+    assert np.all(np.abs(restored - data) <= scales[:, None] / 2 + 1e-6)
+    print("✅ int8 roundtrip: PASS")
+
+
+def test_memory_per_vector():
+    """float16 halves and int8 quarters float32 (plus a 4-byte scale)."""
+    data = _vectors(n=100, dim=64)
+    sizes = {}
+    for dtype in ("float32", "float16", "int8"):
+        store = EmbeddingStore(dtype=dtype)
+        store.add(data)
+        sizes[dtype] = store.memory_report()["bytes_per_vector"]
+    assert sizes["float32"] == 256
+    assert sizes["float16"] == 128
+    assert sizes["int8"] == 68
+    print("✅ Memory per vector: PASS")
+
+
+def test_search_returns_ids_and_cosines():
+    data = _vectors()
+    store = EmbeddingStore(dtype="int8")
+    store.add(data, ids=[f"chunk-{i}" for i in range(len(data))])
+    ids, scores = store.search(data[7], k=3)
+    assert ids[0] == "chunk-7"
+    assert abs(scores[0] - 1.0) < 1e-2
+    assert list(scores) == sorted(scores, reverse=True)
+    print("✅ Search: PASS")
+
+
+def test_accuracy_delta_report():
+    data = _vectors(n=1000)
+    report = compare_with_float32(data, data[:10], "float16", k=5)
+    assert report["recall_at_k"] == 1.0
+    assert report["max_abs_score_error"] < 1e-3
+    print("✅ Accuracy delta report: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Embedding Store Tests ===\n")
+    test_int8_roundtrip_error_is_small()
+    test_memory_per_vector()
+    test_search_returns_ids_and_cosines()
+    test_accuracy_delta_report()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,85 @@
+# test_history_cache.py
+"""
+Tests for the per-user history ring buffer behind get_last_messages
+(Supabase calls are replaced on the module).
+"""
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.conversation as conversation
+from modules.conversation import HistoryCache, get_last_messages, save_user_message, save_sakhi_message
+
+
+class FakeConversations:
+    def __init__(self, rows):
+        self.rows = rows
+        self.selects = []
+
+    def select(self, table, select="*", filters="", limit=None, **kwargs):
+        self.selects.append((filters, limit))
+        user_id = filters.split("user_id=eq.")[1].split("&")[0]
+        rows = sorted((r for r in self.rows if r["user_id"] == user_id), key=lambda r: r["created_at"], reverse=True)
+        return rows[:limit]
+
+    def insert(self, table, row, **kwargs):
+        self.rows.append(dict(row))
+        return [row]
+
+
+def _install(rows):
+    fake = FakeConversations(rows)
+    conversation.supabase_select = fake.select
+    conversation.supabase_insert = fake.insert
+    conversation._history_cache = HistoryCache(turns=6, max_users=2)
+    return fake
+
+
+def _row(user_id, i, message_type="user"):
+    return {"user_id": user_id, "message_text": f"{user_id}-{i}", "message_type": message_type,
+            "created_at": f"2026-01-01T00:00:{i:02d}"}
+
+
+def test_miss_uses_server_side_order_then_hits():
+    fake = _install([_row("u1", i) for i in range(30)])
+    history = get_last_messages("u1", limit=5)
+    assert [h["content"] for h in history] == [f"u1-{i}" for i in range(25, 30)]
+    assert fake.selects == [("user_id=eq.u1&order=created_at.desc", 6)]
+
+    get_last_messages("u1", limit=5)
+    assert len(fake.selects) == 1
+    assert conversation.get_history_cache_stats()["hits"] == 1
+    print("✅ Server-side ordered fill + hit: PASS")
+
+
+def test_writes_append_to_cached_buffer():
+    fake = _install([_row("u1", i) for i in range(3)])
+    get_last_messages("u1", limit=5)
+    save_user_message("u1", "new question")
+    save_sakhi_message("u1", "new answer")
+    history = get_last_messages("u1", limit=3)
+    assert [h["content"] for h in history] == ["u1-2", "new question", "new answer"]
+    assert [h["role"] for h in history] == ["user", "user", "sakhi"]
+    assert len(fake.selects) == 1
+    print("✅ Write-through append: PASS")
+
+
+def test_lru_bound_on_users():
+    fake = _install([_row(u, 0) for u in ("a", "b", "c")])
+    for user_id in ("a", "b", "c"):
+        get_last_messages(user_id)
+    stats = conversation.get_history_cache_stats()
+    assert stats["users"] == 2 and stats["evictions"] == 1
+    get_last_messages("a")  # evicted -> refetched
+    assert len(fake.selects) == 4
+    print("✅ LRU user bound: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== History Cache Tests ===\n")
+    test_miss_uses_server_side_order_then_hits()
+    test_writes_append_to_cached_buffer()
+    test_lru_bound_on_users()
+    print("\n=== All Tests Passed! ===\n")
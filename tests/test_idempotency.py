@@ -0,0 +1,118 @@
+# test_idempotency.py
+"""
+Tests for message_id idempotency (modules/idempotency.py): singleflight for
+in-flight duplicates and the TTL cache of completed replies.
+"""
+import os
+import sys
+import asyncio
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.idempotency import IdempotencyStore, EXECUTED, JOINED, REPLAYED
+
+
+def test_in_flight_duplicates_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"reply": "IVF answer", "mode": "slm_rag"}
+
+    async def scenario():
+        store = IdempotencyStore(ttl_seconds=60)
+        results = await asyncio.gather(*(store.run("u1:wamid.1", compute) for _ in range(3)))
+        replay = await store.run("u1:wamid.1", compute)
+        return store, results, replay
+
+    store, results, replay = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == [EXECUTED, JOINED, JOINED]
+    assert all(reply == {"reply": "IVF answer", "mode": "slm_rag"} for reply, _ in results)
+    assert replay[1] == REPLAYED and replay[0]["reply"] == "IVF answer"
+    assert store.stats()["in_flight"] == 0 and store.stats()["entries"] == 1
+    print("✅ In-flight duplicates share one computation: PASS")
+
+
+def test_replies_are_copies_and_expire():
+    async def compute():
+        return {"reply": "hi"}
+
+    async def scenario():
+        store = IdempotencyStore(ttl_seconds=60)
+        first, _ = await store.run("k", compute)
+        first["timings"] = {"total_ms": 1}
+        second, outcome = await store.run("k", compute)
+        assert outcome == REPLAYED and "timings" not in second
+
+        store.ttl_seconds = -1
+        _, outcome = await store.run("k", compute)
+        return outcome
+
+    assert asyncio.run(scenario()) == EXECUTED
+    print("✅ Replies are copies and expire: PASS")
+
+
+def test_failures_and_uncacheable_replies_rerun():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("upstream down")
+        return {"reply": "Sakhi is busy", "mode": "busy"}
+
+    async def scenario():
+        store = IdempotencyStore(ttl_seconds=60)
+        not_busy = lambda reply: reply.get("mode") != "busy"
+        try:
+            await store.run("k", flaky, cacheable=not_busy)
+            raise AssertionError("expected failure")
+        except RuntimeError:
+            pass
+        _, first = await store.run("k", flaky, cacheable=not_busy)
+        _, second = await store.run("k", flaky, cacheable=not_busy)
+        return store, first, second
+
+    store, first, second = asyncio.run(scenario())
+    assert first == EXECUTED and second == EXECUTED and len(attempts) == 3
+    assert store.counters["failed"] == 1 and store.stats()["entries"] == 0
+    print("✅ Failures and uncacheable replies re-run: PASS")
+
+
+def test_computation_survives_disconnected_caller():
+    async def compute():
+        await asyncio.sleep(0.05)
+        return {"reply": "done"}
+
+    async def scenario():
+        store = IdempotencyStore(ttl_seconds=60)
+        first = asyncio.create_task(store.run("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()  # the original webhook connection dropped
+        reply, outcome = await store.run("k", compute)
+        return store, reply, outcome
+
+    store, reply, outcome = asyncio.run(scenario())
+    assert outcome == JOINED and reply == {"reply": "done"}
+    assert store.counters[EXECUTED] == 1
+    print("✅ Computation survives a disconnected caller: PASS")
+
+
+def test_lru_bound():
+    store = IdempotencyStore(ttl_seconds=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        store.put(key, {"reply": key})
+    assert store.get("a") is None and store.get("c") == {"reply": "c"}
+    assert store.counters["evictions"] == 1
+    print("✅ LRU bound: PASS")
+
+
+if __name__ == "__main__":
+    test_in_flight_duplicates_share_one_computation()
+    test_replies_are_copies_and_expire()
+    test_failures_and_uncacheable_replies_rerun()
+    test_computation_survives_disconnected_caller()
+    test_lru_bound()
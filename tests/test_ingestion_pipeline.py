@@ -0,0 +1,301 @@
+# test_ingestion_pipeline.py
+"""
+Tests for the batched, resumable ingestion pipeline (no network: the embed
+and insert calls and the tokenizer are swapped on the module per test).
+"""
+import os
+import sys
+import asyncio
+import contextlib
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.ingestion_pipeline as pipeline_module
+import re
+
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from supabase_client import SupabaseHTTPError
+from modules.ingestion_pipeline import (
+    IngestionPipeline,
+    plan_embedding_batches,
+    diff_sections,
+    section_hash,
+    failed_before_commit,
+)
+
+
+def _sections(n):
+    return [
+        {"header_path": f"Doc > Part > Section {i}", "content": f"Body {i}", "chunks": [f"chunk {i}a", f"chunk {i}b"]}
+        for i in range(n)
+    ]
+
+
+def _word_tokens(text, model=None):
+    return len(text.split())
+
+
+@contextlib.contextmanager
+def _patched(**attrs):
+    """Replace pipeline_module attributes for the duration of a test."""
+    originals = {name: getattr(pipeline_module, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(pipeline_module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(pipeline_module, name, value)
+
+
+def _fakes(calls, fail_sections_once=False):
+    state = {"next_id": 1, "failed": False}
+
+    async def fake_embed(texts, dimensions=None):
+        calls["embed"] += 1
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    async def fake_insert_many(table, rows, **kwargs):
+        calls[table] = calls.get(table, 0) + len(rows)
+        if table == "sakhi_sections" and fail_sections_once and not state["failed"]:
+            state["failed"] = True
+            raise SupabaseHTTPError("Supabase bulk insert failed: 503 - unavailable", 503)
+        out = []
+        for row in rows:
+            out.append({**row, "id": state["next_id"]})
+            state["next_id"] += 1
+        return out
+
+    return {
+        "async_generate_embeddings_batch": fake_embed,
+        "async_supabase_insert_many": fake_insert_many,
+        "bump_kb_version": lambda: None,
+        "count_tokens": _word_tokens,
+        "RETRY_BASE_DELAY": 0.0,
+    }
+
+
+def test_embedding_batches_respect_limits():
+    texts = ["word " * 10] * 7
+    with _patched(count_tokens=_word_tokens):
+        batches = plan_embedding_batches(texts, max_inputs=3, max_tokens=10_000)
+        assert [len(b) for b in batches] == [3, 3, 1]
+        batches = plan_embedding_batches(texts, max_inputs=100, max_tokens=25)
+    assert all(len(b) <= 2 for b in batches)
+    assert sum(len(b) for b in batches) == 7
+    print("✅ Embedding batch planning: PASS")
+
+
+def test_pipeline_batches_and_retries():
+    calls = {"embed": 0}
+    with _patched(**_fakes(calls, fail_sections_once=True)):
+        pipeline = IngestionPipeline(sections_per_unit=5, concurrency=2)
+        stats = asyncio.run(pipeline.run(_sections(12)))
+    assert stats["sections"] == 12 and stats["chunks"] == 24
+    assert stats["failed_units"] == 0
+    assert calls["embed"] == 3  # one embedding request per unit
+    print("✅ Batched pipeline with retry: PASS")
+
+
+def test_checkpoint_resume_skips_done_units():
+    calls = {"embed": 0}
+    fakes = _fakes(calls)
+    insert_many = fakes["async_supabase_insert_many"]
+    down = {"value": True}
+
+    async def failing_second_unit(table, rows, **kwargs):
+        if down["value"] and any(r.get("header_path", "").endswith("Section 5") for r in rows):
+            raise Exception("connection reset")
+        return await insert_many(table, rows, **kwargs)
+
+    fakes["async_supabase_insert_many"] = failing_second_unit
+    with _patched(**fakes), tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ckpt.json")
+        first = asyncio.run(IngestionPipeline(checkpoint_path=path, sections_per_unit=4, max_retries=1).run(_sections(8)))
+        assert first["units"] == 1 and first["failed_units"] == 1
+        assert os.path.exists(path)
+
+        down["value"] = False
+        second = asyncio.run(IngestionPipeline(checkpoint_path=path, sections_per_unit=4).run(_sections(10)))
+        assert second["skipped_units"] == 1
+        assert second["sections"] == 6
+        # Clean run: checkpoint removed, the next run starts from scratch
+        assert not os.path.exists(path)
+        third = asyncio.run(IngestionPipeline(checkpoint_path=path, sections_per_unit=4).run(_sections(4)))
+        assert third["skipped_units"] == 0 and third["sections"] == 4
+    print("✅ Checkpoint resume: PASS")
+
+
+class FakeTables:
+    """Tiny in-memory stand-in for the two KB tables."""
+
+    def __init__(self):
+        self.rows = {"sakhi_sections": {}, "sakhi_section_chunks": {}}
+        self.next_id = 1
+        self.embedded = []
+
+    def fakes(self):
+        async def embed(texts, dimensions=None):
+            self.embedded.extend(texts)
+            return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+        async def insert_many(table, rows, **kwargs):
+            out = []
+            for row in rows:
+                stored = {**row, "id": self.next_id}
+                self.rows[table][self.next_id] = stored
+                self.next_id += 1
+                out.append(stored)
+            return out
+
+        async def select(table, select="*", filters="", limit=None, rpc=None, payload=None):
+            last_id = int(re.search(r"id=gt\.(\d+)", filters).group(1))
+            wanted = re.search(r"section_id=in\.\(([\d,]+)\)", filters)
+            ids = {int(i) for i in wanted.group(1).split(",")} if wanted else None
+            rows = [
+                r for i, r in sorted(self.rows[table].items())
+                if i > last_id and (ids is None or r["section_id"] in ids)
+            ]
+            return rows[:limit]
+
+        async def update(table, match, data, **kwargs):
+            self.rows[table][int(match.split(".")[-1])].update(data)
+
+        async def delete(table, match, **kwargs):
+            ids = [int(i) for i in re.search(r"\(([\d,]+)\)", match).group(1).split(",")]
+            for i in ids:
+                self.rows[table].pop(i, None)
+                if table == "sakhi_sections":  # on delete cascade
+                    for cid, chunk in list(self.rows["sakhi_section_chunks"].items()):
+                        if chunk["section_id"] == i:
+                            del self.rows["sakhi_section_chunks"][cid]
+
+        return {
+            "async_generate_embeddings_batch": embed,
+            "async_supabase_insert_many": insert_many,
+            "async_supabase_select": select,
+            "async_supabase_update": update,
+            "async_supabase_delete": delete,
+            "bump_kb_version": lambda: None,
+            "count_tokens": _word_tokens,
+            "RETRY_BASE_DELAY": 0.0,
+        }
+
+
+def test_diff_sections_adopts_legacy_rows_and_drops_duplicates():
+    sections = _sections(2)
+    stored = [
+        {"id": 1, "header_path": sections[0]["header_path"], "source": None, "content_hash": None},
+        {"id": 2, "header_path": "Other > Doc", "source": None, "content_hash": None},
+        {"id": 3, "header_path": "Gone > Section", "source": "doc.json", "content_hash": "x"},
+        {"id": 4, "header_path": sections[1]["header_path"], "source": "doc.json", "content_hash": section_hash(sections[1])},
+        # Duplicates left by earlier full re-ingests of the same document
+        {"id": 5, "header_path": sections[0]["header_path"], "source": None, "content_hash": None},
+        {"id": 6, "header_path": sections[1]["header_path"], "source": None, "content_hash": None},
+    ]
+    pending, unchanged, orphans = diff_sections(sections, stored, "doc.json")
+    assert unchanged == 1
+    assert [p["existing_id"] for p in pending] == [1]
+    # Row 2 may belong to another document and stays
+    assert sorted(orphans) == [3, 5, 6]
+    print("✅ Section diff: PASS")
+
+
+def test_incremental_reingest_embeds_only_changes():
+    db = FakeTables()
+    with _patched(**db.fakes()):
+        sections = _sections(6)
+        asyncio.run(IngestionPipeline(source="doc.json").run(sections))
+        assert len(db.embedded) == 12
+
+        # Edit one paragraph, drop one section
+        edited = [dict(s, chunks=list(s["chunks"])) for s in sections[:5]]
+        edited[2]["chunks"][1] = "a rewritten paragraph"
+        edited[2]["content"] = "Body 2 (edited)"
+        db.embedded.clear()
+        stats = asyncio.run(IngestionPipeline(source="doc.json").run(edited))
+
+        assert db.embedded == ["a rewritten paragraph"]
+        assert stats["unchanged_sections"] == 4
+        assert stats["updated_sections"] == 1 and stats["reused_chunks"] == 1
+        assert stats["deleted_sections"] == 1 and stats["deleted_chunks"] == 1
+        assert len(db.rows["sakhi_sections"]) == 5
+        assert len(db.rows["sakhi_section_chunks"]) == 10
+
+        # Nothing changed: nothing embedded or written
+        db.embedded.clear()
+        stats = asyncio.run(IngestionPipeline(source="doc.json").run(edited))
+        assert db.embedded == [] and stats["unchanged_sections"] == 5
+    print("✅ Incremental re-ingest: PASS")
+
+
+def test_failed_chunk_write_is_redone_on_rerun():
+    db = FakeTables()
+    fakes = db.fakes()
+    insert_many = fakes["async_supabase_insert_many"]
+    chunks_down = {"value": True}
+
+    async def flaky_insert_many(table, rows, **kwargs):
+        if table == "sakhi_section_chunks" and chunks_down["value"]:
+            raise Exception("timeout")
+        return await insert_many(table, rows, **kwargs)
+
+    fakes["async_supabase_insert_many"] = flaky_insert_many
+    with _patched(**fakes):
+        sections = _sections(3)
+        first = asyncio.run(IngestionPipeline(source="doc.json", max_retries=1).run(sections))
+        assert first["failed_units"] == 1
+        assert len(db.rows["sakhi_sections"]) == 3 and not db.rows["sakhi_section_chunks"]
+        assert all(r["content_hash"] is None for r in db.rows["sakhi_sections"].values())
+
+        chunks_down["value"] = False
+        second = asyncio.run(IngestionPipeline(source="doc.json", max_retries=1).run(sections))
+        assert second["unchanged_sections"] == 0 and second["updated_sections"] == 3
+        assert len(db.rows["sakhi_sections"]) == 3 and len(db.rows["sakhi_section_chunks"]) == 6
+        assert all(r["content_hash"] == section_hash(s) for r, s in zip(db.rows["sakhi_sections"].values(), sections))
+
+        third = asyncio.run(IngestionPipeline(source="doc.json").run(sections))
+        assert third["unchanged_sections"] == 3
+    print("✅ Failed chunk write is redone on re-run: PASS")
+
+
+def test_bulk_insert_retried_only_when_nothing_was_written():
+    refused = requests.exceptions.ConnectionError(
+        MaxRetryError(None, "/", NewConnectionError(None, "refused"))
+    )
+    assert failed_before_commit(SupabaseHTTPError("Supabase bulk insert failed: 503", 503))
+    assert failed_before_commit(requests.exceptions.ConnectTimeout())
+    assert failed_before_commit(refused)
+    # The request may have reached Postgres and committed
+    assert not failed_before_commit(requests.exceptions.ReadTimeout())
+    assert not failed_before_commit(requests.exceptions.ConnectionError("Connection aborted."))
+
+    calls = {"embed": 0}
+    fakes = _fakes(calls)
+    attempts = {"sakhi_sections": 0}
+
+    async def read_timeout(table, rows, **kwargs):
+        attempts[table] = attempts.get(table, 0) + 1
+        raise requests.exceptions.ReadTimeout("read timed out")
+
+    fakes["async_supabase_insert_many"] = read_timeout
+    with _patched(**fakes):
+        stats = asyncio.run(IngestionPipeline(max_retries=3).run(_sections(2)))
+    assert stats["failed_units"] == 1 and attempts["sakhi_sections"] == 1
+    print("✅ Bulk insert retried only before commit: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Ingestion Pipeline Tests ===\n")
+    test_embedding_batches_respect_limits()
+    test_pipeline_batches_and_retries()
+    test_checkpoint_resume_skips_done_units()
+    test_diff_sections_adopts_legacy_rows_and_drops_duplicates()
+    test_incremental_reingest_embeds_only_changes()
+    test_failed_chunk_write_is_redone_on_rerun()
+    test_bulk_insert_retried_only_when_nothing_was_written()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,177 @@
+# test_metrics.py
+"""
+Tests for the in-process metrics registry (modules/metrics.py): text
+exposition, upstream instrumentation and the request metrics recorded by the
+tracing middleware.
+"""
+import os
+import sys
+import asyncio
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import supabase_client
+import modules.tracing as tracing
+from modules.metrics import (
+    MetricsRegistry,
+    InstrumentedAsyncTransport,
+    InstrumentedTransport,
+    observe_upstream,
+    REQUEST_LATENCY,
+    REQUESTS_IN_FLIGHT,
+    STAGE_LATENCY,
+    UPSTREAM_ERRORS,
+    UPSTREAM_LATENCY,
+)
+from modules.tracing import span, annotate, TracingMiddleware
+
+
+def test_registry_text_exposition():
+    registry = MetricsRegistry()
+    requests_total = registry.counter("demo_requests_total", "Requests.", ("route",))
+    latency = registry.histogram("demo_latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    registry.gauge_callback("demo_queue_depth", "Queue depth.", ("queue",), lambda: [(("a",), 3), (("b",), 0.5)])
+
+    requests_total.inc(route='slm "rag"')
+    requests_total.inc(2, route="lead")
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, route="slm_rag")
+
+    text = registry.render()
+    assert "# TYPE demo_requests_total counter" in text
+    assert 'demo_requests_total{route="slm \\"rag\\""} 1' in text
+    assert 'demo_requests_total{route="lead"} 2' in text
+    assert 'demo_latency_seconds_bucket{route="slm_rag",le="0.1"} 1' in text
+    assert 'demo_latency_seconds_bucket{route="slm_rag",le="1"} 2' in text
+    assert 'demo_latency_seconds_bucket{route="slm_rag",le="+Inf"} 3' in text
+    assert 'demo_latency_seconds_sum{route="slm_rag"} 5.55' in text
+    assert 'demo_latency_seconds_count{route="slm_rag"} 3' in text
+    assert 'demo_queue_depth{queue="b"} 0.5' in text
+
+    # Same name and shape returns the existing metric; a different shape is an error
+    assert registry.counter("demo_requests_total", "Requests.", ("route",)) is requests_total
+    try:
+        registry.gauge("demo_requests_total", "Requests.")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    print("✅ Registry text exposition: PASS")
+
+
+def test_observe_upstream_counts_errors():
+    before = UPSTREAM_ERRORS.value(upstream="slm", target="test")
+    with observe_upstream("slm", "test"):
+        pass
+    try:
+        with observe_upstream("slm", "test"):
+            raise TimeoutError()
+    except TimeoutError:
+        pass
+    assert UPSTREAM_LATENCY.count(upstream="slm", target="test") >= 2
+    assert UPSTREAM_ERRORS.value(upstream="slm", target="test") == before + 1
+    print("✅ observe_upstream counts errors: PASS")
+
+
+def test_instrumented_transport_records_http_calls():
+    statuses = iter([200, 429])
+
+    async def fake_handle(self, request):
+        return httpx.Response(next(statuses), json={})
+
+    original = httpx.AsyncHTTPTransport.handle_async_request
+    httpx.AsyncHTTPTransport.handle_async_request = fake_handle
+    before = UPSTREAM_ERRORS.value(upstream="openai-test", target="chat/completions")
+    try:
+        async def calls():
+            async with httpx.AsyncClient(transport=InstrumentedAsyncTransport("openai-test")) as client:
+                await client.post("https://api.example.com/v1/chat/completions", json={})
+                await client.post("https://api.example.com/v1/chat/completions", json={})
+
+        asyncio.run(calls())
+    finally:
+        httpx.AsyncHTTPTransport.handle_async_request = original
+
+    assert UPSTREAM_LATENCY.count(upstream="openai-test", target="chat/completions") == 2
+    assert UPSTREAM_ERRORS.value(upstream="openai-test", target="chat/completions") == before + 1
+    print("✅ Instrumented transport records HTTP calls: PASS")
+
+
+def test_openai_clients_keep_sdk_connection_limits():
+    from openai import DEFAULT_CONNECTION_LIMITS
+    import rag
+    import modules.response_builder as response_builder
+    import modules.translation_service as translation_service
+
+    for openai_client in (rag.client, rag.async_client, response_builder.client, translation_service.client):
+        transport = openai_client._client._transport
+        assert isinstance(transport, (InstrumentedAsyncTransport, InstrumentedTransport))
+        assert transport._pool._max_connections == DEFAULT_CONNECTION_LIMITS.max_connections
+        assert transport._pool._max_keepalive_connections == DEFAULT_CONNECTION_LIMITS.max_keepalive_connections
+    print("✅ OpenAI clients keep SDK connection limits: PASS")
+
+
+def test_supabase_calls_are_observed():
+    class FakeResponse:
+        status_code = 500
+        text = "boom"
+
+    class FakeRequests:
+        def get(self, url, headers=None):
+            return FakeResponse()
+
+    original = supabase_client.requests
+    supabase_client.requests = FakeRequests()
+    before = UPSTREAM_ERRORS.value(upstream="supabase", target="sakhi_metrics_test")
+    try:
+        try:
+            supabase_client.supabase_select("sakhi_metrics_test")
+            assert False, "expected failure"
+        except Exception as e:
+            assert "500" in str(e)
+    finally:
+        supabase_client.requests = original
+    assert UPSTREAM_ERRORS.value(upstream="supabase", target="sakhi_metrics_test") == before + 1
+    print("✅ Supabase calls are observed: PASS")
+
+
+def test_middleware_records_route_latency_and_in_flight():
+    app = FastAPI()
+    seen_in_flight = []
+
+    app.add_middleware(TracingMiddleware)
+
+    @app.post("/metrics-test/{user_id}")
+    async def chat(user_id: str):
+        seen_in_flight.append(REQUESTS_IN_FLIGHT.value())
+        with span("metrics_test_stage"):
+            annotate(route="slm_rag")
+        return {"reply": "ok"}
+
+    original = tracing.SLOW_REQUEST_MS
+    tracing.SLOW_REQUEST_MS = 60_000
+    try:
+        client = TestClient(app)
+        client.post("/metrics-test/u1")
+        client.post("/metrics-test/u2")
+    finally:
+        tracing.SLOW_REQUEST_MS = original
+
+    assert seen_in_flight and seen_in_flight[0] >= 1
+    assert REQUESTS_IN_FLIGHT.value() == 0
+    assert REQUEST_LATENCY.count(path="/metrics-test/{user_id}", route="slm_rag", status="200") == 2
+    assert STAGE_LATENCY.count(stage="metrics_test_stage") == 2
+    print("✅ Middleware records route latency and in-flight: PASS")
+
+
+if __name__ == "__main__":
+    test_registry_text_exposition()
+    test_observe_upstream_counts_errors()
+    test_instrumented_transport_records_http_calls()
+    test_openai_clients_keep_sdk_connection_limits()
+    test_supabase_calls_are_observed()
+    test_middleware_records_route_latency_and_in_flight()
@@ -0,0 +1,126 @@
+# test_profile_cache.py
+"""
+Tests for the user-profile cache (Supabase calls are replaced on the module).
+"""
+import os
+import sys
+import asyncio
+import threading
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.user_profile as user_profile
+from modules.user_profile import ProfileCache
+
+
+class FakeUsers:
+    def __init__(self, delay=0.0):
+        self.rows = {"u1": {"user_id": "u1", "name": "Asha", "phone_number": "9876543210"}}
+        self.selects = 0
+        self.delay = delay
+
+    def select(self, table, select="*", filters="", **kwargs):
+        self.selects += 1
+        time.sleep(self.delay)
+        column, value = filters.split("=eq.")
+        return [dict(r) for r in self.rows.values() if r.get(column) == value]
+
+    def update(self, table, match, data, **kwargs):
+        user_id = match.split("=eq.")[1]
+        self.rows[user_id].update(data)
+        return [dict(self.rows[user_id])]
+
+    def insert(self, table, data, **kwargs):
+        self.rows[data["user_id"]] = dict(data)
+        return [dict(data)]
+
+
+def _install(delay=0.0, ttl=30):
+    fake = FakeUsers(delay)
+    user_profile.supabase_select = fake.select
+    user_profile.supabase_update = fake.update
+    user_profile.supabase_insert = fake.insert
+    user_profile._profile_cache = ProfileCache(ttl_seconds=ttl)
+    return fake
+
+
+def test_hits_by_id_and_phone():
+    fake = _install()
+    assert user_profile.get_user_profile("u1")["name"] == "Asha"
+    assert user_profile.get_user_by_phone("+91 98765 43210")["user_id"] == "u1"
+    user_profile.get_user_profile("u1")
+    assert fake.selects == 1
+    print("✅ Cache hits by id and phone: PASS")
+
+
+def test_write_through_updates():
+    fake = _install()
+    user_profile.get_user_profile("u1")
+    user_profile.update_user_profile("u1", {"gender": "Female"})
+    user_profile.update_preferred_language("u1", "te")
+    profile = user_profile.get_user_profile("u1")
+    assert profile["gender"] == "Female" and profile["preferred_language"] == "te"
+    assert fake.selects == 1
+
+    new_user = user_profile.create_partial_user("9000000001")
+    assert user_profile.get_user_by_phone("9000000001")["user_id"] == new_user["user_id"]
+    assert fake.selects == 1
+    print("✅ Write-through: PASS")
+
+
+def test_ttl_expiry():
+    fake = _install(ttl=0.01)
+    user_profile.get_user_profile("u1")
+    time.sleep(0.02)
+    user_profile.get_user_profile("u1")
+    assert fake.selects == 2
+    print("✅ TTL expiry: PASS")
+
+
+def test_concurrent_misses_share_one_fetch():
+    fake = _install(delay=0.05)
+    threads = [threading.Thread(target=user_profile.get_user_profile, args=("u1",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert fake.selects == 1
+    assert user_profile._profile_cache._key_locks == {}
+    print("✅ Stampede protection: PASS")
+
+
+def test_async_miss_does_not_block_event_loop():
+    fake = _install(delay=0.1)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        started = time.monotonic()
+        results = await asyncio.gather(
+            ticker(), *(user_profile.async_get_user_profile("u1") for _ in range(4))
+        )
+        return started, results[1:]
+
+    started, profiles = asyncio.run(scenario())
+    assert all(p["name"] == "Asha" for p in profiles)
+    assert fake.selects == 1
+    # The loop kept running while the select slept in its thread
+    assert ticks[-1] - started < 0.09
+    assert user_profile._profile_cache._key_locks == {}
+    print("✅ Async misses load off the event loop: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Profile Cache Tests ===\n")
+    test_hits_by_id_and_phone()
+    test_write_through_updates()
+    test_ttl_expiry()
+    test_concurrent_misses_share_one_fetch()
+    test_async_miss_does_not_block_event_loop()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,162 @@
+# test_question_clustering.py
+"""
+Tests for new-question clustering and the hot-path near-duplicate check
+(embedding and insert are replaced on modules.user_rewards).
+"""
+import os
+import sys
+import asyncio
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import modules.user_rewards as user_rewards
+from modules.question_clustering import (
+    EmbeddingCache,
+    NearDuplicateIndex,
+    cluster_by_similarity,
+    representatives,
+    summarize_clusters,
+)
+
+
+def _blobs(seed=0, per_cluster=30, dims=16):
+    rng = np.random.default_rng(seed)
+    centers = np.eye(dims, dtype=np.float32)[:3] * 10
+    vectors = np.concatenate([c + rng.normal(0, 0.3, (per_cluster, dims)) for c in centers])
+    truth = np.repeat(np.arange(3), per_cluster)
+    order = rng.permutation(len(vectors))
+    return vectors[order], truth[order]
+
+
+def test_cluster_by_similarity_recovers_groups():
+    vectors, truth = _blobs()
+    # Small block size exercises the cross-block merges
+    labels = cluster_by_similarity(vectors, threshold=0.8, block_size=7)
+    assert labels.max() + 1 == 3
+    for label in range(3):
+        assert len(set(truth[labels == label])) == 1
+    assert labels[0] == 0
+    print("✅ cluster_by_similarity recovers groups: PASS")
+
+
+def test_cluster_by_similarity_chains_and_singletons():
+    # a~b and b~c but not a~c: single linkage puts all three together
+    a = np.array([1.0, 0.0, 0.0])
+    b = np.array([0.9, 0.44, 0.0])
+    c = np.array([0.62, 0.78, 0.0])
+    d = np.array([0.0, 0.0, 1.0])
+    labels = cluster_by_similarity(np.stack([a, b, c, d]), threshold=0.89)
+    assert labels.tolist() == [0, 0, 0, 1]
+    assert cluster_by_similarity(np.zeros((0, 3))).size == 0
+    print("✅ cluster_by_similarity chains and singletons: PASS")
+
+
+def test_summarize_clusters_orders_by_size():
+    vectors = np.array([[1, 0], [0, 1], [0.99, 0.05], [1, 0.02]], dtype=np.float32)
+    rows = [
+        {"id": 10, "question": "When is the scan?", "created_at": "2026-01-03"},
+        {"id": 11, "question": "Diet in pregnancy", "created_at": "2026-01-01"},
+        {"id": 12, "question": "when is the scan?", "created_at": "2026-01-01"},
+        {"id": 13, "question": "Scan date?", "created_at": "2026-01-02"},
+    ]
+    labels = cluster_by_similarity(vectors, threshold=0.95)
+    reps = representatives(vectors, labels)
+    assert reps[int(labels[1])] == 1
+
+    clusters, assignments = summarize_clusters(rows, vectors, labels, samples=2)
+    assert [c["size"] for c in clusters] == [3, 1]
+    top = clusters[0]
+    assert top["cluster_id"] == 0 and top["representative_id"] in (10, 12, 13)
+    assert top["first_seen"] == "2026-01-01" and top["last_seen"] == "2026-01-03"
+    assert len(top["sample_questions"]) == 2
+    assert sorted(a["id"] for a in assignments if a["cluster_id"] == 0) == [10, 12, 13]
+
+    clusters, assignments = summarize_clusters(rows, vectors, labels, min_size=2)
+    assert len(clusters) == 1 and len(assignments) == 3
+    print("✅ summarize_clusters orders by size: PASS")
+
+
+def test_embedding_cache_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.npz")
+        cache = EmbeddingCache(path)
+        assert cache.missing(["Hello", "hello ", "World"]) == ["Hello", "World"]
+        cache.put("Hello", [1.0, 2.0])
+        cache.save()
+
+        reloaded = EmbeddingCache(path)
+        assert len(reloaded) == 1
+        assert reloaded.get(" hello").tolist() == [1.0, 2.0]
+        assert reloaded.missing(["HELLO", "World"]) == ["World"]
+    print("✅ EmbeddingCache round trip: PASS")
+
+
+def test_near_duplicate_index_ring():
+    index = NearDuplicateIndex(capacity=2, min_similarity=0.95)
+    assert index.check_and_add([1.0, 0.0, 0.0]) == (False, 0.0)
+    duplicate, best = index.check([0.99, 0.01, 0.0])
+    assert duplicate and best > 0.99
+    assert not index.check([0.0, 1.0, 0.0])[0]
+
+    index.add([0.0, 1.0, 0.0])
+    index.add([0.0, 0.0, 1.0])  # evicts [1, 0, 0]
+    assert not index.check([1.0, 0.0, 0.0])[0]
+    assert index.stats()["size"] == 2
+    print("✅ NearDuplicateIndex ring: PASS")
+
+
+def test_store_new_question_skips_near_duplicates():
+    inserted = []
+    vectors = {"q1": [1.0, 0.0], "q1 again": [0.999, 0.01], "q2": [0.0, 1.0]}
+    state = {"fail_insert": 1}
+
+    async def fake_embedding(text, dimensions=None):
+        if text == "no embedding":
+            raise Exception("rate limited")
+        return vectors[text]
+
+    async def fake_insert(table, data, **kwargs):
+        if data["question"] == "q1" and state["fail_insert"]:
+            state["fail_insert"] -= 1
+            raise Exception("connection reset")
+        inserted.append(data["question"])
+
+    original = (user_rewards.async_generate_embedding, user_rewards.async_supabase_insert,
+                user_rewards.get_recent_questions_index)
+    index = NearDuplicateIndex()
+    user_rewards.async_generate_embedding = fake_embedding
+    user_rewards.async_supabase_insert = fake_insert
+    user_rewards.get_recent_questions_index = lambda: index
+    try:
+        async def scenario():
+            try:
+                await user_rewards.store_new_question("u1", "q1", 0.2)
+            except Exception:
+                pass
+            # The retry must not be treated as a duplicate of the failed attempt
+            await user_rewards.store_new_question("u1", "q1", 0.2)
+            await user_rewards.store_new_question("u2", "q1 again", 0.2)
+            await user_rewards.store_new_question("u2", "q2", 0.3)
+            await user_rewards.store_new_question("u3", "no embedding", 0.1)
+
+        asyncio.run(scenario())
+    finally:
+        (user_rewards.async_generate_embedding, user_rewards.async_supabase_insert,
+         user_rewards.get_recent_questions_index) = original
+
+    assert inserted == ["q1", "q2", "no embedding"]
+    assert index.stats()["duplicates"] == 1
+    print("✅ store_new_question skips near-duplicates: PASS")
+
+
+if __name__ == "__main__":
+    test_cluster_by_similarity_recovers_groups()
+    test_cluster_by_similarity_chains_and_singletons()
+    test_summarize_clusters_orders_by_size()
+    test_embedding_cache_round_trip()
+    test_near_duplicate_index_ring()
+    test_store_new_question_skips_near_duplicates()
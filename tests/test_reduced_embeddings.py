@@ -0,0 +1,68 @@
+# test_reduced_embeddings.py
+"""
+Tests for Matryoshka-reduced embedding helpers in rag.py.
+"""
+import os
+import re
+import sys
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag import reduce_embedding, embedding_column, check_embedding_dimensions, REDUCED_EMBEDDING_DIMENSIONS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_reduce_embedding_truncates_and_normalises():
+    vector = np.random.default_rng(0).standard_normal(1536).tolist()
+    reduced = reduce_embedding(vector, 512)
+    assert len(reduced) == 512
+    assert abs(np.linalg.norm(reduced) - 1.0) < 1e-5
+    # Direction of the leading components is preserved
+    head = np.asarray(vector[:512])
+    assert np.allclose(reduced, head / np.linalg.norm(head), atol=1e-6)
+    print("✅ reduce_embedding: PASS")
+
+
+def test_embedding_column_names():
+    assert embedding_column("embedding", 1536) == "embedding"
+    assert embedding_column("embedding", 512) == "embedding_512"
+    assert embedding_column("question_vector", 256) == "question_vector_256"
+    print("✅ embedding_column: PASS")
+
+
+def test_unsupported_dimensions_are_rejected():
+    check_embedding_dimensions(1536)
+    check_embedding_dimensions(512)
+    for dims in (256, 1024, 3072):
+        try:
+            check_embedding_dimensions(dims)
+        except Exception as e:
+            assert "EMBEDDING_DIMENSIONS" in str(e)
+        else:
+            raise AssertionError(f"{dims} accepted")
+    print("✅ Unsupported sizes rejected: PASS")
+
+
+def test_reduced_sql_defines_every_called_rpc():
+    with open(os.path.join(ROOT, "modules", "search_hierarchical.py"), encoding="utf-8") as f:
+        called = set(re.findall(r'_rpc_name\("(\w+)"\)', f.read()))
+    with open(os.path.join(ROOT, "sql", "setup_reduced_embeddings.sql"), encoding="utf-8") as f:
+        defined = set(re.findall(r"create or replace function (\w+)", f.read()))
+    assert "hierarchical_search" in called
+    for dims in REDUCED_EMBEDDING_DIMENSIONS:
+        missing = {f"{name}_{dims}" for name in called} - defined
+        assert not missing, missing
+    print("✅ Reduced SQL covers every RPC: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Reduced Embedding Tests ===\n")
+    test_reduce_embedding_truncates_and_normalises()
+    test_embedding_column_names()
+    test_unsupported_dimensions_are_rejected()
+    test_reduced_sql_defines_every_called_rpc()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,115 @@
+# test_retrieval_cache.py
+"""
+Tests for the LSH-keyed retrieval result cache.
+"""
+import os
+import sys
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.search_hierarchical import RetrievalCache
+
+
+def _vec(seed: int, dim: int = 64) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(dim)
+
+
+def test_near_identical_vectors_hit():
+    """A tiny perturbation of the query vector should reuse the cached results."""
+    cache = RetrievalCache()
+    base = _vec(1)
+    key, vec = cache.make_key(base, 0.3, 4)
+    cache.put(key, vec, [{"header_path": "IVF > Cost", "similarity": 0.8}], 0.8)
+
+    near = base + 1e-4 * _vec(2)
+    key2, vec2 = cache.make_key(near, 0.3, 4)
+    results, best = cache.get(key2, vec2)
+    assert results[0]["header_path"] == "IVF > Cost"
+    assert best == 0.8
+    assert cache.stats()["hits"] == 1
+    print("✅ Near-identical hit: PASS")
+
+
+def test_params_are_part_of_key():
+    """Different match_count must not share entries."""
+    cache = RetrievalCache()
+    key, vec = cache.make_key(_vec(1), 0.3, 4)
+    cache.put(key, vec, [{"similarity": 0.5}], 0.5)
+    key2, vec2 = cache.make_key(_vec(1), 0.3, 8)
+    assert cache.get(key2, vec2) is None
+    print("✅ Params in key: PASS")
+
+
+def test_ttl_and_size_bound():
+    """Expired entries miss; oldest entries are evicted beyond max_entries."""
+    cache = RetrievalCache(max_entries=2, ttl_seconds=0)
+    key, vec = cache.make_key(_vec(1), 0.3, 4)
+    cache.put(key, vec, [], 0.0)
+    assert cache.get(key, vec) is None
+
+    cache = RetrievalCache(max_entries=2)
+    for seed in range(3):
+        key, vec = cache.make_key(_vec(seed), 0.3, 4)
+        cache.put(key, vec, [], 0.0)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    print("✅ TTL and size bound: PASS")
+
+
+def test_kb_version_change_invalidates():
+    """A new KB version stamp clears the cache."""
+    cache = RetrievalCache()
+    cache.observe_kb_version(1)
+    key, vec = cache.make_key(_vec(1), 0.3, 4)
+    cache.put(key, vec, [], 0.0)
+    cache.observe_kb_version(1)
+    assert cache.stats()["entries"] == 1
+    cache.observe_kb_version(2)
+    assert cache.stats()["entries"] == 0
+    print("✅ KB version invalidation: PASS")
+
+
+def test_returns_copies():
+    """Callers mutating results must not corrupt the cache."""
+    cache = RetrievalCache()
+    key, vec = cache.make_key(_vec(1), 0.3, 4)
+    cache.put(key, vec, [{"similarity": 0.5}], 0.5)
+    results, _ = cache.get(key, vec)
+    results[0]["source_type"] = "DOCUMENT"
+    results, _ = cache.get(key, vec)
+    assert "source_type" not in results[0]
+    print("✅ Returns copies: PASS")
+
+
+def test_hash_collision_keeps_entry():
+    """A different question landing on the same key misses without evicting the cached one."""
+    cache = RetrievalCache(hash_bits=1)
+    base = _vec(1)
+    key, vec = cache.make_key(base, 0.3, 4)
+    cache.put(key, vec, [{"header_path": "IVF > Cost"}], 0.8)
+
+    # Same sign against the single hyperplane, far from `base`
+    other = next(v for v in (_vec(s) for s in range(2, 50)) if cache.make_key(v, 0.3, 4)[0] == key
+                 and np.dot(v, base) / (np.linalg.norm(v) * np.linalg.norm(base)) < 0.5)
+    key2, vec2 = cache.make_key(other, 0.3, 4)
+    assert cache.get(key2, vec2) is None
+    cache.put(key2, vec2, [{"header_path": "PCOS > Diet"}], 0.6)
+
+    results, _ = cache.get(key, vec)
+    assert results[0]["header_path"] == "IVF > Cost"
+    assert cache.stats()["collisions"] == 1 and cache.stats()["hits"] == 1
+    print("✅ Hash collision keeps entry: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Retrieval Cache Tests ===\n")
+    test_near_identical_vectors_hit()
+    test_params_are_part_of_key()
+    test_ttl_and_size_bound()
+    test_kb_version_change_invalidates()
+    test_returns_copies()
+    test_hash_collision_keeps_entry()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,86 @@
+# test_search_modes.py
+"""
+Tests for the document search modes in modules/search_hierarchical.py
+(flat, coarse-to-fine and their fallbacks). RPCs and the section store are
+replaced with in-memory fakes.
+"""
+import os
+import sys
+import asyncio
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.search_hierarchical as search
+from modules.search_hierarchical import (
+    mean_section_embedding,
+    SEARCH_MODE_FLAT,
+    SEARCH_MODE_COARSE_TO_FINE,
+    COARSE_SECTION_COUNT,
+)
+
+PARAMS = {"query_embedding": [0.1, 0.2], "match_threshold": 0.3, "match_count": 4}
+
+
+class FakeSectionStore:
+    def __init__(self):
+        self.ensured = []
+
+    async def ensure(self, section_ids):
+        self.ensured.extend(section_ids)
+
+
+def _run_search(mode, deployed):
+    """_search_documents() against fake RPCs; `deployed` lists the RPCs that exist."""
+    calls = []
+    store = FakeSectionStore()
+
+    async def fake_rpc(name, params):
+        calls.append((name, params))
+        if name not in deployed:
+            raise Exception(f"function {name} does not exist")
+        return [{"section_id": 7, "similarity": 0.8}]
+
+    original_rpc, original_store = search.async_supabase_rpc, search.get_section_store
+    search.async_supabase_rpc = fake_rpc
+    search.get_section_store = lambda: store
+    try:
+        hits = asyncio.run(search._search_documents(dict(PARAMS), mode))
+    finally:
+        search.async_supabase_rpc, search.get_section_store = original_rpc, original_store
+    return hits, calls, store
+
+
+def test_mean_section_embedding():
+    assert mean_section_embedding([]) is None
+    vector = mean_section_embedding([[1.0, 0.0, 2.0], [0.0, 1.0, 4.0]])
+    assert np.allclose(vector, [0.5, 0.5, 3.0])
+    print("✅ Section embedding is the chunk mean: PASS")
+
+
+def test_coarse_to_fine_uses_two_stage_rpc():
+    hits, calls, store = _run_search(SEARCH_MODE_COARSE_TO_FINE, {"coarse_to_fine_search_ids"})
+    assert [name for name, _ in calls] == ["coarse_to_fine_search_ids"]
+    assert calls[0][1] == {**PARAMS, "section_count": COARSE_SECTION_COUNT}
+    assert hits == [{"section_id": 7, "similarity": 0.8}] and store.ensured == [7]
+    print("✅ Coarse-to-fine search: PASS")
+
+
+def test_coarse_to_fine_falls_back_to_flat():
+    hits, calls, _ = _run_search(SEARCH_MODE_COARSE_TO_FINE, {"hierarchical_search_ids"})
+    assert [name for name, _ in calls] == ["coarse_to_fine_search_ids", "hierarchical_search_ids"]
+    assert calls[1][1] == PARAMS and hits[0]["section_id"] == 7
+
+    _, calls, _ = _run_search(SEARCH_MODE_FLAT, {"hierarchical_search_ids"})
+    assert [name for name, _ in calls] == ["hierarchical_search_ids"]
+    print("✅ Coarse-to-fine falls back to flat search: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Search Mode Tests ===\n")
+    test_mean_section_embedding()
+    test_coarse_to_fine_uses_two_stage_rpc()
+    test_coarse_to_fine_falls_back_to_flat()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,70 @@
+# test_section_store.py
+"""
+Tests for resolving ID-only search hits from the in-memory section store.
+"""
+import os
+import sys
+import asyncio
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.section_store as section_store
+from modules.section_store import SectionStore, get_section_store
+from modules.search_hierarchical import format_hierarchical_context
+
+
+def test_id_only_hits_use_store_content():
+    """format_hierarchical_context should pull path/content from memory."""
+    store = get_section_store()
+    store._add_rows([{"id": 42, "header_path": "IVF > Cost", "content": "IVF costs vary."}], store._sections)
+
+    context = format_hierarchical_context([
+        {"section_id": 42, "similarity": 0.81, "source_type": "DOCUMENT"},
+    ])
+    assert "Path: IVF > Cost" in context
+    assert "Content: IVF costs vary." in context
+    print("✅ ID-only hit resolved from store: PASS")
+
+
+def test_full_content_hits_still_work():
+    """Rows from the legacy hierarchical_search RPC carry their own content."""
+    context = format_hierarchical_context([
+        {"section_content": "Legacy text", "header_path": "A > B", "similarity": 0.5, "source_type": "DOCUMENT"},
+    ])
+    assert "Content: Legacy text" in context
+    print("✅ Legacy full-content hit: PASS")
+
+
+def test_failed_reload_is_retried():
+    """A reload that raises must not mark the new KB version as loaded."""
+    store = SectionStore()
+    store.version, store.loaded = 1, True
+    content = {"text": "old"}
+
+    def fake_select(table, **kwargs):
+        if content["text"] is None:
+            raise Exception("connection refused")
+        return [{"id": 7, "header_path": "IVF", "content": content["text"]}]
+
+    original = section_store.supabase_select
+    section_store.supabase_select = fake_select
+    try:
+        content["text"] = None
+        asyncio.run(store.sync_version(2))
+        assert store.version == 1
+
+        content["text"] = "updated in place"
+        asyncio.run(store.sync_version(2))
+        assert store.version == 2 and store.get(7)["content"] == "updated in place"
+    finally:
+        section_store.supabase_select = original
+    print("✅ Failed reload retried on next poll: PASS")
+
+
+if __name__ == "__main__":
+    print("\n=== Section Store Tests ===\n")
+    test_id_only_hits_use_store_content()
+    test_full_content_hits_still_work()
+    test_failed_reload_is_retried()
+    print("\n=== All Tests Passed! ===\n")
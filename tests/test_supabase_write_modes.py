@@ -0,0 +1,87 @@
+# test_supabase_write_modes.py
+"""
+Tests for the Prefer: return=<mode> / column projection options of the
+supabase_client write helpers (the HTTP layer is replaced on the module).
+"""
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import supabase_client
+from supabase_client import supabase_insert, supabase_update, RETURN_MINIMAL, RETURN_HEADERS_ONLY
+
+_real_requests = supabase_client.requests
+
+
+class FakeResponse:
+    def __init__(self, body=b"", headers=None):
+        self.status_code = 201
+        self.content = body
+        self.text = body.decode()
+        self.headers = headers or {}
+
+    def json(self):
+        import json
+        return json.loads(self.content)
+
+
+class FakeRequests:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def _record(self, method, url, headers=None, json=None):
+        self.calls.append((method, url, headers["Prefer"]))
+        return self.response
+
+    def post(self, url, headers=None, json=None):
+        return self._record("POST", url, headers, json)
+
+    def patch(self, url, headers=None, json=None):
+        return self._record("PATCH", url, headers, json)
+
+
+def _install(response):
+    fake = FakeRequests(response)
+    supabase_client.requests = fake
+    return fake
+
+
+def teardown_function(function):
+    supabase_client.requests = _real_requests
+
+
+def test_representation_with_columns():
+    fake = _install(FakeResponse(b'[{"id": 1}]'))
+    assert supabase_insert("t", {"a": 1}, columns="id") == [{"id": 1}]
+    method, url, prefer = fake.calls[0]
+    assert url.endswith("/rest/v1/t?select=id") and prefer == "return=representation"
+    print("✅ Representation + columns: PASS")
+
+
+def test_minimal_and_headers_only():
+    fake = _install(FakeResponse(headers={"Location": "/t?id=eq.7"}))
+    assert supabase_update("t", "id=eq.7", {"a": 2}, returning=RETURN_MINIMAL, columns="id") is None
+    assert supabase_insert("t", {"a": 1}, returning=RETURN_HEADERS_ONLY) == "/t?id=eq.7"
+    assert fake.calls[0] == ("PATCH", f"{supabase_client.SUPABASE_URL}/rest/v1/t?id=eq.7", "return=minimal")
+    assert fake.calls[1][2] == "return=headers-only"
+    print("✅ Minimal + headers-only: PASS")
+
+
+def test_unknown_mode_rejected():
+    try:
+        supabase_insert("t", {}, returning="everything")
+    except ValueError:
+        print("✅ Unknown mode rejected: PASS")
+        return
+    raise AssertionError("expected ValueError")
+
+
+if __name__ == "__main__":
+    print("\n=== Supabase Write Mode Tests ===\n")
+    test_representation_with_columns()
+    test_minimal_and_headers_only()
+    test_unknown_mode_rejected()
+    print("\n=== All Tests Passed! ===\n")
@@ -0,0 +1,161 @@
+# test_tracing.py
+"""
+Tests for request-scoped stage tracing (modules/tracing.py) and the
+Server-Timing middleware, using a small FastAPI app.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import modules.tracing as tracing
+from modules.tracing import start_trace, end_trace, current_trace, span, traced, log_if_slow, TracingMiddleware
+
+
+@traced("classify")
+async def _classify():
+    await asyncio.sleep(0.02)
+    return "medical"
+
+
+@traced("translate")
+async def _translate():
+    await asyncio.sleep(0.01)
+    with span("embed"):
+        await asyncio.to_thread(time.sleep, 0.01)
+    return "hello"
+
+
+def test_spans_record_into_current_trace():
+    async def handler():
+        trace, token = start_trace("POST /sakhi/chat")
+        try:
+            with span("profile"):
+                pass
+            # Concurrent tasks copy the context and share the trace
+            await asyncio.gather(_translate(), _classify())
+            with span("db"):
+                pass
+            with span("db"):
+                pass
+        finally:
+            end_trace(token)
+        return trace
+
+    trace = asyncio.run(handler())
+    stages = trace.summary()
+    # Spans are recorded as they finish, so concurrent stages may interleave
+    assert set(stages) == {"profile", "embed", "translate", "classify", "db"}
+    assert list(stages)[0] == "profile" and list(stages)[-1] == "db"
+    assert stages["db"]["count"] == 2
+    assert stages["classify"]["ms"] >= 15
+    depths = {entry["stage"]: entry["depth"] for entry in trace.spans}
+    assert depths["embed"] == 1 and depths["translate"] == 0
+    assert current_trace() is None
+
+    header = trace.server_timing()
+    assert header.startswith("profile;dur=") and header.endswith(f"total;dur={trace.total_ms}")
+    assert trace.as_dict()["total_ms"] >= stages["classify"]["ms"]
+    print("✅ Spans record into the current trace: PASS")
+
+
+def test_span_without_trace_is_noop_and_marks_errors():
+    with span("orphan"):
+        pass
+    assert asyncio.run(_classify()) == "medical"
+
+    trace, token = start_trace("GET /")
+    try:
+        with span("generate"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    finally:
+        end_trace(token)
+    assert trace.spans[0]["error"] == "ValueError"
+    print("✅ Span without trace is a no-op; errors are marked: PASS")
+
+
+def test_span_ignores_finished_trace():
+    async def scenario():
+        trace, token = start_trace("POST /chat")
+        # A task spawned during the request keeps the trace in its context
+        late = asyncio.ensure_future(asyncio.sleep(0.01))
+        leftover = asyncio.ensure_future(_classify_after(late))
+        end_trace(token)
+        await leftover
+        return trace
+
+    trace = asyncio.run(scenario())
+    assert trace.spans == []
+    print("✅ Span ignores a finished trace: PASS")
+
+
+async def _classify_after(event):
+    await event
+    return await _classify()
+
+
+def test_log_if_slow_writes_breakdown():
+    with tempfile.TemporaryDirectory() as tmp:
+        original = tracing.SLOW_REQUEST_LOG_PATH
+        tracing.SLOW_REQUEST_LOG_PATH = os.path.join(tmp, "slow.jsonl")
+        try:
+            trace, token = start_trace("POST /sakhi/chat")
+            with span("rag"):
+                time.sleep(0.01)
+            tracing.annotate(route="slm_rag")
+            end_trace(token)
+
+            assert not log_if_slow(trace, status=200, threshold_ms=60_000)
+            assert log_if_slow(trace, status=200, threshold_ms=0)
+            with open(tracing.SLOW_REQUEST_LOG_PATH, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+        finally:
+            tracing.SLOW_REQUEST_LOG_PATH = original
+
+    assert len(lines) == 1
+    record = lines[0]
+    assert record["meta"] == {"route": "slm_rag"} and record["status"] == 200
+    assert record["stages"]["rag"]["count"] == 1 and record["spans"][0]["stage"] == "rag"
+    print("✅ log_if_slow writes the stage breakdown: PASS")
+
+
+def test_middleware_sets_server_timing_header():
+    app = FastAPI()
+
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/chat")
+    async def chat():
+        await _classify()
+        return {"reply": "ok", "timings": current_trace().as_dict()}
+
+    original = tracing.SLOW_REQUEST_MS
+    tracing.SLOW_REQUEST_MS = 60_000
+    try:
+        response = TestClient(app).get("/chat")
+    finally:
+        tracing.SLOW_REQUEST_MS = original
+
+    assert response.status_code == 200
+    header = response.headers["server-timing"]
+    assert header.startswith("classify;dur=") and "total;dur=" in header
+    assert response.json()["timings"]["stages"]["classify"]["count"] == 1
+    print("✅ Middleware sets Server-Timing: PASS")
+
+
+if __name__ == "__main__":
+    test_spans_record_into_current_trace()
+    test_span_without_trace_is_noop_and_marks_errors()
+    test_span_ignores_finished_trace()
+    test_log_if_slow_writes_breakdown()
+    test_middleware_sets_server_timing_header()
@@ -0,0 +1,208 @@
+# test_user_locks.py
+"""
+Tests for per-user turn locks (modules/user_locks.py). The Postgres backend
+is exercised with an in-memory stand-in for the psycopg2 connection pool.
+"""
+import os
+import sys
+import asyncio
+import threading
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.user_locks import UserLockManager, UserLockTimeout, PostgresAdvisoryLocks
+
+
+def test_same_user_turns_run_in_order():
+    log = []
+
+    async def turn(manager, user, name, hold):
+        async with manager.lock(user):
+            log.append(f"{name}:start")
+            await asyncio.sleep(hold)
+            log.append(f"{name}:end")
+
+    async def scenario():
+        manager = UserLockManager(timeout=1)
+        tasks = [asyncio.create_task(turn(manager, "u1", name, 0.02)) for name in ("a", "b", "c")]
+        await asyncio.gather(*tasks)
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert log == ["a:start", "a:end", "b:start", "b:end", "c:start", "c:end"]
+    assert manager.counters == {"acquired": 3, "contended": 2, "timed_out": 0, "rejected": 0}
+    assert manager.stats()["active_users"] == 0
+    print("✅ Same-user turns run in order: PASS")
+
+
+def test_different_users_run_in_parallel():
+    async def turn(manager, user):
+        async with manager.lock(user):
+            await asyncio.sleep(0.05)
+
+    async def scenario():
+        manager = UserLockManager(timeout=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(turn(manager, f"u{i}") for i in range(10)))
+        return loop.time() - start, manager
+
+    elapsed, manager = asyncio.run(scenario())
+    assert elapsed < 0.2 and manager.counters["contended"] == 0
+    print("✅ Different users run in parallel: PASS")
+
+
+def test_timeout_and_cancel_release_bookkeeping():
+    async def scenario():
+        manager = UserLockManager(timeout=0.02)
+        await manager.acquire("u1")
+        try:
+            await manager.acquire("u1")
+            raise AssertionError("expected timeout")
+        except UserLockTimeout:
+            pass
+
+        manager.timeout = 1
+        waiter = asyncio.create_task(manager.acquire("u1"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        await manager.release("u1")
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert manager.counters["timed_out"] == 1 and manager.stats()["active_users"] == 0
+    print("✅ Timeout and cancel keep bookkeeping clean: PASS")
+
+
+class FakeCursor:
+    def __init__(self, server, conn):
+        self.server, self.conn = server, conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        key = params
+        with self.server["lock"]:
+            if "pg_try_advisory_lock" in sql:
+                owner = self.server["held"].get(key)
+                self.result = owner is None
+                if owner is None:
+                    self.server["held"][key] = self.conn
+            else:
+                self.result = self.server["held"].pop(key, None) is self.conn
+
+    def fetchone(self):
+        return (self.result,)
+
+
+class FakeConnection:
+    autocommit = False
+
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self):
+        return FakeCursor(self.server, self)
+
+
+class FakePoolError(Exception):
+    pass
+
+
+class FakePool:
+    def __init__(self, server, size=16):
+        self.server, self.size, self.used = server, size, 0
+
+    def getconn(self):
+        if self.used >= self.size:
+            raise FakePoolError("connection pool exhausted")
+        self.used += 1
+        return FakeConnection(self.server)
+
+    def putconn(self, conn, close=False):
+        self.used -= 1
+
+
+def _advisory_backend(server, pool_size=16):
+    backend = PostgresAdvisoryLocks.__new__(PostgresAdvisoryLocks)
+    backend._pool = FakePool(server, pool_size)
+    backend._pool_exhausted = FakePoolError
+    backend._held = {}
+    return backend
+
+
+def test_advisory_locks_serialize_across_workers():
+    server = {"held": {}, "lock": threading.Lock()}
+    order = []
+
+    def worker():
+        return UserLockManager(timeout=2, distributed=_advisory_backend(server))
+
+    async def turn(manager, name):
+        async with manager.lock("u1"):
+            order.append(f"{name}:start")
+            await asyncio.sleep(0.1)
+            order.append(f"{name}:end")
+
+    async def scenario():
+        # Two managers = two worker processes sharing one database
+        await asyncio.gather(turn(worker(), "w1"), turn(worker(), "w2"))
+
+    asyncio.run(scenario())
+    assert order[0].endswith(":start") and order[1] == order[0].replace("start", "end")
+    assert server["held"] == {}
+    print("✅ Advisory locks serialize across workers: PASS")
+
+
+def test_full_pool_waits_instead_of_failing():
+    server = {"held": {}, "lock": threading.Lock()}
+    backend = _advisory_backend(server, pool_size=1)
+    manager = UserLockManager(timeout=2, distributed=backend)
+    order = []
+
+    async def turn(user, hold):
+        async with manager.lock(user):
+            order.append(user)
+            await asyncio.sleep(hold)
+
+    async def scenario():
+        # u2's lock is free, but u1 pins the only connection until it is done
+        await asyncio.gather(turn("u1", 0.1), turn("u2", 0))
+
+    asyncio.run(scenario())
+    assert order == ["u1", "u2"]
+    assert backend._pool.used == 0 and server["held"] == {}
+    print("✅ Full connection pool waits like contention: PASS")
+
+
+def test_reserve_caps_queued_turns_per_user():
+    manager = UserLockManager(timeout=1, max_queued=1)
+    # One running turn and one queued: a third turn of u1 is refused
+    assert manager.reserve("u1") and manager.reserve("u1")
+    assert not manager.reserve("u1")
+    # Other users are not affected by u1's burst
+    assert manager.reserve("u2")
+    manager.unreserve("u1")
+    assert manager.reserve("u1")
+    for user in ("u1", "u1", "u2"):
+        manager.unreserve(user)
+    assert manager._turns == {} and manager.counters["rejected"] == 1
+    print("✅ Queued turns capped per user: PASS")
+
+
+if __name__ == "__main__":
+    test_same_user_turns_run_in_order()
+    test_different_users_run_in_parallel()
+    test_timeout_and_cancel_release_bookkeeping()
+    test_advisory_locks_serialize_across_workers()
+    test_full_pool_waits_instead_of_failing()
+    test_reserve_caps_queued_turns_per_user()